@@ -0,0 +1,70 @@
+"""
+    Import time of qtm_rt, measured with python -X importtime.
+
+    Imports qtm_rt in fresh interpreters and prints the cumulative import time
+    of the package, the modules it pulled in and the slowest of them. The same is
+    measured for first use of qtm_rt.connect, which imports the asyncio client.
+
+    PYTHONPATH=. python benchmarks/import_benchmark.py --repeat 10 --top 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    ("import qtm_rt", "import qtm_rt"),
+    ("qtm_rt.connect", "import qtm_rt; qtm_rt.connect"),
+]
+
+
+def importtime(statement):
+    """ Run statement in a new interpreter, return {module: self us} of its imports """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        imports[name.strip()] = int(self_us)
+    return imports
+
+
+def measure(statement, repeat):
+    """ Median total time and the modules imported by statement, slowest first """
+    startup = importtime("pass")
+    runs = []
+    for _ in range(repeat):
+        imports = importtime(statement)
+        runs.append(
+            {name: self_us for name, self_us in imports.items() if name not in startup}
+        )
+
+    total = statistics.median(sum(imports.values()) for imports in runs)
+    slowest = sorted(((self_us, name) for name, self_us in runs[-1].items()), reverse=True)
+    return total, slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for name, statement in STATEMENTS:
+        total, slowest = measure(statement, args.repeat)
+        print("%-16s %8.1f ms  %3d modules" % (name, total / 1000, len(slowest)))
+        for self_us, module in slowest[: args.top]:
+            print("    %8.2f ms  %s" % (self_us / 1000, module))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+    Frame delivery latency with and without a latency profile.
+
+    Starts benchmarks/mock_server.py in a separate process, streams frames from it
+    with qtm_rt.connect() with default socket options and with
+    qtm_rt.latency.LOW_LATENCY, and with qtm_rt.blocking.connect(), and prints
+    p50/p99 of the time from the mock sending a frame until it is delivered.
+
+    PYTHONPATH=. python benchmarks/latency_benchmark.py --frames 5000 --frequency 1000
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import qtm_rt
+from qtm_rt import blocking
+from qtm_rt.latency import LOW_LATENCY, LatencyProfile
+
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_server.py")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def measure(port, frames, profile):
+    connection = await qtm_rt.connect("127.0.0.1", port=port, latency_profile=profile)
+    if connection is None:
+        raise RuntimeError("Could not connect to mock server")
+
+    latencies = []
+    done = asyncio.get_event_loop().create_future()
+
+    def on_packet(packet):
+        latencies.append(time.monotonic_ns() // 1000 - packet.timestamp)
+        if len(latencies) == frames and not done.done():
+            done.set_result(None)
+
+    await connection.stream_frames(components=["3d"], on_packet=on_packet)
+    await done
+    await connection.stream_frames_stop()
+    options = connection.socket_options
+    connection.disconnect()
+    return latencies, options
+
+
+def measure_blocking(port, frames, profile):
+    connection = blocking.connect("127.0.0.1", port=port, latency_profile=profile)
+    if connection is None:
+        raise RuntimeError("Could not connect to mock server")
+
+    latencies = []
+    connection.stream_frames(components=["3d"])
+    while len(latencies) < frames:
+        packet = connection.recv_frame()
+        latencies.append(time.monotonic_ns() // 1000 - packet.timestamp)
+    connection.stream_frames_stop()
+    options = connection.socket_options
+    connection.disconnect()
+    return latencies, options
+
+
+def report(name, latencies, options):
+    print(
+        "%-12s p50 %6d us  p99 %6d us  max %6d us  %s"
+        % (
+            name,
+            percentile(latencies, 0.5),
+            percentile(latencies, 0.99),
+            max(latencies),
+            options or "",
+        )
+    )
+
+
+async def benchmark(port, frames, busy_poll):
+    profiles = [
+        ("default", None),
+        ("LOW_LATENCY", LOW_LATENCY),
+        ("no quickack", LatencyProfile(quickack=False)),
+    ]
+    if busy_poll:
+        profiles.append(("busy poll", LatencyProfile(busy_poll=busy_poll)))
+
+    for name, profile in profiles:
+        report(name, *await measure(port, frames, profile))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--port", type=int, default=22299)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--frequency", type=float, default=1000)
+    parser.add_argument("--markers", type=int, default=50)
+    parser.add_argument("--busy-poll", type=int, default=0, help="SO_BUSY_POLL in us")
+    args = parser.parse_args()
+
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            MOCK_SERVER,
+            "--port",
+            str(args.port),
+            "--frequency",
+            str(args.frequency),
+            "--markers",
+            str(args.markers),
+        ],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        server.stdout.readline()
+        asyncio.run(benchmark(args.port, args.frames, args.busy_poll))
+        report("blocking", *measure_blocking(args.port, args.frames, LOW_LATENCY))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
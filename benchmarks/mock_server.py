@@ -0,0 +1,137 @@
+"""
+    Minimal QTM RT server for benchmarks.
+
+    Answers version, byteorder, qtmversion and getstate, and streams frames of
+    labelled 3D markers at a fixed rate on streamframes. The frame timestamp is
+    time.monotonic_ns() in microseconds when the frame is sent, so a client on
+    the same machine can measure delivery latency.
+
+    python benchmarks/mock_server.py --port 22223 --frequency 1000 --markers 50
+"""
+
+import argparse
+import asyncio
+import struct
+import time
+
+RTheader = struct.Struct("<II")
+RTDataQRTPacket = struct.Struct("<qII")
+RTComponentData = struct.Struct("<II")
+RT3DComponent = struct.Struct("<IHH")
+RT3DMarkerPosition = struct.Struct("<fff")
+
+PACKET_ERROR = 0
+PACKET_COMMAND = 1
+PACKET_DATA = 3
+PACKET_NO_MORE_DATA = 4
+PACKET_EVENT = 6
+COMPONENT_3D = 1
+
+
+def packet(type_, payload):
+    return RTheader.pack(RTheader.size + len(payload), type_) + payload
+
+
+def string_packet(type_, text):
+    return packet(type_, text.encode() + b"\0")
+
+
+class MockQTM(asyncio.Protocol):
+    def __init__(self, frequency, markers):
+        self.frequency = frequency
+        self.markers = RT3DComponent.pack(markers, 0, 0) + b"".join(
+            RT3DMarkerPosition.pack(i, i, i) for i in range(markers)
+        )
+        self.transport = None
+        self.buffer = b""
+        self.stream = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(string_packet(PACKET_COMMAND, "QTM RT Interface connected"))
+
+    def connection_lost(self, exc):
+        self.stop()
+
+    def data_received(self, data):
+        self.buffer += data
+        while len(self.buffer) >= RTheader.size:
+            size, _ = RTheader.unpack_from(self.buffer, 0)
+            if len(self.buffer) < size:
+                return
+            command = self.buffer[RTheader.size : size].rstrip(b"\0").decode()
+            self.buffer = self.buffer[size:]
+            self.command(command)
+
+    def command(self, command):
+        words = command.lower().split()
+        name = words[0] if words else ""
+        if name == "version":
+            self.send(string_packet(PACKET_COMMAND, "Version set to %s" % words[1]))
+        elif name == "byteorder":
+            self.send(string_packet(PACKET_COMMAND, "Byte order is little endian"))
+        elif name == "qtmversion":
+            self.send(string_packet(PACKET_COMMAND, "QTM Version is 2.x (mock)"))
+        elif name == "getstate":
+            self.send(packet(PACKET_EVENT, bytes([1])))
+        elif name == "streamframes" and words[1:] == ["stop"]:
+            self.stop()
+        elif name == "streamframes":
+            self.stop()
+            self.stream = asyncio.ensure_future(self.stream_frames())
+        else:
+            self.send(string_packet(PACKET_ERROR, "Not supported by mock"))
+
+    def send(self, data):
+        if self.transport is not None:
+            self.transport.write(data)
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.cancel()
+            self.stream = None
+
+    async def stream_frames(self):
+        period = 1.0 / self.frequency
+        component = RTComponentData.pack(
+            RTComponentData.size + len(self.markers), COMPONENT_3D
+        ) + self.markers
+        start = time.monotonic()
+        framenumber = 0
+        while True:
+            framenumber += 1
+            timestamp = time.monotonic_ns() // 1000
+            self.send(
+                packet(
+                    PACKET_DATA,
+                    RTDataQRTPacket.pack(timestamp, framenumber, 1) + component,
+                )
+            )
+            await asyncio.sleep(max(0.0, start + framenumber * period - time.monotonic()))
+
+
+async def serve(host, port, frequency, markers):
+    loop = asyncio.get_event_loop()
+    server = await loop.create_server(
+        lambda: MockQTM(frequency, markers), host, port
+    )
+    print("Mock QTM listening on %s:%s" % (host, server.sockets[0].getsockname()[1]), flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=22223)
+    parser.add_argument("--frequency", type=float, default=1000)
+    parser.add_argument("--markers", type=int, default=50)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.frequency, args.markers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
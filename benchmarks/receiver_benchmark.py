@@ -0,0 +1,125 @@
+"""
+    Framing and dispatch throughput of qtm_rt.Receiver.
+
+    Compares the receiver with the previous implementation, which looked up
+    QRTPacketType for every packet, compared it against each type with ==,
+    dispatched through try/except KeyError and copied the rest of the buffer
+    after every packet. Runs on reads with one frame and on reads with many.
+
+    PYTHONPATH=. python benchmarks/receiver_benchmark.py --markers 50 --repeat 5
+"""
+
+import argparse
+import struct
+import timeit
+
+from qtm_rt.packet import (
+    QRTPacket,
+    QRTPacketType,
+    QRTComponentType,
+    QRTEvent,
+    RTheader,
+    RTEvent,
+    RTDataQRTPacket,
+    RTComponentData,
+)
+from qtm_rt.receiver import Receiver
+
+
+class BaselineReceiver(object):
+    """ Receiver framing and dispatch before the dispatch table """
+
+    def __init__(self, handlers):
+        self._handlers = handlers
+        self._received_data = b""
+
+    def data_received(self, data):
+        self._received_data += data
+        h_size = RTheader.size
+        data = self._received_data
+        data_len = len(data)
+
+        while data_len >= h_size:
+            size, type_ = RTheader.unpack_from(data, 0)
+            if data_len >= size:
+                self._parse_received(data[h_size:size], type_)
+                data = data[size:]
+                data_len = len(data)
+            else:
+                break
+
+        self._received_data = data
+
+    def _dispatch(self, type_, data):
+        try:
+            self._handlers[type_](data)
+        except KeyError:
+            pass
+
+    def _parse_received(self, data, type_):
+        type_ = QRTPacketType(type_)
+
+        if (
+            type_ == QRTPacketType.PacketError
+            or type_ == QRTPacketType.PacketCommand
+            or type_ == QRTPacketType.PacketXML
+        ):
+            data = data[:-1]
+        elif type_ == QRTPacketType.PacketData:
+            data = QRTPacket(data)
+        elif type_ == QRTPacketType.PacketEvent:
+            event, = RTEvent.unpack(data)
+            data = QRTEvent(ord(event))
+
+        self._dispatch(type_, data)
+
+
+def data_packet(framenumber, markers):
+    payload = struct.pack("<IHH", markers, 0, 0) + struct.pack("<fff", 1, 2, 3) * markers
+    component = (
+        RTComponentData.pack(
+            RTComponentData.size + len(payload), QRTComponentType.Component3d.value
+        )
+        + payload
+    )
+    body = RTDataQRTPacket.pack(framenumber * 1000, framenumber, 1) + component
+    return RTheader.pack(RTheader.size + len(body), QRTPacketType.PacketData.value) + body
+
+
+def run(receiver_class, reads, number, repeat):
+    handlers = {QRTPacketType.PacketData: lambda packet: None}
+    receiver = receiver_class(handlers)
+
+    def receive():
+        for read in reads:
+            receiver.data_received(read)
+
+    return min(timeit.repeat(receive, number=number, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--markers", type=int, default=50)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--number", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    packets = [data_packet(i, args.markers) for i in range(args.frames)]
+    cases = [
+        ("one frame per read", packets),
+        ("%d frames per read" % args.frames, [b"".join(packets)]),
+    ]
+
+    for name, reads in cases:
+        baseline = run(BaselineReceiver, reads, args.number, args.repeat)
+        current = run(Receiver, reads, args.number, args.repeat)
+        frames = args.frames * args.number
+        print(
+            "%-22s baseline %6.2f us/frame  receiver %6.2f us/frame  speedup %.2fx"
+            % (name, baseline / frames * 1e6, current / frames * 1e6, baseline / current)
+        )
+
+
+if __name__ == "__main__":
+    main()
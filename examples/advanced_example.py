@@ -5,6 +5,7 @@ import logging
 
 import qtm_rt
 
+qtm_rt.setup_logging()
 LOG = logging.getLogger("example")
 
 
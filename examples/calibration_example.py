@@ -5,6 +5,7 @@ import logging
 import qtm_rt
 import xml.etree.ElementTree as ET
 
+qtm_rt.setup_logging()
 LOG = logging.getLogger("example")
 
 async def setup():
@@ -51,5 +51,6 @@ async def setup():
     connection.disconnect()
 
 if __name__ == "__main__":
+    qtm_rt.setup_logging()
     loop = asyncio.get_event_loop()
     loop.run_until_complete(setup())
@@ -68,4 +68,5 @@ if __name__ == "__main__":
     parser.add_argument("-p", "--password", default="", help="RT server password.")
     args = parser.parse_args()
 
+    qtm_rt.setup_logging()
     asyncio.run(main(args.password, args.camera, args.output))
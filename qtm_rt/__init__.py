@@ -1,30 +1,64 @@
 """ Python SDK for QTM """
 
+import importlib
 import logging
 import sys
 import os
 
 PYTHON3 = sys.version_info.major == 3
 
-if PYTHON3:
-    from .discovery import Discover
-    from .reboot import reboot
-    from .qrt import connect, QRTConnection
-    from .protocol import QRTCommandException
-    from .control import TakeControl
-
-from .packet import QRTPacket, QRTEvent
-from .receiver import Receiver
-
 # pylint: disable=C0330
 
 LOG = logging.getLogger("qtm_rt")
-LOG_LEVEL = os.getenv("QTM_LOGGING", None)
 
-LEVEL = logging.DEBUG if LOG_LEVEL == "debug" else logging.INFO
-logging.basicConfig(
-    level=LEVEL, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Public names and the submodules they are imported from when first used
+_LAZY_ATTRIBUTES = {
+    "Discover": ".discovery",
+    "DiscoveryService": ".discovery",
+    "reboot": ".reboot",
+    "connect": ".qrt",
+    "QRTConnection": ".qrt",
+    "QRTCommandException": ".protocol",
+    "QRTTimeoutError": ".protocol",
+    "TakeControl": ".control",
+    "ReconnectingConnection": ".reconnect",
+    "BlockingQRTConnection": ".blocking",
+    "QRTPacket": ".packet",
+    "QRTEvent": ".packet",
+    "Receiver": ".receiver",
+}
+
+__all__ = sorted(_LAZY_ATTRIBUTES) + ["setup_logging"]
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+def setup_logging(level=None):
+    """Log to stderr with timestamps, as importing qtm_rt used to do.
+
+    qtm_rt does not configure logging by itself, call this or configure the
+    ``qtm_rt`` logger to see its messages.
+
+    :param level: Logging level. If None, debug if the environment variable
+        QTM_LOGGING is set to "debug", otherwise info.
+    """
+    if level is None:
+        level = logging.DEBUG if os.getenv("QTM_LOGGING", None) == "debug" else logging.INFO
+    logging.basicConfig(
+        level=level, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
 
 
 __author__ = "mge"
@@ -0,0 +1,7 @@
+""" Command line tools, see python -m qtm_rt --help """
+
+import sys
+
+from qtm_rt.cli import main
+
+sys.exit(main())
@@ -0,0 +1,246 @@
+""" Continuous analog signals assembled from streamed chunks. Requires numpy. """
+
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.analog requires numpy") from exception
+
+from qtm_rt import arrays
+from qtm_rt.history import RingBuffer
+
+QRTAnalogGap = namedtuple("QRTAnalogGap", "device expected received")
+QRTAnalogGap.__doc__ = """A chunk that does not start at the next sample number.
+
+If received is after expected the samples in between were lost, and are NaN in the
+signal. If received is before expected the chunk overlaps samples already received,
+which are not added again.
+"""
+
+_METHODS = ("linear", "mean")
+
+
+class _Device(object):
+    def __init__(self, capacity, frames, channels):
+        self.samples = RingBuffer(capacity, (channels,))
+        # Frame number and sample number of the first sample of every frame
+        self.frames = RingBuffer(frames, (2,), dtype=numpy.int64)
+        self.next_sample = None
+        self.lost = 0
+        self.overlapped = 0
+        self.gaps = 0
+
+    @property
+    def first_sample(self):
+        return self.next_sample - len(self.samples)
+
+
+class AnalogAssembler(object):
+    """Assembles the analog chunks of streamed frames into continuous signals.
+
+    Every device gets a ring buffer of its latest ``capacity`` samples, with one row
+    per sample number. Chunks are placed by their sample number, so lost samples
+    become NaN and repeated samples are dropped, and each such discontinuity is
+    returned as a :class:`QRTAnalogGap`::
+
+        assembler = AnalogAssembler()
+
+        def on_packet(packet):
+            for gap in assembler.add_packet(packet):
+                print("Gap", gap)
+
+        await connection.stream_frames(components=["analog"], on_packet=on_packet)
+        ...
+        signal = assembler.samples(device=1)
+        per_frame = assembler.resample(1, history.framenumbers())
+
+    A device starts over when its number of channels changes, when frame numbers
+    restart or when the gap is longer than ``max_gap`` samples.
+
+    :param capacity: Number of samples kept per device.
+    :param frames: Number of frames whose first sample number is kept, for
+        :func:`resample`.
+    :param max_gap: Longest gap in samples that is filled with NaN.
+    """
+
+    def __init__(self, capacity=1 << 16, frames=1000, max_gap=None):
+        self.capacity = capacity
+        self.frames = frames
+        self.max_gap = capacity if max_gap is None else max_gap
+        self._devices = {}
+        self._framenumber = None
+
+    @property
+    def devices(self):
+        """ Ids of the devices with samples """
+        return sorted(self._devices)
+
+    def clear(self):
+        """ Remove all samples """
+        self._devices = {}
+        self._framenumber = None
+
+    def add_packet(self, packet):
+        """Add the analog samples of a packet.
+
+        :rtype: A list of :class:`QRTAnalogGap`, empty if all chunks were continuous
+        """
+        devices = arrays.analog(packet)
+        if devices is None:
+            return []
+        if self._framenumber is not None and packet.framenumber <= self._framenumber:
+            self.clear()  # A new measurement
+        self._framenumber = packet.framenumber
+
+        gaps = []
+        for device, sample_number, samples in devices:
+            if sample_number is None:
+                continue
+            gap = self.add(device, sample_number, samples, packet.framenumber)
+            if gap is not None:
+                gaps.append(gap)
+        return gaps
+
+    def add(self, device, sample_number, samples, framenumber=None):
+        """Add a chunk of samples.
+
+        :param sample_number: Sample number of the first sample.
+        :param samples: A (channels, samples) array, as in :func:`qtm_rt.arrays.analog`.
+        :param framenumber: Frame of the chunk, used by :func:`resample`.
+        :rtype: A :class:`QRTAnalogGap` or None
+        """
+        channels, count = samples.shape
+        state = self._devices.get(device)
+        if state is None or state.samples.shape != (channels,):
+            state = self._devices[device] = _Device(self.capacity, self.frames, channels)
+
+        gap = None
+        expected = state.next_sample
+        if expected is not None and sample_number != expected:
+            gap = QRTAnalogGap(device, expected, sample_number)
+            state.gaps += 1
+            missing = sample_number - expected
+            if missing > self.max_gap or -missing >= len(state.samples):
+                # Too far from the samples kept to be placed among them
+                state.samples.clear()
+                state.frames.clear()
+                expected = None
+            elif missing > 0:
+                state.lost += missing
+                state.samples.extend(numpy.full((missing, channels), numpy.nan))
+            else:
+                state.overlapped += min(-missing, count)
+
+        skip = 0 if expected is None else max(0, expected - sample_number)
+        if framenumber is not None and count:
+            state.frames.append((framenumber, sample_number))
+        if skip < count:
+            state.samples.extend(samples[:, skip:].T)
+            state.next_sample = sample_number + count
+        elif expected is None:
+            state.next_sample = sample_number + count
+        return gap
+
+    def _device(self, device):
+        state = self._devices.get(device)
+        if state is None:
+            raise KeyError("No samples from analog device %s" % device)
+        return state
+
+    def samples(self, device, count=None):
+        """The latest samples of a device, oldest first, as a read only view.
+
+        :param count: Number of samples, all if None.
+        :rtype: A (samples, channels) array
+        """
+        return self._device(device).samples.last(count)
+
+    def first_sample_number(self, device, count=None):
+        """ Sample number of the first row of :func:`samples` """
+        state = self._device(device)
+        return state.next_sample - len(state.samples.last(count))
+
+    def statistics(self, device):
+        """ Samples kept, lost and overlapped, and the number of gaps, as a dict """
+        state = self._device(device)
+        return {
+            "samples": len(state.samples),
+            "next_sample_number": state.next_sample,
+            "lost": state.lost,
+            "overlapped": state.overlapped,
+            "gaps": state.gaps,
+        }
+
+    def sample_positions(self, device, framenumbers):
+        """Sample number, with fraction, at the start of frames.
+
+        Interpolated between the first sample numbers of the chunks of the frames
+        received, and extrapolated outside them.
+
+        :rtype: An array of sample positions, NaN if fewer than 2 frames are known
+        """
+        framenumbers = numpy.asarray(framenumbers, dtype=float)
+        known = self._device(device).frames.last()
+        if len(known) < 2:
+            return numpy.full(framenumbers.shape, numpy.nan)
+
+        frames, first_samples = known[:, 0], known[:, 1]
+        slope = (first_samples[-1] - first_samples[0]) / float(frames[-1] - frames[0])
+        positions = numpy.interp(framenumbers, frames, first_samples)
+        before, after = framenumbers < frames[0], framenumbers > frames[-1]
+        positions[before] = first_samples[0] + (framenumbers[before] - frames[0]) * slope
+        positions[after] = first_samples[-1] + (framenumbers[after] - frames[-1]) * slope
+        return positions
+
+    def resample(self, device, framenumbers, method="linear"):
+        """The signal of a device at the frame rate.
+
+        :param framenumbers: Frames to get values for, for example
+            :func:`qtm_rt.history.FrameHistory.framenumbers`.
+        :param method: "linear" for the signal interpolated at the start of every
+            frame, "mean" for the mean of the samples of every frame.
+        :rtype: A (frames, channels) array, NaN where the samples are not kept
+        """
+        if method not in _METHODS:
+            raise ValueError("method must be one of %s" % ", ".join(_METHODS))
+
+        state = self._device(device)
+        samples = state.samples.last()
+        rows = self.sample_positions(device, framenumbers) - state.first_sample
+        result = numpy.full(rows.shape + samples.shape[1:], numpy.nan)
+
+        if method == "linear":
+            with numpy.errstate(invalid="ignore"):
+                inside = (rows >= 0) & (rows <= len(samples) - 1)
+            lower = numpy.floor(rows[inside]).astype(numpy.int64)
+            upper = numpy.minimum(lower + 1, len(samples) - 1)
+            fraction = (rows[inside] - lower)[:, None]
+            result[inside] = samples[lower] * (1 - fraction) + samples[upper] * fraction
+            return result
+
+        ends = self.sample_positions(device, numpy.asarray(framenumbers) + 1)
+        ends = numpy.ceil(ends - state.first_sample)
+        starts = numpy.ceil(rows)
+        with numpy.errstate(invalid="ignore"):
+            inside = (starts >= 0) & (ends <= len(samples)) & (ends > starts)
+        if not inside.any():
+            return result
+        starts = starts[inside].astype(numpy.int64)
+        ends = ends[inside].astype(numpy.int64)
+
+        # Sums over the samples needed, with lost samples counted apart so that a
+        # gap only makes its own frames NaN
+        first = starts.min()
+        span = samples[first : ends.max()]
+        lost = numpy.isnan(span)
+        sums = numpy.zeros((len(span) + 1,) + span.shape[1:])
+        numpy.cumsum(numpy.where(lost, 0.0, span), axis=0, out=sums[1:])
+        lost_sums = numpy.zeros(sums.shape, dtype=numpy.int64)
+        numpy.cumsum(lost, axis=0, out=lost_sums[1:])
+        starts -= first
+        ends -= first
+        means = (sums[ends] - sums[starts]) / (ends - starts)[:, None]
+        means[lost_sums[ends] > lost_sums[starts]] = numpy.nan
+        result[inside] = means
+        return result
@@ -0,0 +1,282 @@
+""" Components of a QRTPacket as NumPy arrays. Requires numpy.
+
+The arrays are read only views of the packet data, so no Python object is created per
+marker or body. Like the getters of :class:`qtm_rt.QRTPacket`, every function returns
+None when the component is not in the packet.
+"""
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.arrays requires numpy") from exception
+
+from qtm_rt.packet import (
+    QRTComponentType,
+    RT3DComponent,
+    RT6DComponent,
+    RTAnalogComponent,
+    RTAnalogDevice,
+    RTAnalogDeviceSingle,
+    RTSampleNumber,
+    RTForceComponent,
+    RTForcePlate,
+    RTForcePlateSingle,
+    RTSkeletonComponent,
+    RTSegmentCount,
+)
+
+_FLOAT = numpy.dtype("<f4")
+_NO_LABEL = numpy.dtype([("position", "<f4", 3), ("id", "<i4")])
+_NO_LABEL_RESIDUAL = numpy.dtype(
+    [("position", "<f4", 3), ("id", "<i4"), ("residual", "<f4")]
+)
+_SEGMENT = numpy.dtype([("id", "<i4"), ("position", "<f4", 3), ("rotation", "<f4", 4)])
+
+
+def _component(packet, type_, header):
+    position = packet.components.get(type_)
+    if position is None:
+        return None, None
+    info = header._make(header.format.unpack_from(packet.data, position))
+    return info, position + header.format.size
+
+
+def _floats(packet, type_, header, width):
+    info, position = _component(packet, type_, header)
+    if info is None:
+        return None
+    return numpy.frombuffer(
+        packet.data, dtype=_FLOAT, count=info[0] * width, offset=position
+    ).reshape(info[0], width)
+
+
+def _records(packet, type_, dtype):
+    info, position = _component(packet, type_, RT3DComponent)
+    if info is None:
+        return None
+    return numpy.frombuffer(packet.data, dtype=dtype, count=info[0], offset=position)
+
+
+def rotation_matrices(matrices):
+    """Rotation matrices as sent by QTM, 9 values per body, as (..., 3, 3) arrays.
+
+    QTM sends the matrix column by column, the result is indexed [row, column].
+    """
+    matrices = numpy.asarray(matrices)
+    return matrices.reshape(matrices.shape[:-1] + (3, 3)).swapaxes(-1, -2)
+
+
+def markers_3d(packet):
+    """Positions of the labelled markers.
+
+    :rtype: A (markers, 3) array
+    """
+    return _floats(packet, QRTComponentType.Component3d, RT3DComponent, 3)
+
+
+def markers_3d_residual(packet):
+    """Positions and residuals of the labelled markers.
+
+    :rtype: A (markers, 3) array of positions and a (markers,) array of residuals
+    """
+    values = _floats(packet, QRTComponentType.Component3dRes, RT3DComponent, 4)
+    if values is None:
+        return None
+    return values[:, :3], values[:, 3]
+
+
+def markers_3d_no_label(packet):
+    """Positions and ids of the unlabelled markers.
+
+    :rtype: A (markers, 3) array of positions and a (markers,) array of ids
+    """
+    records = _records(packet, QRTComponentType.Component3dNoLabels, _NO_LABEL)
+    if records is None:
+        return None
+    return records["position"], records["id"]
+
+
+def markers_3d_no_label_residual(packet):
+    """Positions, ids and residuals of the unlabelled markers.
+
+    :rtype: A (markers, 3) array of positions, a (markers,) array of ids and a
+        (markers,) array of residuals
+    """
+    records = _records(
+        packet, QRTComponentType.Component3dNoLabelsRes, _NO_LABEL_RESIDUAL
+    )
+    if records is None:
+        return None
+    return records["position"], records["id"], records["residual"]
+
+
+def bodies_6d(packet):
+    """Positions and rotation matrices of the rigid bodies.
+
+    Bodies that are not tracked are NaN.
+
+    :rtype: A (bodies, 3) array of positions and a (bodies, 3, 3) array of rotation
+        matrices
+    """
+    values = _floats(packet, QRTComponentType.Component6d, RT6DComponent, 12)
+    if values is None:
+        return None
+    return values[:, :3], rotation_matrices(values[:, 3:])
+
+
+def bodies_6d_residual(packet):
+    """Positions, rotation matrices and residuals of the rigid bodies.
+
+    :rtype: A (bodies, 3) array of positions, a (bodies, 3, 3) array of rotation
+        matrices and a (bodies,) array of residuals
+    """
+    values = _floats(packet, QRTComponentType.Component6dRes, RT6DComponent, 13)
+    if values is None:
+        return None
+    return values[:, :3], rotation_matrices(values[:, 3:12]), values[:, 12]
+
+
+def bodies_6d_euler(packet):
+    """Positions and euler angles, in degrees, of the rigid bodies.
+
+    The angles follow the euler angle definition in the 6DOF settings of QTM.
+
+    :rtype: A (bodies, 3) array of positions and a (bodies, 3) array of angles
+    """
+    values = _floats(packet, QRTComponentType.Component6dEuler, RT6DComponent, 6)
+    if values is None:
+        return None
+    return values[:, :3], values[:, 3:]
+
+
+def bodies_6d_euler_residual(packet):
+    """Positions, euler angles and residuals of the rigid bodies.
+
+    :rtype: A (bodies, 3) array of positions, a (bodies, 3) array of angles and a
+        (bodies,) array of residuals
+    """
+    values = _floats(packet, QRTComponentType.Component6dEulerRes, RT6DComponent, 7)
+    if values is None:
+        return None
+    return values[:, :3], values[:, 3:6], values[:, 6]
+
+
+def skeletons(packet):
+    """Segments of every skeleton.
+
+    :rtype: A list with, per skeleton, a (segments,) array of segment ids, a
+        (segments, 3) array of positions and a (segments, 4) array of rotations as
+        quaternions in x, y, z, w order
+    """
+    info, position = _component(
+        packet, QRTComponentType.ComponentSkeleton, RTSkeletonComponent
+    )
+    if info is None:
+        return None
+
+    result = []
+    for _ in range(info.skeleton_count):
+        count, = RTSegmentCount.format.unpack_from(packet.data, position)
+        position += RTSegmentCount.format.size
+        segments = numpy.frombuffer(
+            packet.data, dtype=_SEGMENT, count=count, offset=position
+        )
+        position += count * _SEGMENT.itemsize
+        result.append((segments["id"], segments["position"], segments["rotation"]))
+    return result
+
+
+def analog(packet):
+    """Samples of every analog device.
+
+    :rtype: A list with, per device, the device id, the sample number of the first
+        sample, None if there are no samples, and a (channels, samples) array
+    """
+    info, position = _component(packet, QRTComponentType.ComponentAnalog, RTAnalogComponent)
+    if info is None:
+        return None
+
+    result = []
+    for _ in range(info.device_count):
+        device = RTAnalogDevice._make(RTAnalogDevice.format.unpack_from(packet.data, position))
+        position += RTAnalogDevice.format.size
+        sample_number = None
+        count = device.channel_count * device.sample_count
+        if device.sample_count > 0:
+            sample_number, = RTSampleNumber.format.unpack_from(packet.data, position)
+            position += RTSampleNumber.format.size
+        samples = numpy.frombuffer(packet.data, dtype=_FLOAT, count=count, offset=position)
+        position += count * _FLOAT.itemsize
+        result.append(
+            (device.id, sample_number, samples.reshape(device.channel_count, device.sample_count))
+        )
+    return result
+
+
+def analog_single(packet):
+    """The latest sample of every analog device.
+
+    :rtype: A list with, per device, the device id and a (channels,) array
+    """
+    info, position = _component(
+        packet, QRTComponentType.ComponentAnalogSingle, RTAnalogComponent
+    )
+    if info is None:
+        return None
+
+    result = []
+    for _ in range(info.device_count):
+        device_id, count = RTAnalogDeviceSingle.format.unpack_from(packet.data, position)
+        position += RTAnalogDeviceSingle.format.size
+        result.append(
+            (device_id, numpy.frombuffer(packet.data, dtype=_FLOAT, count=count, offset=position))
+        )
+        position += count * _FLOAT.itemsize
+    return result
+
+
+def force(packet):
+    """Samples of every force plate.
+
+    Every sample is force x, y, z, moment x, y, z and application point x, y, z, as
+    in :class:`qtm_rt.packet.RTForce`.
+
+    :rtype: A list with, per plate, the plate id, the force number of the first
+        sample and a (samples, 9) array
+    """
+    info, position = _component(packet, QRTComponentType.ComponentForce, RTForceComponent)
+    if info is None:
+        return None
+
+    result = []
+    for _ in range(info.plate_count):
+        plate = RTForcePlate._make(RTForcePlate.format.unpack_from(packet.data, position))
+        position += RTForcePlate.format.size
+        samples = numpy.frombuffer(
+            packet.data, dtype=_FLOAT, count=plate.force_count * 9, offset=position
+        )
+        position += samples.nbytes
+        result.append((plate.id, plate.force_number, samples.reshape(plate.force_count, 9)))
+    return result
+
+
+def force_single(packet):
+    """The latest sample of every force plate.
+
+    :rtype: A list with, per plate, the plate id and a (9,) array
+    """
+    info, position = _component(
+        packet, QRTComponentType.ComponentForceSingle, RTForceComponent
+    )
+    if info is None:
+        return None
+
+    result = []
+    for _ in range(info.plate_count):
+        plate_id, = RTForcePlateSingle.format.unpack_from(packet.data, position)
+        position += RTForcePlateSingle.format.size
+        result.append(
+            (plate_id, numpy.frombuffer(packet.data, dtype=_FLOAT, count=9, offset=position))
+        )
+        position += 9 * _FLOAT.itemsize
+    return result
@@ -0,0 +1,566 @@
+""" Blocking connection to QTM without asyncio """
+
+import collections
+import logging
+import socket
+import time
+
+from qtm_rt.metrics import Metrics
+from qtm_rt.packet import QRTPacketType
+from qtm_rt.protocol import QRTCommandException, QRTTimeoutError, _pack_command
+from qtm_rt.qrt import _PARAMETERS, _validate_components, validate_response
+from qtm_rt.receiver import Receiver
+
+LOG = logging.getLogger("qtm_rt")
+
+
+class _Request(object):
+    """ A command waiting for its response """
+
+    __slots__ = ("response_type", "accepts_error", "streaming", "abandoned", "response")
+
+    def __init__(self, response_type, accepts_error, streaming=False):
+        self.response_type = response_type
+        self.accepts_error = accepts_error
+        # The data response is the first streamed frame, which is also received
+        self.streaming = streaming
+        # Set when the wait for the response timed out, the response is dropped
+        self.abandoned = False
+        # Packet type and content of the response once received
+        self.response = None
+
+
+class BlockingQRTConnection(object):
+    """Connection to QTM on a plain blocking socket.
+
+    Meant for single threaded control loops where the per frame overhead of asyncio
+    matters. Nothing is read from QTM unless a method of the connection is called, so
+    frames are received by calling :func:`recv_frame` in the loop::
+
+        connection = qtm_rt.blocking.connect("127.0.0.1")
+        connection.stream_frames(components=["6d"])
+        while True:
+            packet = connection.recv_frame(timeout=1)
+
+    Received data is read into a preallocated buffer with ``recv_into``, framed by
+    :class:`qtm_rt.Receiver` and parsed into :class:`qtm_rt.QRTPacket` just as for
+    :class:`qtm_rt.QRTConnection`, which has the same command methods.
+
+    Usually created with :func:`qtm_rt.blocking.connect`.
+
+    :param sock: A connected socket.
+    :param on_event: Function to be called when there's an event from QTM.
+    :param timeout: The default timeout time for calls to QTM.
+    :param buffer_size: Size of the receive buffer in bytes.
+    :param max_queued: Number of received frames and events kept until they are
+        read, the oldest are dropped beyond that.
+    """
+
+    def __init__(self, sock, on_event=None, timeout=5, buffer_size=1 << 16, max_queued=1000):
+        self.on_event = on_event
+        self.socket_options = None
+        self.metrics = None
+
+        self._socket = sock
+        self._quickack = False
+        self._timeout = timeout
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+
+        self._frames = collections.deque(maxlen=max_queued)
+        # Commands waiting for a response, in the order they were sent. Responses
+        # are matched to the oldest request of their type, as in QTMProtocol
+        self._requests = collections.deque()
+        self._events = collections.deque(maxlen=max_queued)
+        self._file = None
+
+        self._receiver = Receiver(
+            {
+                QRTPacketType.PacketError: self._on_error,
+                QRTPacketType.PacketCommand: self._on_command,
+                QRTPacketType.PacketXML: self._on_xml,
+                QRTPacketType.PacketData: self._on_data,
+                QRTPacketType.PacketNoMoreData: self._on_no_more_data,
+                QRTPacketType.PacketEvent: self._on_event,
+                QRTPacketType.PacketC3DFile: self._on_file,
+                QRTPacketType.PacketQTMFile: self._on_file,
+            }
+        )
+
+    def disconnect(self):
+        """Disconnect from QTM."""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            LOG.info("Disconnected")
+
+    def has_transport(self):
+        """ Check if connected to QTM """
+        return self._socket is not None
+
+    def enable_metrics(self, metrics=None):
+        """Start counting bytes, packets and time spent on the received data.
+
+        See :func:`qtm_rt.QRTConnection.enable_metrics`.
+        """
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._receiver.metrics = self.metrics
+        return self.metrics
+
+    def disable_metrics(self):
+        """ Stop updating metrics """
+        self.metrics = None
+        self._receiver.metrics = None
+
+    def recv_frame(self, timeout=None):
+        """Receive the next streamed frame.
+
+        :param timeout: Max time to wait for a frame, None to use the connection timeout.
+
+        :rtype: A :class:`qtm_rt.QRTPacket` or None if no frame arrived in time.
+        """
+        try:
+            self._wait(lambda: self._frames, timeout)
+        except QRTTimeoutError:
+            return None
+        return self._frames.popleft()
+
+    def qtm_version(self):
+        """Get the QTM version.
+        """
+        return self._command("qtmversion")
+
+    def byte_order(self):
+        """Get the byte order used when communicating
+            (should only ever be little endian using this library).
+        """
+        return self._command("byteorder")
+
+    def get_state(self):
+        """Get the latest state change of QTM.
+
+        :rtype: A :class:`qtm_rt.QRTEvent`
+        """
+        self._events.clear()
+        self._send("getstate")
+        return self._await_event(None, self._timeout)
+
+    def await_event(self, event=None, timeout=30):
+        """Wait for an event from QTM.
+
+        :param event: A :class:`qtm_rt.QRTEvent`
+            to wait for a specific event. Otherwise wait for any event.
+
+        :param timeout: Max time to wait for event.
+
+        :rtype: A :class:`qtm_rt.QRTEvent`
+        """
+        self._events.clear()
+        return self._await_event(event, timeout)
+
+    def get_parameters(self, parameters=None):
+        """Get the settings for the requested component(s) of QTM in XML format.
+
+        See :func:`qtm_rt.QRTConnection.get_parameters`.
+        """
+        if parameters is None:
+            parameters = ["all"]
+        else:
+            for parameter in parameters:
+                if not parameter in _PARAMETERS:
+                    raise QRTCommandException("%s is not a valid parameter" % parameter)
+
+        cmd = "getparameters %s" % " ".join(parameters)
+        return self._command(cmd, QRTPacketType.PacketXML)
+
+    def get_current_frame(self, components=None):
+        """Get measured values from QTM for a single frame.
+
+        See :func:`qtm_rt.QRTConnection.get_current_frame`.
+
+        :rtype: A :class:`qtm_rt.QRTPacket` containing requested components
+        """
+        _validate_components(components)
+
+        self._frames.clear()
+        type_, packet = self._command(
+            "getcurrentframe %s" % " ".join(components), QRTPacketType.PacketData
+        )
+        if type_ == QRTPacketType.PacketNoMoreData:
+            raise QRTCommandException("No more data")
+        return packet
+
+    def stream_frames(self, frames="allframes", components=None):
+        """Stream measured frames from QTM until
+        :func:`~qtm_rt.blocking.BlockingQRTConnection.stream_frames_stop` is called.
+        The frames are received with :func:`recv_frame`.
+
+        See :func:`qtm_rt.QRTConnection.stream_frames`.
+
+        :rtype: The string 'Ok' if successful
+        """
+        _validate_components(components)
+
+        self._frames.clear()
+        self._command(
+            "streamframes %s %s" % (frames, " ".join(components)),
+            QRTPacketType.PacketData,
+            streaming=True,
+        )
+        return b"Ok"
+
+    def stream_frames_stop(self):
+        """Stop streaming frames."""
+        self._send("streamframes stop")
+        self._frames.clear()
+
+    @validate_response([b"You are now master"])
+    def take_control(self, password):
+        """Take control of QTM.
+
+        :param password: Password as entered in QTM.
+        """
+        return self._command("takecontrol %s" % password)
+
+    @validate_response([b"You are now a regular client"])
+    def release_control(self):
+        """Release control of QTM.
+        """
+        return self._command("releasecontrol")
+
+    @validate_response([b"Creating new connection", b"Already connected"])
+    def new(self):
+        """Create a new measurement.
+        """
+        return self._command("new")
+
+    @validate_response(
+        [
+            b"Closing connection",
+            b"File closed",
+            b"Closing file",
+            b"No connection to close",
+        ]
+    )
+    def close(self):
+        """Close a measurement
+        """
+        return self._command("close")
+
+    @validate_response([b"Starting measurement", b"Starting RT from file"])
+    def start(self, rtfromfile=False):
+        """Start RT from file. You need to be in control of QTM to be able to do this.
+        """
+        return self._command("start" + (" rtfromfile" if rtfromfile else ""))
+
+    @validate_response([b"Stopping measurement"])
+    def stop(self):
+        """Stop RT from file."""
+        return self._command("stop")
+
+    @validate_response([b"Measurement loaded"])
+    def load(self, filename):
+        """Load a measurement.
+
+        :param filename: Path to measurement you want to load.
+        """
+        return self._command("load %s" % filename)
+
+    @validate_response([b"Measurement saved"])
+    def save(self, filename, overwrite=False):
+        """Save a measurement.
+
+        :param filename: Filename you wish to save as.
+        :param overwrite: If QTM should overwrite existing measurement.
+        """
+        return self._command("save %s%s" % (filename, " overwrite" if overwrite else ""))
+
+    @validate_response([b"Project loaded"])
+    def load_project(self, project_path):
+        """Load a project.
+
+        :param project_path: Path to project you want to load.
+        """
+        return self._command("loadproject %s" % project_path)
+
+    @validate_response([b"Trig ok"])
+    def trig(self):
+        """Trigger QTM, only possible when QTM is configured to use Software/Wireless trigger"""
+        return self._command("trig")
+
+    @validate_response([b"Event set"])
+    def set_qtm_event(self, event=None):
+        """Set event in QTM."""
+        return self._command("event%s" % ("" if event is None else " " + event))
+
+    def send_xml(self, xml):
+        """Used to update QTM settings, see QTM RT protocol for more information.
+
+        :param xml: XML document as a str. See QTM RT Documentation for details.
+        """
+        return self._command(xml, command_type=QRTPacketType.PacketXML)
+
+    def calibrate(self, timeout=600):  # Timeout 10 min.
+        """Start calibration and return calibration result.
+
+        :rtype: An XML string containing the calibration result.
+            See QTM RT Documentation for details.
+        """
+        request = self._request(QRTPacketType.PacketCommand)
+        # The result is expected before sending, it can arrive in the same read
+        result = self._request(QRTPacketType.PacketXML, accepts_error=False)
+        try:
+            self._send("calibrate")
+            response = self._await_response(request, self._timeout)
+            if response != b"Starting calibration":
+                raise QRTCommandException(response)
+        except QRTCommandException:
+            result.abandoned = True
+            raise
+
+        return self._await_response(result, timeout)
+
+    def get_capture_c3d(self, output, timeout=None):
+        """Get the latest capture as a C3D file, written as it arrives.
+
+        :param output: Path of the file to create, or a writable binary file object.
+        :param timeout: Max time to wait between parts of the file, None to use the
+            connection timeout.
+
+        :rtype: The size of the file in bytes.
+        """
+        return self._get_capture("getcapturec3d", output, timeout)
+
+    def get_capture_qtm(self, output, timeout=None):
+        """Get the latest capture as a QTM file, written as it arrives.
+
+        :param output: Path of the file to create, or a writable binary file object.
+        :param timeout: Max time to wait between parts of the file, None to use the
+            connection timeout.
+
+        :rtype: The size of the file in bytes.
+        """
+        return self._get_capture("getcaptureqtm", output, timeout)
+
+    def _get_capture(self, cmd, output, timeout):
+        if hasattr(output, "write"):
+            writable = output
+        else:
+            writable = open(output, "wb")
+
+        self._file = [writable, None]
+        try:
+            response = self._command(cmd)
+            if response != b"Sending capture":
+                raise QRTCommandException(response)
+
+            while self._file[1] is None:
+                self._receive(self._timeout if timeout is None else timeout)
+            return self._file[1]
+        finally:
+            self._file = None
+            if writable is not output:
+                writable.close()
+
+    def _request(self, response_type, accepts_error=True, streaming=False):
+        request = _Request(response_type, accepts_error, streaming)
+        self._requests.append(request)
+        return request
+
+    def _send(self, command, command_type=QRTPacketType.PacketCommand):
+        if self._socket is None:
+            raise QRTCommandException("Not connected!")
+        LOG.debug("S: %s", command)
+        try:
+            self._socket.sendall(_pack_command(command, command_type))
+        except ConnectionError as exception:
+            self.disconnect()
+            raise QRTCommandException("Disconnected: %s" % exception)
+
+    def _command(
+        self,
+        command,
+        response_type=QRTPacketType.PacketCommand,
+        command_type=QRTPacketType.PacketCommand,
+        streaming=False,
+    ):
+        request = self._request(response_type, streaming=streaming)
+        try:
+            self._send(command, command_type)
+        except QRTCommandException:
+            self._requests.remove(request)
+            raise
+        response = self._await_response(request, self._timeout)
+        if response_type == QRTPacketType.PacketData:
+            return request.response
+        return response
+
+    def _await_response(self, request, timeout):
+        """ Receive until the response to request, raises QRTTimeoutError """
+        try:
+            self._wait(lambda: request.response is not None, timeout)
+        except QRTTimeoutError:
+            # A late response is dropped instead of answering the next command
+            request.abandoned = True
+            raise
+        type_, response = request.response
+        if type_ == QRTPacketType.PacketError:
+            raise QRTCommandException(response)
+        return response
+
+    def _deliver(self, response_type, type_, response):
+        """ Match a response to the oldest request of its type """
+        for request in self._requests:
+            if request.response_type == response_type:
+                break
+        else:
+            return None
+
+        self._requests.remove(request)
+        if request.abandoned:
+            LOG.debug("Dropping late %s response", type_.name)
+        else:
+            request.response = (type_, response)
+        return request
+
+    def _await_event(self, event, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            self._wait(lambda: self._events, deadline - time.monotonic())
+            result = self._events.popleft()
+            if event is None or event == result:
+                return result
+
+    def _wait(self, ready, timeout=None):
+        """ Receive until ready() is true, raises QRTTimeoutError """
+        if ready():
+            return
+
+        timeout = self._timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            self._receive(deadline - time.monotonic())
+            if ready():
+                return
+
+    def _receive(self, timeout):
+        if self._socket is None:
+            raise QRTCommandException("Not connected!")
+        if timeout <= 0:
+            raise QRTTimeoutError("Timed out")
+
+        self._socket.settimeout(timeout)
+        if self._quickack:
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        try:
+            size = self._socket.recv_into(self._buffer)
+        except socket.timeout:
+            raise QRTTimeoutError("Timed out") from None
+        except ConnectionError:
+            size = 0
+        if size == 0:
+            self.disconnect()
+            raise QRTCommandException("Disconnected")
+        # The receiver copies out what it keeps before the buffer is reused
+        self._receiver.data_received(self._view[:size])
+
+    def _on_error(self, response):
+        LOG.debug("Error: %s", response)
+        for request in self._requests:
+            if request.accepts_error:
+                break
+        else:
+            LOG.error("Error without a command: %s", response)
+            return
+
+        self._requests.remove(request)
+        if not request.abandoned:
+            request.response = (QRTPacketType.PacketError, response)
+
+    def _on_xml(self, response):
+        LOG.debug("XML: %s ...", response[: min(len(response), 70)])
+        self._deliver(QRTPacketType.PacketXML, QRTPacketType.PacketXML, response)
+
+    def _on_command(self, response):
+        LOG.debug("R: %s", response)
+        if response != b"QTM RT Interface connected":
+            self._deliver(QRTPacketType.PacketCommand, QRTPacketType.PacketCommand, response)
+
+    def _on_data(self, packet):
+        request = self._deliver(QRTPacketType.PacketData, QRTPacketType.PacketData, packet)
+        # The frame answering get_current_frame is only returned by it
+        if request is None or (request.streaming and not request.abandoned):
+            self._frames.append(packet)
+
+    def _on_no_more_data(self, response):
+        self._deliver(QRTPacketType.PacketData, QRTPacketType.PacketNoMoreData, response)
+
+    def _on_event(self, event):
+        LOG.info(event)
+        self._events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def _on_file(self, chunk):
+        if self._file is None:
+            if chunk.received == len(chunk.data):
+                LOG.warning("Discarding unrequested %s", chunk.type.name)
+            return
+
+        self._file[0].write(chunk.data)
+        if chunk.received == chunk.size:
+            self._file[1] = chunk.size
+
+
+def connect(
+    host,
+    port=22223,
+    version="1.25",
+    on_event=None,
+    timeout=5,
+    latency_profile=None,
+    buffer_size=1 << 16,
+    max_queued=1000,
+):
+    """Connect to QTM with a blocking socket.
+
+    :param host: Address of the computer running QTM.
+    :param port: Port number to connect to, should be the port configured for little endian.
+    :param version: Version of the rt protocol to use.
+    :param on_event: Function to be called when there's an event from QTM.
+    :param timeout: The default timeout time for calls to QTM.
+    :param latency_profile: A :class:`qtm_rt.latency.LatencyProfile` to tune the socket
+        with.
+    :param buffer_size: Size of the receive buffer in bytes.
+    :param max_queued: Number of received frames and events kept until they are read.
+
+    :rtype: A :class:`BlockingQRTConnection` or None if the connection failed.
+    """
+    try:
+        sock = socket.create_connection((host, port), timeout=timeout)
+    except OSError as exception:
+        LOG.error(exception)
+        return None
+    LOG.info("Connected")
+
+    connection = BlockingQRTConnection(
+        sock,
+        on_event=on_event,
+        timeout=timeout,
+        buffer_size=buffer_size,
+        max_queued=max_queued,
+    )
+    if latency_profile is not None:
+        connection.socket_options = latency_profile.apply(sock)
+        connection._quickack = bool(  # pylint: disable=W0212
+            latency_profile.quickack and hasattr(socket, "TCP_QUICKACK")
+        )
+
+    try:
+        connection._command("version %s" % version)  # pylint: disable=W0212
+    except (QRTCommandException, OSError) as exception:
+        LOG.error(exception)
+        connection.disconnect()
+        return None
+
+    return connection
@@ -0,0 +1,430 @@
+""" Incremental C3D writer for streamed 3D and analog data """
+
+from collections import deque
+import logging
+import math
+import os
+import struct
+
+from qtm_rt import parameters as qtm_parameters
+from qtm_rt.packet import QRTComponentType
+
+LOG = logging.getLogger("qtm_rt")
+
+# pylint: disable=C0103
+
+C3D_BLOCK_SIZE = 512
+C3D_PARAMETER_BLOCK = 2
+C3D_KEY = 0x50
+C3D_PROCESSOR_INTEL = 84
+
+C3DHeader = struct.Struct("<BBHHHHHfHHf")
+C3DParameterHeader = struct.Struct("<BBBB")
+
+_TYPE_CHAR = -1
+_TYPE_INT16 = 2
+_TYPE_FLOAT = 4
+
+_MAX_UINT16 = 0xFFFF
+
+
+class _Parameters(object):
+    """ Builder for the C3D parameter section """
+
+    def __init__(self):
+        self._groups = []
+        self._parameters = []
+
+    def group(self, group_id, name, description=""):
+        self._groups.append((group_id, name, description))
+
+    def add(self, group_id, name, type_, dimensions, data, description=""):
+        self._parameters.append((group_id, name, type_, dimensions, data, description))
+
+    def add_int16(self, group_id, name, values, description=""):
+        dimensions = () if len(values) == 1 else (len(values),)
+        self.add(
+            group_id,
+            name,
+            _TYPE_INT16,
+            dimensions,
+            struct.pack("<%dH" % len(values), *[value & _MAX_UINT16 for value in values]),
+            description,
+        )
+
+    def add_float(self, group_id, name, values, description=""):
+        dimensions = () if len(values) == 1 else (len(values),)
+        self.add(
+            group_id,
+            name,
+            _TYPE_FLOAT,
+            dimensions,
+            struct.pack("<%df" % len(values), *values),
+            description,
+        )
+
+    def add_strings(self, group_id, name, strings, description=""):
+        encoded = [string.encode("latin-1", "replace") for string in strings]
+        width = max([len(string) for string in encoded] + [1])
+        data = b"".join(string.ljust(width) for string in encoded)
+        self.add(
+            group_id, name, _TYPE_CHAR, (width, len(encoded)), data, description
+        )
+
+    def serialize(self):
+        """Serialize all groups and parameters.
+
+        :rtype: The bytes following the parameter section header and a dict with the
+            offset of the data of each parameter, keyed by (group id, name).
+        """
+        items = []
+        offsets = {}
+        position = 0
+
+        for group_id, name, description in self._groups:
+            name, description = name.encode(), description.encode()
+            items.append(
+                [
+                    struct.pack("<bb", len(name), -group_id) + name,
+                    3 + len(description),
+                    struct.pack("<B", len(description)) + description,
+                ]
+            )
+
+        for group_id, name, type_, dimensions, data, description in self._parameters:
+            name, description = name.encode(), description.encode()
+            head = struct.pack("<bb", len(name), group_id) + name
+            body = struct.pack("<bB", type_, len(dimensions))
+            body += struct.pack("<%dB" % len(dimensions), *dimensions)
+            offsets[(group_id, name.decode())] = (len(items), len(head) + 2 + len(body))
+            body += data + struct.pack("<B", len(description)) + description
+            items.append([head, 2 + len(body), body])
+
+        items[-1][1] = 0  # Marks the last item
+
+        result = b""
+        item_positions = []
+        for head, next_offset, body in items:
+            item_positions.append(position)
+            item = head + struct.pack("<h", next_offset) + body
+            result += item
+            position += len(item)
+
+        return (
+            result,
+            {
+                key: item_positions[index] + offset
+                for key, (index, offset) in offsets.items()
+            },
+        )
+
+
+class C3DWriter(object):
+    """Write streamed frames to a C3D file as they arrive.
+
+    Frames are written to the file directly, only frames waiting for their analog
+    samples are kept in memory. The frame count in the header and parameter section
+    is patched when the writer is closed. Data is stored as floats.
+
+    Analog data must be sampled at an integer multiple of the point rate. Each frame
+    is written once all of its analog samples have arrived; missing samples are
+    written as zeros when more than ``max_pending`` frames are waiting or when the
+    writer is closed.
+
+    ::
+
+        xml = await connection.get_parameters(parameters=["general", "3d", "analog"])
+        writer = C3DWriter.from_parameters("capture.c3d", xml)
+        await connection.stream_frames(components=["3dres", "analog"], on_packet=writer.add_packet)
+        ...
+        writer.close()
+
+    :param file: Path or seekable binary file object to write to.
+    :param point_labels: Labels of the 3D points.
+    :param point_rate: 3D frame rate in Hz.
+    :param analog_labels: Labels of the analog channels.
+    :param analog_rate: Analog sample rate in Hz, required if there are analog channels.
+    :param point_units: Unit of the 3D data.
+    :param analog_units: Unit of the analog data.
+    :param max_pending: Max number of frames kept waiting for analog samples.
+    """
+
+    def __init__(
+        self,
+        file,
+        point_labels,
+        point_rate,
+        analog_labels=(),
+        analog_rate=None,
+        point_units="mm",
+        analog_units="V",
+        max_pending=100,
+    ):
+        self.point_labels = list(point_labels)
+        self.analog_labels = list(analog_labels)
+        self.point_rate = float(point_rate)
+        self.max_pending = max_pending
+
+        if self.analog_labels:
+            if analog_rate is None:
+                raise ValueError("analog_rate is required for analog channels")
+            ratio = analog_rate / self.point_rate
+            if ratio < 1 or abs(ratio - round(ratio)) > 1e-6:
+                raise ValueError(
+                    "Analog rate %s is not a multiple of point rate %s"
+                    % (analog_rate, point_rate)
+                )
+            self.analog_ratio = int(round(ratio))
+        else:
+            self.analog_ratio = 0
+
+        self.frame_count = 0
+        self.dropped_samples = 0
+
+        self._point_format = struct.Struct("<%df" % (4 * len(self.point_labels)))
+        self._analog_format = struct.Struct(
+            "<%df" % (self.analog_ratio * len(self.analog_labels))
+        )
+        self._pending_points = deque()
+        self._analog_devices = []
+        self._analog_buffers = []
+        self._analog_widths = []
+
+        if hasattr(file, "write"):
+            self._file = file
+            self._owns_file = False
+        else:
+            self._file = open(os.fspath(file), "wb")
+            self._owns_file = True
+
+        self._start = self._file.tell()
+        self._write_header(point_units, analog_units)
+
+    @classmethod
+    def from_parameters(cls, file, xml, **kwargs):
+        """Create a writer using labels and rates from the parameter XML.
+
+        The XML must contain the general and 3D settings, and the analog settings if
+        analog data is to be written. All analog devices must use the same rate.
+        """
+        point_rate = qtm_parameters.frequency(xml)
+        if point_rate is None:
+            raise ValueError("Parameters do not contain the capture frequency")
+
+        devices = qtm_parameters.analog_devices(xml)
+        rates = set(device.frequency for device in devices)
+        if len(rates) > 1:
+            raise ValueError("Analog devices use different rates: %s" % sorted(rates))
+
+        return cls(
+            file,
+            qtm_parameters.marker_labels(xml),
+            point_rate,
+            analog_labels=[label for device in devices for label in device.channels],
+            analog_rate=rates.pop() if rates else None,
+            **kwargs
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, _):
+        self.close()
+
+    def _write_header(self, point_units, analog_units):
+        point_count = len(self.point_labels)
+        analog_count = len(self.analog_labels)
+
+        parameters = _Parameters()
+        parameters.group(1, "POINT", "3-D point parameters")
+        parameters.group(2, "ANALOG", "Analog data parameters")
+        parameters.group(3, "TRIAL", "Trial information")
+
+        parameters.add_int16(1, "USED", [point_count])
+        parameters.add_float(1, "SCALE", [-1.0])
+        parameters.add_float(1, "RATE", [self.point_rate])
+        parameters.add_int16(1, "DATA_START", [0])
+        parameters.add_int16(1, "FRAMES", [0])
+        parameters.add_strings(1, "LABELS", self.point_labels)
+        parameters.add_strings(1, "DESCRIPTIONS", [""] * point_count)
+        parameters.add_strings(1, "UNITS", [point_units])
+
+        parameters.add_int16(2, "USED", [analog_count])
+        parameters.add_float(
+            2, "RATE", [self.point_rate * self.analog_ratio if analog_count else 0.0]
+        )
+        parameters.add_float(2, "GEN_SCALE", [1.0])
+        parameters.add_float(2, "SCALE", [1.0] * max(analog_count, 1))
+        parameters.add_int16(2, "OFFSET", [0] * max(analog_count, 1))
+        parameters.add_strings(2, "LABELS", self.analog_labels)
+        parameters.add_strings(2, "DESCRIPTIONS", [""] * analog_count)
+        parameters.add_strings(2, "UNITS", [analog_units] * analog_count)
+
+        parameters.add_int16(3, "ACTUAL_START_FIELD", [1, 0])
+        parameters.add_int16(3, "ACTUAL_END_FIELD", [0, 0])
+
+        items, offsets = parameters.serialize()
+        block_count = int(math.ceil((C3DParameterHeader.size + len(items)) / C3D_BLOCK_SIZE))
+        self._data_start = C3D_PARAMETER_BLOCK + block_count
+
+        # Positions of values patched later, relative to the start of the file
+        section = (C3D_PARAMETER_BLOCK - 1) * C3D_BLOCK_SIZE + C3DParameterHeader.size
+        data_start = section + offsets[(1, "DATA_START")]
+        self._frames_position = section + offsets[(1, "FRAMES")]
+        self._end_field_position = section + offsets[(3, "ACTUAL_END_FIELD")]
+
+        header = C3DHeader.pack(
+            C3D_PARAMETER_BLOCK,
+            C3D_KEY,
+            point_count,
+            analog_count * self.analog_ratio,
+            1,
+            0,
+            0,
+            -1.0,
+            self._data_start,
+            self.analog_ratio,
+            self.point_rate,
+        )
+        section_data = C3DParameterHeader.pack(
+            1, C3D_KEY, block_count, C3D_PROCESSOR_INTEL
+        ) + items
+
+        file_data = bytearray(self._data_start * C3D_BLOCK_SIZE - C3D_BLOCK_SIZE)
+        file_data[: len(header)] = header
+        file_data[C3D_BLOCK_SIZE : C3D_BLOCK_SIZE + len(section_data)] = section_data
+        struct.pack_into(
+            "<H", file_data, data_start, self._data_start
+        )
+        self._file.write(bytes(file_data))
+
+    def add_points(self, points):
+        """Add one frame of 3D points.
+
+        :param points: A sequence with one (x, y, z) or (x, y, z, residual) per label.
+            Points containing NaN are written as missing.
+        """
+        if len(points) != len(self.point_labels):
+            raise ValueError(
+                "Expected %d points but got %d" % (len(self.point_labels), len(points))
+            )
+
+        values = []
+        for point in points:
+            x, y, z = point[0], point[1], point[2]
+            if math.isnan(x) or math.isnan(y) or math.isnan(z):
+                values += (0.0, 0.0, 0.0, -1.0)
+            else:
+                residual = point[3] if len(point) > 3 else 0.0
+                residual = 0.0 if math.isnan(residual) else min(round(residual), 255)
+                values += (x, y, z, float(residual))
+
+        self._pending_points.append(self._point_format.pack(*values))
+        self._write_frames()
+
+    def add_analog(self, samples, device=0):
+        """Add analog samples.
+
+        :param samples: A sequence of samples, each a sequence with one value per
+            channel of the device.
+        :param device: Index of the device when analog data comes from several devices,
+            in the order their channels appear in analog_labels.
+        """
+        if not self.analog_ratio:
+            raise ValueError("Writer has no analog channels")
+
+        while len(self._analog_buffers) <= device:
+            self._analog_buffers.append(deque())
+            self._analog_widths.append(0)
+
+        buffer = self._analog_buffers[device]
+        buffer.extend(samples)
+        if samples:
+            self._analog_widths[device] = len(samples[0])
+
+        limit = self.analog_ratio * (self.max_pending + 1)
+        while len(buffer) > limit:
+            buffer.popleft()
+            self.dropped_samples += 1
+
+        self._write_frames()
+
+    def add_packet(self, packet):
+        """ Add 3D and analog data from a packet, can be used as the on_packet callback """
+        if QRTComponentType.ComponentAnalog in packet.components and self.analog_ratio:
+            _, channels = packet.get_analog()
+            devices = {}
+            for device, _, channel in channels:
+                devices.setdefault(device.id, []).append(channel.samples)
+
+            for device_id, device_channels in devices.items():
+                if device_id not in self._analog_devices:
+                    self._analog_devices.append(device_id)
+                self.add_analog(
+                    list(zip(*device_channels)),
+                    device=self._analog_devices.index(device_id),
+                )
+
+        if QRTComponentType.Component3dRes in packet.components:
+            _, markers = packet.get_3d_markers_residual()
+            self.add_points(markers)
+        elif QRTComponentType.Component3d in packet.components:
+            _, markers = packet.get_3d_markers()
+            self.add_points(markers)
+
+    def _write_frames(self, force=False):
+        pending = self._pending_points
+        buffers = self._analog_buffers
+        ratio = self.analog_ratio
+
+        while pending:
+            complete = not ratio or (
+                buffers and all(len(buffer) >= ratio for buffer in buffers)
+            )
+            if not complete and not force and len(pending) <= self.max_pending:
+                break
+
+            data = pending.popleft()
+            if ratio:
+                values = []
+                rows = [
+                    [
+                        buffer.popleft() if buffer else (0.0,) * width
+                        for _ in range(ratio)
+                    ]
+                    for buffer, width in zip(buffers, self._analog_widths)
+                ]
+                for sample in range(ratio):
+                    for row in rows:
+                        values += row[sample]
+                missing = self._analog_format.size // 4 - len(values)
+                if missing > 0:
+                    LOG.debug("Padding frame with %d analog values", missing)
+                    values += [0.0] * missing
+                elif missing < 0:
+                    raise ValueError("More analog channels than labels")
+                data += self._analog_format.pack(*values)
+
+            self._file.write(data)
+            self.frame_count += 1
+
+    def close(self):
+        """ Write pending frames and patch the frame count """
+        if self._file is None:
+            return
+
+        self._write_frames(force=True)
+
+        end = self._file.tell()
+        last_frame = self.frame_count
+        self._file.seek(self._start + 8)
+        self._file.write(struct.pack("<H", min(last_frame, _MAX_UINT16)))
+        self._file.seek(self._start + self._frames_position)
+        self._file.write(struct.pack("<H", min(last_frame, _MAX_UINT16)))
+        self._file.seek(self._start + self._end_field_position)
+        self._file.write(struct.pack("<HH", last_frame & _MAX_UINT16, last_frame >> 16))
+        self._file.seek(end)
+
+        if self._owns_file:
+            self._file.close()
+        self._file = None
@@ -0,0 +1,289 @@
+""" Command line tools, run with python -m qtm_rt """
+
+import argparse
+import asyncio
+import collections
+import json
+import sys
+import time
+
+from qtm_rt.clock import ClockOffset
+from qtm_rt.discovery import DiscoveryService
+from qtm_rt.packet import QRTComponentType, QRTPacketType, RTheader
+from qtm_rt.protocol import QRTCommandException
+from qtm_rt.qrt import connect
+
+_DECODERS = {
+    QRTComponentType.Component2d: "get_2d_markers",
+    QRTComponentType.Component2dLin: "get_2d_markers_linearized",
+    QRTComponentType.Component3d: "get_3d_markers",
+    QRTComponentType.Component3dRes: "get_3d_markers_residual",
+    QRTComponentType.Component3dNoLabels: "get_3d_markers_no_label",
+    QRTComponentType.Component3dNoLabelsRes: "get_3d_markers_no_label_residual",
+    QRTComponentType.ComponentAnalog: "get_analog",
+    QRTComponentType.ComponentAnalogSingle: "get_analog_single",
+    QRTComponentType.ComponentForce: "get_force",
+    QRTComponentType.ComponentForceSingle: "get_force_single",
+    QRTComponentType.Component6d: "get_6d",
+    QRTComponentType.Component6dRes: "get_6d_residual",
+    QRTComponentType.Component6dEuler: "get_6d_euler",
+    QRTComponentType.Component6dEulerRes: "get_6d_euler_residual",
+    QRTComponentType.ComponentImage: "get_image",
+    QRTComponentType.ComponentGazeVector: "get_gaze_vectors",
+    QRTComponentType.ComponentEyeTracker: "get_eye_trackers",
+    QRTComponentType.ComponentTimecode: "get_timecode",
+    QRTComponentType.ComponentSkeleton: "get_skeletons",
+}
+
+_CLEAR = "\x1b[H\x1b[J"
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class StreamStats(object):
+    """Throughput, gaps, latency and decode cost of a stream of packets.
+
+    Latency is measured relative to the fastest frame delivered during the last
+    ``clock_window`` seconds, as the offset between the local clock and QTM's
+    timestamps is not known and drifts.
+
+    :param window: Number of latencies kept for the percentiles.
+    :param clock_window: Seconds of frames the fastest delivery is taken from.
+    """
+
+    def __init__(self, window=10000, clock=time.perf_counter, clock_window=10.0):
+        self.clock = clock
+        self.start = clock()
+        self.frames = 0
+        self.bytes = 0
+        self.gaps = 0
+        self.missing = 0
+        self.latencies = collections.deque(maxlen=window)
+        self.decode = {}
+
+        self._last_framenumber = None
+        self._clock_offset = ClockOffset(clock_window)
+        self._previous = (self.start, 0, 0)
+
+    def add(self, packet, now=None):
+        """ Count a packet, decoding all its components """
+        now = self.clock() if now is None else now
+        self.frames += 1
+        self.bytes += RTheader.size + len(packet.data)
+
+        last = self._last_framenumber
+        if last is not None and packet.framenumber > last + 1:
+            self.gaps += 1
+            self.missing += packet.framenumber - last - 1
+        elif last is not None and packet.framenumber <= last:
+            self._clock_offset.reset()  # Timestamps restarted with a new measurement
+        self._last_framenumber = packet.framenumber
+
+        offset = self._clock_offset.add(now, packet.timestamp / 1e6)
+        self.latencies.append(offset - self._clock_offset.offset)
+
+        clock = self.clock
+        for component in packet.components:
+            decoder = _DECODERS.get(component)
+            if decoder is None:
+                continue
+            start = clock()
+            getattr(packet, decoder)()
+            cost = self.decode.setdefault(component, [0, 0.0])
+            cost[0] += 1
+            cost[1] += clock() - start
+
+    def rates(self):
+        """ Frames and bytes per second since the previous call """
+        now = self.clock()
+        start, frames, size = self._previous
+        self._previous = (now, self.frames, self.bytes)
+        elapsed = max(now - start, 1e-9)
+        return (self.frames - frames) / elapsed, (self.bytes - size) / elapsed
+
+    def summary(self):
+        """ All statistics since start as a dict """
+        elapsed = max(self.clock() - self.start, 1e-9)
+        latencies = list(self.latencies)
+        return {
+            "elapsed": elapsed,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "frames_per_second": self.frames / elapsed,
+            "megabytes_per_second": self.bytes / elapsed / 1e6,
+            "gaps": self.gaps,
+            "missing_frames": self.missing,
+            "latency_p50": _percentile(latencies, 0.5) if latencies else None,
+            "latency_p99": _percentile(latencies, 0.99) if latencies else None,
+            "latency_max": max(latencies) if latencies else None,
+            "decode_seconds": {
+                component.name: total / count
+                for component, (count, total) in self.decode.items()
+            },
+        }
+
+
+def _ms(value):
+    return "-" if value is None else "%.2f ms" % (value * 1e3)
+
+
+def render(stats, target, components):
+    """ Text view of the statistics """
+    frame_rate, byte_rate = stats.rates()
+    summary = stats.summary()
+    lines = [
+        "qtm_rt top  %s  components %s  elapsed %.0f s"
+        % (target, " ".join(components), summary["elapsed"]),
+        "",
+        "frames/s  %9.1f    MB/s %7.3f    frames %d"
+        % (frame_rate, byte_rate / 1e6, summary["frames"]),
+        "gaps      %9d    missing frames %d" % (summary["gaps"], summary["missing_frames"]),
+        "latency   p50 %s  p99 %s  max %s  (relative to the fastest frame)"
+        % (
+            _ms(summary["latency_p50"]),
+            _ms(summary["latency_p99"]),
+            _ms(summary["latency_max"]),
+        ),
+        "",
+        "decode per frame",
+    ]
+    for name, cost in sorted(summary["decode_seconds"].items()):
+        lines.append("  %-24s %8.1f us" % (name, cost * 1e6))
+    return "\n".join(lines)
+
+
+async def _find_server(timeout):
+    servers = await DiscoveryService(timeout=timeout).scan()
+    if not servers:
+        return None
+    server = servers[0]
+    # Discovery reports the base port, the little endian protocol is on the next
+    return server.host, server.port + 1
+
+
+async def top(args):
+    """ Stream from QTM and show statistics """
+    if args.host is None:
+        server = await _find_server(args.timeout)
+        if server is None:
+            print("No QTM found, use --host", file=sys.stderr)
+            return 1
+        host, port = server
+    else:
+        host, port = args.host, args.port
+    target = "%s:%d" % (host, port)
+
+    connection = await connect(host, port=port, version=args.version, timeout=args.timeout)
+    if connection is None:
+        print("Failed to connect to %s" % target, file=sys.stderr)
+        return 1
+
+    stats = StreamStats()
+    record = open(args.record, "wb") if args.record else None
+
+    data_type = QRTPacketType.PacketData.value
+
+    def on_packet(packet):
+        stats.add(packet)
+        if record is not None:
+            record.write(RTheader.pack(RTheader.size + len(packet.data), data_type))
+            record.write(packet.data)
+
+    interactive = args.bench is None and sys.stdout.isatty()
+    loop = asyncio.get_event_loop()
+    try:
+        try:
+            await connection.stream_frames(
+                frames=args.frames, components=args.components, on_packet=on_packet
+            )
+        except QRTCommandException as exception:
+            print("Failed to stream from %s: %s" % (target, exception), file=sys.stderr)
+            return 1
+        deadline = None if args.bench is None else loop.time() + args.bench
+        while deadline is None or loop.time() < deadline:
+            interval = args.interval
+            if deadline is not None:
+                interval = min(interval, deadline - loop.time())
+            await asyncio.sleep(max(interval, 0))
+            if args.bench is None:
+                view = render(stats, target, args.components)
+                print(_CLEAR + view if interactive else view + "\n", flush=True)
+        await connection.stream_frames_stop()
+    finally:
+        if connection.has_transport():
+            connection.disconnect()
+        if record is not None:
+            record.close()
+
+    if args.bench is not None:
+        summary = stats.summary()
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            print(render(stats, target, args.components))
+    return 0
+
+
+async def discover(args):
+    """ List QTM servers on the local networks, with the port to connect to """
+    servers = await DiscoveryService(timeout=args.timeout).scan()
+    if not servers:
+        print("No QTM found", file=sys.stderr)
+    for server in servers:
+        print(
+            "%s:%d  %s"
+            % (server.host, server.port + 1, server.info.decode(errors="replace"))
+        )
+    return 0 if servers else 1
+
+
+def parser():
+    """ The argument parser of python -m qtm_rt """
+    root = argparse.ArgumentParser(prog="python -m qtm_rt", description="Qualisys SDK tools")
+    commands = root.add_subparsers(dest="command")
+    commands.required = True
+
+    discover_parser = commands.add_parser("discover", help="list QTM servers")
+    discover_parser.add_argument("--timeout", type=float, default=0.5)
+    discover_parser.set_defaults(run=discover)
+
+    top_parser = commands.add_parser("top", help="show live stream statistics")
+    top_parser.add_argument("--host", help="QTM address, discovered if not given")
+    top_parser.add_argument("--port", type=int, default=22223)
+    top_parser.add_argument("--version", default="1.25", help="RT protocol version")
+    top_parser.add_argument(
+        "--components", nargs="+", default=["3d"], help="components to stream"
+    )
+    top_parser.add_argument(
+        "--frames", default="allframes", help="allframes, frequency:n or frequencydivisor:n"
+    )
+    top_parser.add_argument(
+        "--interval", type=float, default=1.0, help="seconds between refreshes"
+    )
+    top_parser.add_argument("--timeout", type=float, default=5)
+    top_parser.add_argument(
+        "--record", metavar="FILE", help="write the received data packets to FILE"
+    )
+    top_parser.add_argument(
+        "--bench",
+        type=float,
+        metavar="SECONDS",
+        help="stream for SECONDS and print a summary instead of the live view",
+    )
+    top_parser.add_argument(
+        "--json", action="store_true", help="print the --bench summary as JSON"
+    )
+    top_parser.set_defaults(run=top)
+    return root
+
+
+def main(argv=None):
+    """ Entry point of python -m qtm_rt """
+    args = parser().parse_args(argv)
+    try:
+        return asyncio.run(args.run(args))
+    except KeyboardInterrupt:
+        return 0
@@ -0,0 +1,58 @@
+""" Mapping between the local clock and the timestamps of QTM """
+
+import collections
+
+
+class ClockOffset(object):
+    """Offset between the local clock and QTM's timestamps.
+
+    The offset of a frame is its local receive time minus its QTM time. The frame
+    that arrived fastest has the smallest offset, the one closest to the transport
+    latency, so the offset is the minimum of the frames received during the last
+    ``window`` seconds. A minimum over a whole session would stay at one early
+    frame while the clocks drift apart.
+
+    :param window: Seconds of local time the minimum is taken over.
+    """
+
+    def __init__(self, window=10.0):
+        self.window = window
+        # (local time, offset) of the frames that can still become the minimum
+        self._candidates = collections.deque()
+
+    @property
+    def offset(self):
+        """ Local time minus QTM time in seconds, None before the first frame """
+        if not self._candidates:
+            return None
+        return self._candidates[0][1]
+
+    def reset(self):
+        """ Forget all frames, for example when QTM timestamps restart """
+        self._candidates.clear()
+
+    def add(self, local, qtm):
+        """Add a received frame.
+
+        :param local: Local clock in seconds when the frame was received.
+        :param qtm: QTM time of the frame in seconds.
+        :rtype: The offset of the frame
+        """
+        offset = local - qtm
+        candidates = self._candidates
+        while candidates and candidates[-1][1] >= offset:
+            candidates.pop()
+        candidates.append((local, offset))
+        while candidates[0][0] < local - self.window:
+            candidates.popleft()
+        return offset
+
+    def to_local(self, qtm):
+        """ Local time of a QTM time, None before the first frame """
+        offset = self.offset
+        return None if offset is None else qtm + offset
+
+    def to_qtm(self, local):
+        """ QTM time of a local time, None before the first frame """
+        offset = self.offset
+        return None if offset is None else local - offset
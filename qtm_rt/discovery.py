@@ -4,6 +4,8 @@ import struct
 import asyncio
 from collections import namedtuple
 import logging
+import socket
+import sys
 
 from .protocol import RTheader, QRTPacketType
 
@@ -17,6 +19,10 @@ QRTDiscoveryPacketSize = QRTDiscoveryP1.size + QRTDiscoveryP2.size
 QRTDiscoveryBasePort = struct.Struct(">H")
 
 QRTDiscoveryResponse = namedtuple("QRTDiscoveryResponse", "info host port")
+QRTDiscoveryEvent = namedtuple("QRTDiscoveryEvent", "type response")
+
+DISCOVERY_ADDED = "added"
+DISCOVERY_REMOVED = "removed"
 
 class QRTDiscoveryProtocol:
     """ Oqus/Miqus/Arqus discovery protocol implementation"""
@@ -59,13 +65,23 @@ class QRTDiscoveryProtocol:
         """ On error """
         LOG.exception("QRTDiscoveryProtocol %s", error)
 
+    def connection_lost(self, _):
+        """ On socket close """
+        self.transport = None
+
 class Discover:
-    """async discovery of qtm instances"""
+    """async discovery of qtm instances
+
+    :param ip_address: Address of the interface to send the discovery packet on.
+    :param timeout: Stop when no response has arrived for this many seconds.
+    """
 
-    def __init__(self, ip_address):
+    def __init__(self, ip_address, timeout=0.2):
         self.ip_address = ip_address
+        self.timeout = timeout
         self.queue = asyncio.Queue()
         self.first = True
+        self.transport = None
 
     def __aiter__(self):
         return self
@@ -79,7 +95,7 @@ class Discover:
                 receiver=self.queue.put_nowait
             )
 
-            _, protocol = await loop.create_datagram_endpoint(
+            self.transport, protocol = await loop.create_datagram_endpoint(
                 protocol_factory,
                 local_addr=(self.ip_address, 0),
                 allow_broadcast=True,
@@ -89,10 +105,13 @@ class Discover:
             protocol.send_discovery_packet()
             self.first = False
 
-        call_handle = loop.call_later(0.2, lambda: self.queue.put_nowait(None))
+        call_handle = loop.call_later(self.timeout, lambda: self.queue.put_nowait(None))
         result = await self.queue.get()
         if result is None:
             LOG.debug("Discovery timed out")
+            if self.transport is not None:
+                self.transport.close()
+                self.transport = None
             raise StopAsyncIteration
 
         LOG.debug(result)
@@ -100,3 +119,202 @@ class Discover:
         return result
 
 
+_SIOCGIFADDR = 0x8915  # Linux ioctl for the IPv4 address of an interface
+
+
+def _interface_addresses():
+    """ IPv4 address of every network interface, empty where it is not supported """
+    try:
+        import fcntl
+    except ImportError:
+        return set()
+    if not hasattr(socket, "if_nameindex") or not sys.platform.startswith("linux"):
+        return set()
+
+    addresses = set()
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for _, name in socket.if_nameindex():
+            request = struct.pack("256s", name.encode()[:15])
+            try:
+                result = fcntl.ioctl(sock.fileno(), _SIOCGIFADDR, request)
+            except OSError:
+                continue  # No IPv4 address
+            addresses.add(socket.inet_ntoa(result[20:24]))
+    return addresses
+
+
+def local_interfaces():
+    """IPv4 addresses to discover on, used as default by DiscoveryService.
+
+    On Linux the addresses of all network interfaces are listed. Elsewhere they are
+    the addresses the host name resolves to, which lists all interfaces on Windows
+    but can miss some on other systems. 0.0.0.0 is always included, to broadcast
+    on the interface of the default route.
+    """
+    addresses = _interface_addresses()
+    try:
+        for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET):
+            addresses.add(info[4][0])
+    except socket.gaierror as exception:
+        LOG.debug("Could not resolve local addresses: %s", exception)
+
+    addresses.add("127.0.0.1")
+    addresses.add("0.0.0.0")
+    return sorted(addresses)
+
+
+class DiscoveryService:
+    """Discovery of qtm instances on several interfaces at once, with caching.
+
+    Discovery packets are sent on all interfaces concurrently and the responses are
+    de-duplicated by host and port. Results are cached for ``ttl`` seconds, so
+    :func:`~qtm_rt.DiscoveryService.scan` returns immediately while the cache is fresh
+    and :attr:`servers` can be read at any time without blocking.
+
+    ::
+
+        service = qtm_rt.DiscoveryService()
+        for server in await service.scan():
+            print(server.host, server.info)
+
+        async for event in service.monitor(interval=2):
+            print(event.type, event.response.host)
+
+    :param interfaces: Addresses of the interfaces to send discovery packets on,
+        :func:`local_interfaces` if None.
+    :param ttl: Seconds a server stays listed after its last response.
+    :param timeout: Stop listening on an interface when no response has arrived
+        for this many seconds.
+    """
+
+    def __init__(self, interfaces=None, ttl=5.0, timeout=0.2):
+        self.interfaces = interfaces
+        self.ttl = ttl
+        self.timeout = timeout
+
+        self._cache = {}
+        self._last_scan = None
+        self._scan_task = None
+        self._monitor_task = None
+
+    @property
+    def servers(self):
+        """ Servers that have responded within the last ttl seconds """
+        now = asyncio.get_event_loop().time()
+        return [
+            response
+            for response, seen in self._cache.values()
+            if now - seen <= self.ttl
+        ]
+
+    async def scan(self, force=False):
+        """Send discovery packets on all interfaces and collect the responses.
+
+        :param force: Scan even if the cache is still fresh.
+
+        :rtype: A list of :class:`QRTDiscoveryResponse`, one per QTM instance.
+        """
+        loop = asyncio.get_event_loop()
+        if (
+            not force
+            and self._last_scan is not None
+            and loop.time() - self._last_scan < self.ttl
+        ):
+            return self.servers
+
+        # Callers scanning at the same time share one scan
+        if self._scan_task is None or self._scan_task.done():
+            self._scan_task = loop.create_task(self._scan())
+        await asyncio.shield(self._scan_task)
+        return self.servers
+
+    async def _scan(self):
+        interfaces = self.interfaces
+        if interfaces is None:
+            interfaces = local_interfaces()
+
+        results = await asyncio.gather(
+            *[self._probe(interface) for interface in interfaces]
+        )
+
+        now = asyncio.get_event_loop().time()
+        for responses in results:
+            for response in responses:
+                self._cache[(response.host, response.port)] = (response, now)
+
+        for key, (_, seen) in list(self._cache.items()):
+            if now - seen > self.ttl:
+                del self._cache[key]
+
+        self._last_scan = now
+
+    async def _probe(self, interface):
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+
+        try:
+            transport, protocol = await loop.create_datagram_endpoint(
+                lambda: QRTDiscoveryProtocol(receiver=queue.put_nowait),
+                local_addr=(interface, 0),
+                allow_broadcast=True,
+            )
+        except OSError as exception:
+            LOG.debug("Can not discover on %s: %s", interface, exception)
+            return []
+
+        responses = []
+        try:
+            LOG.debug("Sending discovery packet on %s", interface)
+            protocol.send_discovery_packet()
+            while True:
+                try:
+                    response = await asyncio.wait_for(queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    break
+                LOG.debug(response)
+                responses.append(response)
+        finally:
+            transport.close()
+
+        return responses
+
+    async def monitor(self, interval=2.0):
+        """Scan every ``interval`` seconds and yield changes.
+
+        Servers already in the cache are reported as added by the first scan.
+
+        :rtype: An async iterator of :class:`QRTDiscoveryEvent` with type
+            ``"added"`` or ``"removed"``.
+        """
+        known = {}
+        while True:
+            await self.scan(force=True)
+            current = {
+                (response.host, response.port): response for response in self.servers
+            }
+
+            for key in current.keys() - known.keys():
+                yield QRTDiscoveryEvent(DISCOVERY_ADDED, current[key])
+            for key in known.keys() - current.keys():
+                yield QRTDiscoveryEvent(DISCOVERY_REMOVED, known[key])
+
+            known = current
+            await asyncio.sleep(interval)
+
+    def start(self, on_change, interval=2.0):
+        """Monitor in the background, calling on_change with every
+        :class:`QRTDiscoveryEvent`.
+        """
+        self.stop()
+
+        async def run():
+            async for event in self.monitor(interval):
+                on_change(event)
+
+        self._monitor_task = asyncio.get_event_loop().create_task(run())
+
+    def stop(self):
+        """ Stop background monitoring """
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            self._monitor_task = None
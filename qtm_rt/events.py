@@ -0,0 +1,146 @@
+""" Event bus distributing events from QTM to any number of waiters """
+
+import asyncio
+import collections
+from collections import namedtuple
+import time
+
+from qtm_rt.packet import QRTEvent
+
+QRTEventRecord = namedtuple("QRTEventRecord", "event time")
+
+
+def _matches(event_filter, event):
+    if event_filter is None:
+        return True
+    if isinstance(event_filter, QRTEvent):
+        return event == event_filter
+    if callable(event_filter):
+        return event_filter(event)
+    return event in event_filter
+
+
+class EventSubscription(object):
+    """Events published after the subscription was created, iterated with async for.
+
+    Created by :func:`EventBus.subscribe`::
+
+        with connection.events.subscribe(QRTEvent.EventRTfromFileStarted) as events:
+            async for record in events:
+                print(record.event, record.time)
+
+    :param max_size: Max number of queued events, the oldest are dropped when full.
+        0 for no limit.
+    """
+
+    def __init__(self, bus, event_filter, max_size=0):
+        self._bus = bus
+        self._filter = event_filter
+        self._queue = collections.deque(maxlen=max_size or None)
+        self._waiter = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._queue:
+            if self.closed:
+                raise StopAsyncIteration
+            self._waiter = self._bus.loop.create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        return self._queue.popleft()
+
+    async def get(self, timeout=None):
+        """ Wait for the next :class:`QRTEventRecord` """
+        return await asyncio.wait_for(self.__anext__(), timeout)
+
+    def close(self):
+        """ Stop receiving events, iteration ends when the queue is empty """
+        self.closed = True
+        self._bus._subscriptions.discard(self)  # pylint: disable=W0212
+        self._wake()
+
+    def _publish(self, record):
+        if _matches(self._filter, record.event):
+            self._queue.append(record)
+            self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+
+class EventBus(object):
+    """Distributes events from QTM to any number of concurrent waiters.
+
+    Waiters and subscriptions take a filter that is None for all events, a
+    :class:`qtm_rt.QRTEvent`, a collection of events or a function taking an event
+    and returning True for the events to receive.
+
+    :param history: Number of recent events to keep in :attr:`history`.
+    """
+
+    def __init__(self, history=100, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        #: The latest :class:`QRTEventRecord`, oldest first
+        self.history = collections.deque(maxlen=history)
+        self._waiters = []
+        self._subscriptions = set()
+
+    def publish(self, event):
+        """ Record event and pass it to all matching waiters and subscriptions """
+        record = QRTEventRecord(event, time.time())
+        self.history.append(record)
+
+        waiters, self._waiters = self._waiters, []
+        for event_filter, future in waiters:
+            if future.done():
+                continue
+            if _matches(event_filter, event):
+                future.set_result(event)
+            else:
+                self._waiters.append((event_filter, future))
+
+        for subscription in list(self._subscriptions):
+            subscription._publish(record)  # pylint: disable=W0212
+
+    async def wait(self, event_filter=None, timeout=None):
+        """Wait for the next matching event.
+
+        :rtype: A :class:`qtm_rt.QRTEvent`
+        """
+        future = self.loop.create_future()
+        self._waiters.append((event_filter, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if not future.done():
+                future.cancel()
+            # A waiter that timed out would otherwise stay until the next event
+            self._waiters = [waiter for waiter in self._waiters if waiter[1] is not future]
+
+    def subscribe(self, event_filter=None, max_size=0):
+        """Receive all matching events published from now on.
+
+        :rtype: An :class:`EventSubscription`
+        """
+        subscription = EventSubscription(self, event_filter, max_size)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def last(self, event_filter=None):
+        """ The latest matching :class:`QRTEventRecord` in the history, or None """
+        for record in reversed(self.history):
+            if _matches(event_filter, record.event):
+                return record
+        return None
@@ -0,0 +1,367 @@
+""" Columnar export of streamed frames to Arrow, Parquet or HDF5 """
+
+from array import array
+import logging
+import os
+
+from qtm_rt import parameters as qtm_parameters
+from qtm_rt.packet import QRTPacket, QRTComponentType
+
+LOG = logging.getLogger("qtm_rt")
+
+FRAMES_TABLE = "frames"
+
+_ROTATION_FIELDS = ["rot%d" % index for index in range(9)]
+
+# Component, getter and per item column suffixes, in order of preference
+_MARKER_COMPONENTS = [
+    (
+        QRTComponentType.Component3dRes,
+        QRTPacket.get_3d_markers_residual,
+        ["x", "y", "z", "residual"],
+    ),
+    (QRTComponentType.Component3d, QRTPacket.get_3d_markers, ["x", "y", "z"]),
+]
+
+_BODY_COMPONENTS = [
+    (
+        QRTComponentType.Component6dRes,
+        QRTPacket.get_6d_residual,
+        ["x", "y", "z"] + _ROTATION_FIELDS + ["residual"],
+    ),
+    (QRTComponentType.Component6d, QRTPacket.get_6d, ["x", "y", "z"] + _ROTATION_FIELDS),
+    (
+        QRTComponentType.Component6dEulerRes,
+        QRTPacket.get_6d_euler_residual,
+        ["x", "y", "z", "a1", "a2", "a3", "residual"],
+    ),
+    (
+        QRTComponentType.Component6dEuler,
+        QRTPacket.get_6d_euler,
+        ["x", "y", "z", "a1", "a2", "a3"],
+    ),
+]
+
+
+class _Table(object):
+    """ Column buffers for one table, handed to the sink in chunks """
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.names = [column_name for column_name, _ in columns]
+        self.typecodes = [typecode for _, typecode in columns]
+        self.columns = [array(typecode) for typecode in self.typecodes]
+        self.rows = 0
+
+    def take(self):
+        """ Return the buffered columns and start new ones """
+        columns = list(zip(self.names, self.columns))
+        self.columns = [array(typecode) for typecode in self.typecodes]
+        self.rows = 0
+        return columns
+
+
+class _Extractor(object):
+    """ Copy all values of all items of a component into consecutive columns """
+
+    def __init__(self, getter, count):
+        self.getter = getter
+        self.count = count
+
+    def __call__(self, packet, columns, index):
+        _, items = self.getter(packet)
+        if len(items) != self.count:
+            raise ValueError(
+                "Item count changed from %d to %d" % (self.count, len(items))
+            )
+        for item in items:
+            for values in item if isinstance(item[0], tuple) else (item,):
+                if isinstance(values[0], tuple):  # Rotation matrix
+                    values = values[0]
+                for value in values:
+                    columns[index].append(value)
+                    index += 1
+        return index
+
+
+def _labels(names, count, prefix):
+    names = list(names[:count])
+    names += ["%s%d" % (prefix, index) for index in range(len(names), count)]
+
+    seen = {}
+    result = []
+    for name in names:
+        duplicates = seen.get(name, 0)
+        seen[name] = duplicates + 1
+        result.append(name if duplicates == 0 else "%s_%d" % (name, duplicates))
+    return result
+
+
+class ColumnarWriter(object):
+    """Convert streamed :class:`qtm_rt.QRTPacket` objects into columnar chunks.
+
+    Frame number, timestamp, 3D markers and 6DOF bodies end up in a ``frames`` table
+    with one row per frame. Analog data is written to one ``analog_<device id>`` table
+    per device with one row per sample. A table is handed to the sink every
+    ``chunk_size`` rows, so memory use does not grow with the length of the capture.
+
+    Column names are taken from the labels in the parameter XML when given,
+    otherwise generic names like ``marker_0_x`` are used::
+
+        xml = await connection.get_parameters(parameters=["3d", "6d", "analog"])
+        writer = ColumnarWriter(ParquetSink("session.parquet"), parameters=xml)
+        await connection.stream_frames(components=["3d", "6d"], on_packet=writer.add_packet)
+        ...
+        writer.close()
+
+    :param sink: One of :class:`ArrowSink`, :class:`ParquetSink` or :class:`HDF5Sink`,
+        or any object with ``write(table, columns)`` and ``close()`` methods.
+    :param parameters: Parameter XML used for column names.
+    :param chunk_size: Number of rows buffered per table before writing.
+    """
+
+    def __init__(self, sink, parameters=None, chunk_size=1000):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+
+        self.sink = sink
+        self.chunk_size = chunk_size
+
+        self._marker_labels = qtm_parameters.marker_labels(parameters)
+        self._body_names = qtm_parameters.body_names(parameters)
+        self._analog_devices = {
+            device.id: device for device in qtm_parameters.analog_devices(parameters)
+        }
+
+        self._frames = None
+        self._extractors = None
+        self._analog = {}
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, _):
+        self.close()
+
+    def add_packet(self, packet):
+        """ Append a packet, can be used directly as the on_packet callback """
+        if self._closed:
+            raise ValueError("Writer is closed")
+
+        if self._frames is None:
+            self._create_frames_table(packet)
+
+        table = self._frames
+        columns = table.columns
+        columns[0].append(packet.framenumber)
+        columns[1].append(packet.timestamp)
+        index = 2
+        for extractor in self._extractors:
+            index = extractor(packet, columns, index)
+        table.rows += 1
+        if table.rows >= self.chunk_size:
+            self._write(table)
+
+        if QRTComponentType.ComponentAnalog in packet.components:
+            self._add_analog(packet)
+
+    def flush(self):
+        """ Write all buffered rows to the sink """
+        if self._frames is not None:
+            self._write(self._frames)
+        for table in self._analog.values():
+            self._write(table)
+
+    def close(self):
+        """ Write buffered rows and close the sink """
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self.sink.close()
+
+    def _write(self, table):
+        if table.rows == 0:
+            return
+        LOG.debug("Writing %d rows to %s", table.rows, table.name)
+        self.sink.write(table.name, table.take())
+
+    def _create_frames_table(self, packet):
+        columns = [("frame", "I"), ("timestamp", "q")]
+        self._extractors = []
+
+        for candidates, names, prefix in (
+            (_MARKER_COMPONENTS, self._marker_labels, "marker_"),
+            (_BODY_COMPONENTS, self._body_names, "body_"),
+        ):
+            for component, getter, fields in candidates:
+                if component not in packet.components:
+                    continue
+
+                _, items = getter(packet)
+                columns += [
+                    ("%s_%s" % (name, field), "f")
+                    for name in _labels(names, len(items), prefix)
+                    for field in fields
+                ]
+                self._extractors.append(_Extractor(getter, len(items)))
+                break
+
+        self._frames = _Table(FRAMES_TABLE, columns)
+
+    def _add_analog(self, packet):
+        _, channels = packet.get_analog()
+
+        devices = {}
+        for device, sample_number, channel in channels:
+            entry = devices.setdefault(device.id, (device, sample_number, []))
+            entry[2].append(channel.samples)
+
+        for device, sample_number, samples in devices.values():
+            table = self._analog.get(device.id)
+            if table is None:
+                table = self._create_analog_table(device)
+            elif len(table.columns) != len(samples) + 1:
+                raise ValueError("Channel count changed for analog device %d" % device.id)
+
+            first = sample_number.sample_number
+            for sample in range(device.sample_count):
+                table.columns[0].append(first + sample)
+                for column, channel in zip(table.columns[1:], samples):
+                    column.append(channel[sample])
+                table.rows += 1
+                if table.rows >= self.chunk_size:
+                    self._write(table)
+
+    def _create_analog_table(self, device):
+        info = self._analog_devices.get(device.id)
+        names = _labels(
+            info.channels if info is not None else [], device.channel_count, "channel_"
+        )
+        table = _Table(
+            "analog_%d" % device.id,
+            [("sample_number", "i")] + [(name, "f") for name in names],
+        )
+        self._analog[device.id] = table
+        return table
+
+
+def _table_path(path, table):
+    """ The frames table is written to path, other tables next to it """
+    if table == FRAMES_TABLE:
+        return path
+    stem, extension = os.path.splitext(path)
+    return "%s.%s%s" % (stem, table, extension)
+
+
+class ArrowSink(object):
+    """Write each table as record batches to an Arrow IPC file. Requires pyarrow.
+
+    The frames table is written to ``path``, other tables to ``<stem>.<table><ext>``.
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow
+        except ImportError as exception:
+            raise ImportError("ArrowSink requires pyarrow") from exception
+
+        self._pa = pyarrow
+        self.path = os.fspath(path)
+        self._writers = {}
+
+    def _batch(self, columns):
+        pa = self._pa
+        types = {"I": pa.uint32(), "i": pa.int32(), "q": pa.int64(), "f": pa.float32()}
+        return pa.RecordBatch.from_arrays(
+            [pa.array(column, type=types[column.typecode]) for _, column in columns],
+            names=[name for name, _ in columns],
+        )
+
+    def _open(self, table, schema):
+        return self._pa.ipc.new_file(_table_path(self.path, table), schema)
+
+    def write(self, table, columns):
+        """ Write one chunk of columns to table """
+        batch = self._batch(columns)
+        writer = self._writers.get(table)
+        if writer is None:
+            writer = self._writers[table] = self._open(table, batch.schema)
+        writer.write_batch(batch)
+
+    def close(self):
+        """ Close all files """
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+class ParquetSink(ArrowSink):
+    """Write each chunk of a table as a row group to a Parquet file. Requires pyarrow.
+
+    The frames table is written to ``path``, other tables to ``<stem>.<table><ext>``.
+    """
+
+    def __init__(self, path, compression="snappy"):
+        super(ParquetSink, self).__init__(path)
+        import pyarrow.parquet
+
+        self._pq = pyarrow.parquet
+        self.compression = compression
+
+    def _open(self, table, schema):
+        return self._pq.ParquetWriter(
+            _table_path(self.path, table), schema, compression=self.compression
+        )
+
+    def write(self, table, columns):
+        """ Write one chunk of columns to table as a row group """
+        batch = self._batch(columns)
+        writer = self._writers.get(table)
+        if writer is None:
+            writer = self._writers[table] = self._open(table, batch.schema)
+        writer.write_table(
+            self._pa.Table.from_batches([batch]), row_group_size=batch.num_rows
+        )
+
+
+class HDF5Sink(object):
+    """Append each table to resizable datasets in an HDF5 file. Requires h5py.
+
+    Every table is a group and every column a one dimensional dataset in that group.
+    """
+
+    def __init__(self, path, compression=None):
+        try:
+            import h5py
+            import numpy
+        except ImportError as exception:
+            raise ImportError("HDF5Sink requires h5py and numpy") from exception
+
+        self._np = numpy
+        self.compression = compression
+        self._file = h5py.File(os.fspath(path), "w")
+
+    def write(self, table, columns):
+        """ Append one chunk of columns to table """
+        group = self._file.require_group(table)
+        for name, column in columns:
+            values = self._np.frombuffer(column, dtype=column.typecode)
+            dataset = group.get(name)
+            if dataset is None:
+                group.create_dataset(
+                    name,
+                    data=values,
+                    maxshape=(None,),
+                    chunks=(max(len(values), 1),),
+                    compression=self.compression,
+                )
+            else:
+                offset = dataset.shape[0]
+                dataset.resize((offset + len(values),))
+                dataset[offset:] = values
+
+    def close(self):
+        """ Close the file """
+        self._file.close()
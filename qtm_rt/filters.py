@@ -0,0 +1,362 @@
+""" Smoothing filters for streamed 3D and 6DOF data. Requires numpy.
+
+The filters work on arrays of any shape, for example all markers of a frame, and
+filter every element independently. Their state is kept in arrays allocated when the
+first frame is filtered, and allocated again only if the shape changes.
+
+NaN values, as QTM sends for markers and bodies that are not tracked, give NaN
+output. Only the state of the missing elements is affected, see each filter for how
+it continues after a dropout.
+"""
+
+import abc
+from collections import namedtuple
+import copy
+import math
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.filters requires numpy") from exception
+
+from qtm_rt import arrays, transforms
+
+QRTFilteredFrame = namedtuple("QRTFilteredFrame", "packet markers positions rotations")
+
+
+class Filter(abc.ABC):
+    """Base of the filters.
+
+    Call the filter with the values of every frame and the time of the frame::
+
+        smoothed = filter_(values, packet.timestamp / 1e6)
+
+    The returned array is reused by the next call, copy it to keep it.
+
+    Subclasses implement :func:`_allocate` and :func:`_filter`.
+    """
+
+    def __init__(self):
+        self._shape = None
+        self._output = None
+
+    def __call__(self, values, time):
+        """Filter the values of a frame.
+
+        :param values: Array of values, NaN for missing values.
+        :param time: Time of the frame in seconds.
+        :rtype: Array with the filtered values
+        """
+        values = numpy.asarray(values, dtype=float)
+        if values.shape != self._shape:
+            self._shape = values.shape
+            self._output = numpy.full(values.shape, numpy.nan)
+            self._allocate(values.shape)
+        self._filter(values, ~numpy.isnan(values), time)
+        return self._output
+
+    def reset(self):
+        """ Forget all state, the next frame starts the filter again """
+        self._shape = None
+        self._output = None
+
+    def clone(self):
+        """ A new filter with the same settings and without state """
+        clone = copy.copy(self)
+        clone.reset()
+        return clone
+
+    @abc.abstractmethod
+    def _allocate(self, shape):
+        """ Allocate the state for values of a new shape """
+
+    @abc.abstractmethod
+    def _filter(self, values, valid, time):
+        """ Filter values into self._output, valid is False where they are NaN """
+
+
+def _alpha(cutoff, period):
+    return 1.0 / (1.0 + 1.0 / (2 * math.pi * cutoff * period))
+
+
+class OneEuroFilter(Filter):
+    """The 1€ filter, a low pass filter whose cutoff frequency rises with the speed.
+
+    Slow movements are smoothed strongly, removing jitter, while fast movements lag
+    little. See Casiez, Roussel and Vogel, "1€ Filter: A Simple Speed-based Low-pass
+    Filter for Noisy Input in Interactive Systems", CHI 2012.
+
+    After a dropout an element continues from its last filtered value, with the time
+    since its last value as period.
+
+    :param min_cutoff: Cutoff frequency in Hz when still, lower smooths more.
+    :param beta: Increase of the cutoff frequency per unit of speed, higher lags less.
+    :param derivative_cutoff: Cutoff frequency in Hz of the filtered speed.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=0.0, derivative_cutoff=1.0):
+        super(OneEuroFilter, self).__init__()
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.derivative_cutoff = derivative_cutoff
+
+    def _allocate(self, shape):
+        self._value = numpy.full(shape, numpy.nan)
+        self._derivative = numpy.zeros(shape)
+        self._time = numpy.full(shape, numpy.nan)
+
+    def _filter(self, values, valid, time):
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            period = time - self._time
+            if numpy.any(period < 0):
+                # Time restarted, with a new measurement
+                self._allocate(self._shape)
+                period = time - self._time
+
+            start = valid & numpy.isnan(self._value)
+            update = valid & (period > 0)
+
+            derivative = (values - self._value) / period
+            derivative = self._derivative + _alpha(self.derivative_cutoff, period) * (
+                derivative - self._derivative
+            )
+            cutoff = self.min_cutoff + self.beta * numpy.abs(derivative)
+            value = self._value + _alpha(cutoff, period) * (values - self._value)
+
+        numpy.copyto(self._value, values, where=start)
+        numpy.copyto(self._value, value, where=update)
+        numpy.copyto(self._derivative, derivative, where=update)
+        numpy.copyto(self._time, time, where=start | update)
+
+        self._output.fill(numpy.nan)
+        numpy.copyto(self._output, self._value, where=valid)
+
+
+def butterworth_sections(frequency, cutoff, order=2):
+    """Second order sections of a digital low pass Butterworth filter.
+
+    :param frequency: Sample frequency in Hz.
+    :param cutoff: Cutoff frequency in Hz, below frequency / 2.
+    :param order: Filter order.
+    :rtype: A list of (b0, b1, b2, a1, a2) coefficients, a0 is 1
+    """
+    if not 0 < cutoff < frequency / 2.0:
+        raise ValueError("Cutoff must be between 0 and half the sample frequency")
+    if order < 1:
+        raise ValueError("Order must be at least 1")
+
+    k = math.tan(math.pi * cutoff / frequency)
+    sections = []
+    for pair in range(order // 2):
+        # Angle of the pole pair from the negative real axis, for an odd order the
+        # real pole is at angle 0
+        if order % 2:
+            angle = math.pi * (pair + 1) / order
+        else:
+            angle = math.pi * (2 * pair + 1) / (2 * order)
+        q = 1.0 / (2 * math.cos(angle))
+        norm = 1.0 / (1 + k / q + k * k)
+        b0 = k * k * norm
+        sections.append(
+            (b0, 2 * b0, b0, 2 * (k * k - 1) * norm, (1 - k / q + k * k) * norm)
+        )
+    if order % 2:
+        norm = 1.0 / (1 + k)
+        sections.append((k * norm, k * norm, 0.0, (k - 1) * norm, 0.0))
+    return sections
+
+
+class ButterworthFilter(Filter):
+    """Causal low pass Butterworth filter, as cascaded second order sections.
+
+    The filter assumes that frames arrive at a fixed rate, the time of the frames is
+    not used. An element restarts from its next value after a dropout, without the
+    transient of a filter starting from zero.
+
+    :param frequency: Frame rate in Hz.
+    :param cutoff: Cutoff frequency in Hz.
+    :param order: Filter order, higher gives a steeper cutoff and more delay.
+    """
+
+    def __init__(self, frequency, cutoff, order=2):
+        super(ButterworthFilter, self).__init__()
+        self.sections = butterworth_sections(frequency, cutoff, order)
+
+    def _allocate(self, shape):
+        self._state = numpy.zeros((len(self.sections), 2) + shape)
+        self._started = numpy.zeros(shape, dtype=bool)
+
+    def _filter(self, values, valid, time):
+        start = valid & ~self._started
+        self._started = valid
+        values = numpy.where(valid, values, 0.0)
+
+        for (b0, b1, b2, a1, a2), state in zip(self.sections, self._state):
+            # Every section has unity gain at 0 Hz, start in steady state
+            numpy.copyto(state[1], (b2 - a2) * values, where=start)
+            numpy.copyto(state[0], (b1 - a1) * values + state[1], where=start)
+
+            output = b0 * values + state[0]
+            numpy.copyto(state[0], b1 * values - a1 * output + state[1], where=valid)
+            numpy.copyto(state[1], b2 * values - a2 * output, where=valid)
+            values = output
+
+        self._output.fill(numpy.nan)
+        numpy.copyto(self._output, values, where=valid)
+
+
+class KalmanFilter(Filter):
+    """Kalman filter with a constant velocity model for every element.
+
+    Through a dropout the state of an element is predicted with its velocity, and its
+    uncertainty grows, so the element continues from the prediction when it returns.
+
+    :param process_noise: Spectral density of the random acceleration, in
+        units² / s³, higher follows changes of velocity faster.
+    :param measurement_noise: Variance of the measured values, in units².
+    :param velocity_variance: Variance of the velocity, in units² / s², when an
+        element starts.
+    :param predict_missing: Output the predicted value instead of NaN for elements
+        that are missing.
+    """
+
+    def __init__(
+        self,
+        process_noise=1e4,
+        measurement_noise=1.0,
+        velocity_variance=1e6,
+        predict_missing=False,
+    ):
+        super(KalmanFilter, self).__init__()
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.velocity_variance = velocity_variance
+        self.predict_missing = predict_missing
+
+    @property
+    def velocity(self):
+        """ Estimated velocity of every element, in units / s, NaN if not started """
+        if self._shape is None:
+            return None
+        return numpy.where(self._started, self._velocity, numpy.nan)
+
+    def _allocate(self, shape):
+        self._value = numpy.zeros(shape)
+        self._velocity = numpy.zeros(shape)
+        self._covariance = numpy.zeros((3,) + shape)  # p00, p01, p11
+        self._started = numpy.zeros(shape, dtype=bool)
+        self._time = None
+
+    def _filter(self, values, valid, time):
+        if self._time is not None and time < self._time:
+            self._allocate(self._shape)
+        period = 0.0 if self._time is None else time - self._time
+        self._time = time
+
+        p00, p01, p11 = self._covariance
+        if period > 0:
+            q = self.process_noise
+            self._value += self._velocity * period
+            p00 += period * (2 * p01 + period * p11) + q * period ** 3 / 3
+            p01 += period * p11 + q * period ** 2 / 2
+            p11 += q * period
+
+        update = valid & self._started
+        innovation = numpy.where(update, values - self._value, 0.0)
+        gain = numpy.where(update, 1.0 / (p00 + self.measurement_noise), 0.0)
+        value_gain, velocity_gain = p00 * gain, p01 * gain
+        self._value += value_gain * innovation
+        self._velocity += velocity_gain * innovation
+        p11 -= velocity_gain * p01
+        p01 -= value_gain * p01
+        p00 -= value_gain * p00
+
+        start = valid & ~self._started
+        numpy.copyto(self._value, values, where=start)
+        numpy.copyto(self._velocity, 0.0, where=start)
+        numpy.copyto(p00, self.measurement_noise, where=start)
+        numpy.copyto(p01, 0.0, where=start)
+        numpy.copyto(p11, self.velocity_variance, where=start)
+        self._started |= start
+
+        self._output.fill(numpy.nan)
+        numpy.copyto(
+            self._output,
+            self._value,
+            where=(self._started if self.predict_missing else valid),
+        )
+
+
+class FilterStage(object):
+    """Filters the labelled 3D markers and the 6DOF bodies of streamed packets.
+
+    Wrap an on_packet callback, which then receives a :class:`QRTFilteredFrame` with
+    the packet and the filtered arrays, None for components not in the packet::
+
+        stage = FilterStage(OneEuroFilter(min_cutoff=1.0, beta=0.01))
+
+        def on_frame(frame):
+            print(frame.packet.framenumber, frame.markers)
+
+        await connection.stream_frames(components=["3d", "6d"], on_packet=stage.wrap(on_frame))
+
+    Markers and body positions and rotations are filtered by separate clones of the
+    filter. Rotations are filtered as quaternions, kept in the same hemisphere from
+    frame to frame, and returned as rotation matrices.
+
+    :param filter_: A :class:`Filter` with the settings to use.
+    """
+
+    def __init__(self, filter_):
+        self.filter = filter_
+        self._markers = filter_.clone()
+        self._positions = filter_.clone()
+        self._rotations = filter_.clone()
+        self._quaternions = None
+
+    def reset(self):
+        """ Forget the state of all filters """
+        for filter_ in (self._markers, self._positions, self._rotations):
+            filter_.reset()
+        self._quaternions = None
+
+    def __call__(self, packet):
+        """ Filter a packet, returns a :class:`QRTFilteredFrame` """
+        time = packet.timestamp / 1e6
+
+        markers = arrays.markers_3d(packet)
+        if markers is None:
+            residual = arrays.markers_3d_residual(packet)
+            markers = None if residual is None else residual[0]
+        if markers is not None:
+            markers = self._markers(markers, time)
+
+        positions = rotations = None
+        bodies = arrays.bodies_6d(packet)
+        if bodies is not None:
+            positions = self._positions(bodies[0], time)
+            rotations = transforms.quaternion_to_matrix(
+                self._rotations(self._continuous(bodies[1]), time)
+            )
+
+        return QRTFilteredFrame(packet, markers, positions, rotations)
+
+    def _continuous(self, matrices):
+        quaternions = transforms.matrix_to_quaternion(matrices)
+        previous = self._quaternions
+        if previous is None or previous.shape != quaternions.shape:
+            previous = self._quaternions = numpy.full(quaternions.shape, numpy.nan)
+        with numpy.errstate(invalid="ignore"):
+            flip = numpy.sum(quaternions * previous, axis=-1, keepdims=True) < 0
+        quaternions = numpy.where(flip, -quaternions, quaternions)
+        numpy.copyto(previous, quaternions, where=~numpy.isnan(quaternions))
+        return quaternions
+
+    def wrap(self, on_packet):
+        """ Wrap a callback taking a :class:`QRTFilteredFrame` as an on_packet callback """
+
+        def filtered(packet):
+            on_packet(self(packet))
+
+        filtered.__wrapped__ = on_packet
+        return filtered
@@ -0,0 +1,101 @@
+""" Flow control between the connection to QTM and a slow consumer """
+
+import asyncio
+import logging
+import time
+
+LOG = logging.getLogger("qtm_rt")
+
+
+class PacketQueue(asyncio.Queue):
+    """Queue of received packets that stops reading from QTM while it is too full.
+
+    When ``high_water`` packets are waiting in the queue, reading from the socket is
+    paused, so a slow consumer builds up pressure in the TCP window (QTM skips frames
+    it can not send) instead of growing memory on the client. Reading is resumed when
+    the consumer has brought the queue down to ``low_water`` packets.
+
+    Usually created with :func:`~qtm_rt.QRTConnection.packet_queue`::
+
+        queue = connection.packet_queue(high_water=100, low_water=20)
+        await connection.stream_frames(components=["3d"], on_packet=queue.put_nowait)
+        while True:
+            packet = await queue.get()
+
+    Packets already received when reading is paused are still queued, so the queue
+    can grow slightly above ``high_water``. Reading also goes on while a response to a
+    command, an event or a file is awaited, such as during
+    :func:`~qtm_rt.QRTConnection.get_parameters` or
+    :func:`~qtm_rt.QRTConnection.stream_frames_stop`, as QTM sends them on the same
+    connection as the frames. The frames received meanwhile are queued too, so
+    commands can be sent while the queue is full, at the cost of growing it.
+
+    :param protocol: The :class:`qtm_rt.protocol.QTMProtocol` to pause.
+    :param high_water: Queue size at which reading is paused.
+    :param low_water: Queue size at which reading is resumed.
+    """
+
+    def __init__(self, protocol, high_water=64, low_water=16):
+        if not 0 <= low_water < high_water:
+            raise ValueError("Requires 0 <= low_water < high_water")
+
+        super(PacketQueue, self).__init__()
+        self.protocol = protocol
+        self.high_water = high_water
+        self.low_water = low_water
+
+        self.pause_count = 0
+        self.max_size = 0
+        self._paused_since = None
+        self._paused_time = 0.0
+
+    @property
+    def paused(self):
+        """ True while reading is paused """
+        return self._paused_since is not None
+
+    @property
+    def paused_time(self):
+        """ Total seconds reading has been paused, including an ongoing pause """
+        if self._paused_since is None:
+            return self._paused_time
+        return self._paused_time + time.monotonic() - self._paused_since
+
+    def metrics(self):
+        """ Flow control counters as a dict """
+        return {
+            "size": self.qsize(),
+            "max_size": self.max_size,
+            "paused": self.paused,
+            "pause_count": self.pause_count,
+            "paused_time": self.paused_time,
+        }
+
+    def put_nowait(self, item):
+        super(PacketQueue, self).put_nowait(item)
+
+        size = self.qsize()
+        if size > self.max_size:
+            self.max_size = size
+        if size >= self.high_water and self._paused_since is None:
+            if self.protocol.transport is not None:
+                LOG.debug("Pausing reading, %d packets queued", size)
+                self.protocol.pause_reading()
+                self._paused_since = time.monotonic()
+                self.pause_count += 1
+
+    def get_nowait(self):
+        item = super(PacketQueue, self).get_nowait()
+        if self._paused_since is not None and self.qsize() <= self.low_water:
+            self.resume()
+        return item
+
+    def resume(self):
+        """ Resume reading, for example when the consumer stops using the queue """
+        if self._paused_since is None:
+            return
+
+        self._paused_time += time.monotonic() - self._paused_since
+        self._paused_since = None
+        LOG.debug("Resuming reading")
+        self.protocol.resume_reading()
@@ -0,0 +1,167 @@
+""" Centre of pressure, free moment and resultants of force plates. Requires numpy.
+
+Samples are arrays whose last axis is the 9 values of :class:`qtm_rt.packet.RTForce`,
+force x, y, z, moment x, y, z and application point x, y, z, with any leading axes,
+for example (plates, samples, 9). Every function works on all of them at once.
+
+Moments are about the origin of the coordinate system of the forces, and the plate
+surface is the plane z = ``surface`` of it.
+"""
+
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.force requires numpy") from exception
+
+from qtm_rt import arrays
+
+QRTForceQuantities = namedtuple(
+    "QRTForceQuantities", "force magnitude centre_of_pressure free_moment contact"
+)
+QRTForceQuantities.__doc__ = """Derived quantities of force samples.
+
+force is a (..., 3) view of the forces, magnitude and free_moment (...,) arrays,
+centre_of_pressure a (..., 3) array and contact a (...,) boolean array. Without
+contact the centre of pressure and the free moment are NaN.
+"""
+
+
+def plate_samples(packet):
+    """Samples of every force plate in one array.
+
+    Plates with fewer samples than the others are padded with NaN.
+
+    :rtype: A (plates,) array of plate ids, a (plates,) array of the force number of
+        the first sample and a (plates, samples, 9) array, None if the packet has no
+        force component
+    """
+    plates = arrays.force(packet)
+    if plates is None:
+        return None
+    count = max([len(samples) for _, _, samples in plates] or [0])
+    result = numpy.full((len(plates), count, 9), numpy.nan)
+    for index, (_, _, samples) in enumerate(plates):
+        result[index, : len(samples)] = samples
+    ids = numpy.array([plate[0] for plate in plates], dtype=numpy.int64)
+    numbers = numpy.array([plate[1] for plate in plates], dtype=numpy.int64)
+    return ids, numbers, result
+
+
+def plate_samples_single(packet):
+    """The latest sample of every force plate in one array.
+
+    :rtype: A (plates,) array of plate ids and a (plates, 9) array, None if the
+        packet has no single force component
+    """
+    plates = arrays.force_single(packet)
+    if plates is None:
+        return None
+    samples = numpy.array([values for _, values in plates], dtype=float).reshape(-1, 9)
+    return numpy.array([plate[0] for plate in plates], dtype=numpy.int64), samples
+
+
+def magnitude(vectors):
+    """ Length of every vector along the last axis """
+    vectors = numpy.asarray(vectors, dtype=float)
+    return numpy.sqrt(numpy.einsum("...i,...i->...", vectors, vectors))
+
+
+def contact(samples, threshold=20.0):
+    """ True where the vertical force is at least threshold, in N """
+    return numpy.abs(numpy.asarray(samples)[..., 2]) >= threshold
+
+
+def centre_of_pressure(samples, threshold=20.0, surface=0.0):
+    """Point on the plate surface where the resultant force acts.
+
+    :param threshold: Least vertical force in N for contact, NaN without contact.
+    :param surface: z of the plate surface, in the units of the moments divided by
+        the units of the forces.
+    :rtype: A (..., 3) array
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    fx, fy, fz = samples[..., 0], samples[..., 1], samples[..., 2]
+    mx, my = samples[..., 3], samples[..., 4]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        fz = numpy.where(numpy.abs(fz) >= threshold, fz, numpy.nan)
+        result = numpy.empty(samples.shape[:-1] + (3,))
+        numpy.divide(surface * fx - my, fz, out=result[..., 0])
+        numpy.divide(mx + surface * fy, fz, out=result[..., 1])
+    result[..., 2] = numpy.where(numpy.isnan(fz), numpy.nan, surface)
+    return result
+
+
+def free_moment(samples, centre_of_pressure):
+    """Moment about the vertical axis through the centre of pressure.
+
+    :param centre_of_pressure: A (..., 3) array, as from :func:`centre_of_pressure`.
+    :rtype: A (...,) array
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    x, y = centre_of_pressure[..., 0], centre_of_pressure[..., 1]
+    return samples[..., 5] - x * samples[..., 1] + y * samples[..., 0]
+
+
+def transform(samples, rotation, translation):
+    """Samples of a plate in another coordinate system, such as the lab.
+
+    The forces and application points are rotated and moved, and the moments are
+    taken about the new origin.
+
+    :param rotation: A (3, 3) rotation matrix, or (plates, 3, 3) for
+        (plates, samples, 9) samples.
+    :param translation: The plate origin in the new system, (3,) or (plates, 3).
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    rotation = numpy.asarray(rotation, dtype=float)
+    translation = numpy.asarray(translation, dtype=float)
+    if rotation.ndim == 3:
+        # One transform per plate, broadcast over the samples
+        rotation = rotation.reshape(
+            rotation.shape[:1] + (1,) * (samples.ndim - 2) + (3, 3)
+        )
+        translation = translation.reshape(rotation.shape[:-1])
+
+    vectors = samples.reshape(samples.shape[:-1] + (3, 3))
+    result = numpy.einsum("...ij,...kj->...ki", rotation, vectors)
+    result[..., 1, :] += numpy.cross(translation, result[..., 0, :])
+    result[..., 2, :] += translation
+    return result.reshape(samples.shape)
+
+
+def combine(samples, axis=0, threshold=20.0, surface=0.0):
+    """The resultant of several plates, as samples of one plate.
+
+    The plates must have the same coordinate system, see :func:`transform`. Forces
+    and moments of the plates in contact are summed, so the noise of unloaded plates
+    does not move the result, and the application point is the global centre of
+    pressure. Plates with NaN samples are left out.
+
+    :param axis: Axis of the plates.
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    axis = axis % (samples.ndim - 1)
+    loaded = numpy.where(contact(samples, threshold)[..., None], samples, 0.0)
+    result = loaded.sum(axis=axis)
+    result[..., 6:] = centre_of_pressure(result, threshold, surface)
+    missing = numpy.isnan(samples[..., 2]).all(axis=axis)
+    result[missing] = numpy.nan
+    return result
+
+
+def quantities(samples, threshold=20.0, surface=0.0):
+    """Magnitude, centre of pressure and free moment of force samples.
+
+    :rtype: A :class:`QRTForceQuantities`
+    """
+    samples = numpy.asarray(samples, dtype=float)
+    cop = centre_of_pressure(samples, threshold, surface)
+    return QRTForceQuantities(
+        samples[..., :3],
+        magnitude(samples[..., :3]),
+        cop,
+        free_moment(samples, cop),
+        contact(samples, threshold),
+    )
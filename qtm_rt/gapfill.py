@@ -0,0 +1,242 @@
+""" Online filling of short gaps in labelled 3D marker trajectories. Requires numpy. """
+
+import collections
+from collections import namedtuple
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.gapfill requires numpy") from exception
+
+from qtm_rt import arrays
+
+QRTFilledFrame = namedtuple("QRTFilledFrame", "packet positions synthetic")
+
+_METHODS = ("linear", "spline")
+
+
+def _last_true(mask):
+    """ Index of the last True row of every column of mask, -1 if none """
+    if len(mask) == 0:
+        return numpy.full(mask.shape[1:], -1)
+    found = mask.any(axis=0)
+    index = len(mask) - 1 - numpy.argmax(mask[::-1], axis=0)
+    return numpy.where(found, index, -1)
+
+
+def _first_true(mask):
+    """ Index of the first True row of every column of mask, -1 if none """
+    if len(mask) == 0:
+        return numpy.full(mask.shape[1:], -1)
+    return numpy.where(mask.any(axis=0), numpy.argmax(mask, axis=0), -1)
+
+
+def rigid_transform(source, target):
+    """Least squares rotation and translation from source to target points (Kabsch).
+
+    :param source: A (points, 3) array.
+    :param target: A (points, 3) array of the same points after the movement.
+    :rtype: A (3, 3) rotation matrix and a (3,) translation, target = R @ source + t
+    """
+    source_center = source.mean(axis=0)
+    target_center = target.mean(axis=0)
+    covariance = (source - source_center).T @ (target - target_center)
+    u, _, vt = numpy.linalg.svd(covariance)
+    reflection = numpy.sign(numpy.linalg.det(vt.T @ u.T))
+    rotation = vt.T @ numpy.diag([1.0, 1.0, reflection]) @ u.T
+    return rotation, target_center - rotation @ source_center
+
+
+class GapFiller(object):
+    """Fills short gaps, NaN positions, of labelled markers while streaming.
+
+    The latest ``history`` frames are kept in a ring buffer. To interpolate across a
+    gap the filler needs the frames after it, so frames are returned ``lookahead``
+    frames after they were added::
+
+        filler = GapFiller(max_gap=10, lookahead=10, rigid_groups=[[0, 1, 2, 3]])
+
+        def on_frame(frame):
+            print(frame.packet.framenumber, frame.positions, frame.synthetic)
+
+        await connection.stream_frames(components=["3d"], on_packet=filler.wrap(on_frame))
+
+    A missing position is filled, in order of preference:
+
+    - By interpolation between the measured positions before and after the gap, if
+      the gap is at most ``max_gap`` frames and ends within the lookahead. ``spline``
+      interpolation is a cubic through the two measured frames on each side of the
+      gap, falling back to linear when there is only one.
+    - From markers moving with it: if the marker is in one of ``rigid_groups`` and at
+      least 3 other markers of the group are measured both now and in the latest
+      frame where the marker was measured, the marker follows their movement since
+      that frame.
+
+    Frames are assumed to be evenly spaced. Only measured positions are used to fill.
+
+    :param max_gap: Longest gap in frames filled by interpolation.
+    :param lookahead: Number of frames that the output is delayed.
+    :param history: Number of frames kept, bounds how far back measured positions
+        are searched.
+    :param method: "linear" or "spline".
+    :param rigid_groups: Lists of marker indices that move as rigid bodies.
+    """
+
+    def __init__(self, max_gap=10, lookahead=10, history=64, method="linear", rigid_groups=None):
+        if method not in _METHODS:
+            raise ValueError("method must be one of %s" % ", ".join(_METHODS))
+        if history < lookahead + 2:
+            raise ValueError("history must be at least lookahead + 2")
+
+        self.max_gap = max_gap
+        self.lookahead = lookahead
+        self.history = history
+        self.method = method
+        self.rigid_groups = [numpy.asarray(group) for group in rigid_groups or []]
+        self.reset()
+
+    def reset(self):
+        """ Forget all frames, frames waiting for lookahead are dropped """
+        self._positions = None
+        self._valid = None
+        self._count = 0
+        self._packets = collections.deque()
+
+    def add_packet(self, packet):
+        """Add the labelled markers of a packet.
+
+        :rtype: The :class:`QRTFilledFrame` added ``lookahead`` frames ago, None before that
+        """
+        markers = arrays.markers_3d(packet)
+        if markers is None:
+            residual = arrays.markers_3d_residual(packet)
+            markers = None if residual is None else residual[0]
+        if markers is None:
+            return None
+        return self.add(markers, packet)
+
+    def add(self, positions, packet=None):
+        """Add the positions of a frame.
+
+        :param positions: A (markers, 3) array, NaN for missing markers.
+        :param packet: Passed on in the returned frame.
+        :rtype: The :class:`QRTFilledFrame` added ``lookahead`` frames ago, None before that
+        """
+        positions = numpy.asarray(positions, dtype=float)
+        if self._positions is None or self._positions.shape[1:] != positions.shape:
+            self.reset()
+            self._positions = numpy.full((self.history,) + positions.shape, numpy.nan)
+            self._valid = numpy.zeros((self.history, len(positions)), dtype=bool)
+
+        slot = self._count % self.history
+        self._positions[slot] = positions
+        self._valid[slot] = ~numpy.isnan(positions).any(axis=-1)
+        self._count += 1
+        self._packets.append(packet)
+
+        if len(self._packets) <= self.lookahead:
+            return None
+        return self._fill(self._count - 1 - self.lookahead, self._packets.popleft())
+
+    def flush(self):
+        """ Fill and return the frames still waiting for lookahead """
+        frames = []
+        while self._packets:
+            index = self._count - len(self._packets)
+            frames.append(self._fill(index, self._packets.popleft()))
+        return frames
+
+    def wrap(self, on_packet):
+        """ Wrap a callback taking a :class:`QRTFilledFrame` as an on_packet callback """
+
+        def filled(packet):
+            frame = self.add_packet(packet)
+            if frame is not None:
+                on_packet(frame)
+
+        filled.__wrapped__ = on_packet
+        return filled
+
+    def _fill(self, index, packet):
+        history = self.history
+        positions = self._positions[index % history].copy()
+        missing = ~self._valid[index % history]
+        synthetic = numpy.zeros(len(positions), dtype=bool)
+        if not missing.any():
+            return QRTFilledFrame(packet, positions, synthetic)
+
+        # Frames in the buffer in time order, index is at row `current`
+        first = max(0, self._count - history)
+        order = numpy.arange(first, self._count) % history
+        valid = self._valid[order]
+        current = index - first
+
+        markers = numpy.flatnonzero(missing)
+        before = _last_true(valid[:current, markers])
+        after = _first_true(valid[current + 1 :, markers])
+        after = numpy.where(after < 0, -1, after + current + 1)
+        fillable = (before >= 0) & (after >= 0) & (after - before - 1 <= self.max_gap)
+        if fillable.any():
+            markers_fill = markers[fillable]
+            values = self._interpolate(
+                order, valid, markers_fill, before[fillable], after[fillable], current
+            )
+            positions[markers_fill] = values
+            synthetic[markers_fill] = True
+
+        if self.rigid_groups:
+            self._fill_rigid(order, valid, current, positions, synthetic)
+        return QRTFilledFrame(packet, positions, synthetic)
+
+    def _interpolate(self, order, valid, markers, before, after, current):
+        buffer = self._positions
+        start = buffer[order[before], markers]
+        end = buffer[order[after], markers]
+        span = (after - before)[:, None].astype(float)
+        fraction = (current - before)[:, None] / span
+        linear = start + fraction * (end - start)
+        if self.method == "linear":
+            return linear
+
+        # Cubic Hermite with slopes from the frames outside the gap
+        outside_before = numpy.maximum(before - 1, 0)
+        outside_after = numpy.minimum(after + 1, len(order) - 1)
+        has_slopes = (
+            (before >= 1)
+            & (after + 1 < len(order))
+            & valid[outside_before, markers]
+            & valid[outside_after, markers]
+        )
+        start_slope = (start - buffer[order[outside_before], markers]) * span
+        end_slope = (buffer[order[outside_after], markers] - end) * span
+        f2, f3 = fraction ** 2, fraction ** 3
+        cubic = (
+            (2 * f3 - 3 * f2 + 1) * start
+            + (f3 - 2 * f2 + fraction) * start_slope
+            + (-2 * f3 + 3 * f2) * end
+            + (f3 - f2) * end_slope
+        )
+        return numpy.where(has_slopes[:, None], cubic, linear)
+
+    def _fill_rigid(self, order, valid, current, positions, synthetic):
+        buffer = self._positions
+        now = valid[current]
+        for group in self.rigid_groups:
+            needed = group[numpy.isnan(positions[group]).any(axis=-1)]
+            if len(needed) == 0 or numpy.count_nonzero(now[group]) < 3:
+                continue
+
+            # The latest other frame where each needed marker was measured
+            measured = valid[:, needed].copy()
+            measured[current] = False
+            references = _last_true(measured)
+            for reference in numpy.unique(references[references >= 0]):
+                common = group[now[group] & valid[reference, group]]
+                if len(common) < 3:
+                    continue
+                markers = needed[references == reference]
+                rotation, translation = rigid_transform(
+                    buffer[order[reference], common], positions[common]
+                )
+                positions[markers] = buffer[order[reference], markers] @ rotation.T + translation
+                synthetic[markers] = True
@@ -0,0 +1,267 @@
+""" Fixed size history of streamed frames with windowed analysis. Requires numpy. """
+
+try:
+    import numpy
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError as exception:
+    raise ImportError("qtm_rt.history requires numpy") from exception
+
+from qtm_rt import arrays
+
+
+class RingBuffer(object):
+    """Fixed number of rows of one shape, of which the latest can be read without copy.
+
+    Every row is written twice, so any number of latest rows is a contiguous view.
+
+    :param capacity: Number of rows kept.
+    :param shape: Shape of a row.
+    """
+
+    def __init__(self, capacity, shape=(), dtype=float):
+        self.capacity = capacity
+        self.shape = tuple(shape)
+        self._data = numpy.zeros((2 * capacity,) + self.shape, dtype=dtype)
+        self._end = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        """ Remove all rows """
+        self._end = 0
+        self._size = 0
+
+    def append(self, row):
+        """ Add one row, replacing the oldest when full """
+        end = self._end
+        self._data[end] = row
+        self._data[end + self.capacity] = row
+        self._end = (end + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, rows):
+        """ Add rows, oldest first """
+        rows = rows[len(rows) - self.capacity :] if len(rows) > self.capacity else rows
+        count = len(rows)
+        end, capacity = self._end, self.capacity
+        first = min(count, capacity - end)
+        for offset in (0, capacity):
+            self._data[end + offset : end + offset + first] = rows[:first]
+            self._data[offset : offset + count - first] = rows[first:]
+        self._end = (end + count) % capacity
+        self._size = min(self._size + count, capacity)
+
+    def last(self, count=None):
+        """The latest rows, oldest first, as a read only view.
+
+        :param count: Number of rows, all if None.
+        """
+        count = self._size if count is None else min(count, self._size)
+        end = self._end + self.capacity
+        view = self._data[end - count : end]
+        view.flags.writeable = False
+        return view
+
+
+class _Stream(object):
+    """Rows of a component and the number of rows added with every frame.
+
+    Room is kept for ``rows_per_frame`` rows in every frame, a frame with more rows
+    makes the stream reallocate, so the rows of all frames kept are always there.
+    """
+
+    def __init__(self, frames, rows_per_frame, shape):
+        self.frames = frames
+        self.rows_per_frame = rows_per_frame
+        self.rows = RingBuffer(frames * rows_per_frame, shape)
+        self.counts = RingBuffer(frames, dtype=numpy.int64)
+
+    def add(self, rows):
+        if len(rows) > self.rows_per_frame:
+            # With some margin, as chunk sizes of analog and force samples vary
+            self._grow(max(len(rows), self.rows_per_frame * 5 // 4))
+        self.rows.extend(rows)
+        self.counts.append(len(rows))
+
+    def _grow(self, rows_per_frame):
+        kept = self.rows.last()
+        self.rows_per_frame = rows_per_frame
+        self.rows = RingBuffer(self.frames * rows_per_frame, self.rows.shape)
+        self.rows.extend(kept)
+
+    def last(self, frames):
+        return self.rows.last(int(self.counts.last(frames).sum()))
+
+
+class FrameHistory(object):
+    """The latest frames of a stream, as arrays with the oldest frame first.
+
+    Labelled 3D markers, 6DOF bodies, analog samples and force samples are kept in
+    arrays allocated with the first frame that has them, so memory stays constant.
+    Windows are read only views, valid until the next frame is added, selected by a
+    number of frames, by time or from a frame number::
+
+        history = FrameHistory(frames=1000)
+        await connection.stream_frames(components=["3d", "analog"], on_packet=history.add_packet)
+        ...
+        markers = history.markers(seconds=0.2)
+        speed = numpy.linalg.norm(derivative(markers, 1 / frequency), axis=-1)
+
+    Frames without a component add no rows to its arrays. A component whose number
+    of markers, bodies or channels changes, or a stream whose frame numbers restart,
+    starts over.
+
+    :param frames: Number of frames kept.
+    """
+
+    def __init__(self, frames=1000):
+        self.frames = frames
+        self._framenumbers = RingBuffer(frames, dtype=numpy.int64)
+        self._timestamps = RingBuffer(frames)
+        self._streams = {}
+
+    def __len__(self):
+        return len(self._framenumbers)
+
+    def clear(self):
+        """ Remove all frames """
+        self._framenumbers.clear()
+        self._timestamps.clear()
+        self._streams = {}
+
+    def add_packet(self, packet):
+        """ Add the components of a packet as the latest frame """
+        if len(self) and packet.framenumber <= self._framenumbers.last(1)[0]:
+            self.clear()  # A new measurement
+        self._framenumbers.append(packet.framenumber)
+        self._timestamps.append(packet.timestamp / 1e6)
+
+        added = set()
+        markers = arrays.markers_3d(packet)
+        if markers is None:
+            markers = (arrays.markers_3d_residual(packet) or (None,))[0]
+        if markers is not None:
+            self._add(added, "markers", markers[None], 1)
+
+        bodies = arrays.bodies_6d(packet) or arrays.bodies_6d_residual(packet)
+        if bodies is not None:
+            self._add(added, "positions", bodies[0][None], 1)
+            self._add(added, "rotations", bodies[1][None], 1)
+
+        for device, _, samples in arrays.analog(packet) or []:
+            self._add(added, ("analog", device), samples.T, samples.shape[1] + 1)
+        for plate, _, samples in arrays.force(packet) or []:
+            self._add(added, ("force", plate), samples, len(samples) + 1)
+
+        # Frames without a component have no rows of it
+        for key, stream in self._streams.items():
+            if key not in added:
+                stream.counts.append(0)
+
+    def _add(self, added, key, rows, rows_per_frame):
+        added.add(key)
+        stream = self._streams.get(key)
+        if stream is None or stream.rows.shape != rows.shape[1:]:
+            stream = self._streams[key] = _Stream(self.frames, rows_per_frame, rows.shape[1:])
+            stream.counts.extend(numpy.zeros(len(self) - 1, dtype=numpy.int64))
+        stream.add(rows)
+
+    def _count(self, frames, seconds, since):
+        count = len(self)
+        if frames is not None:
+            count = min(count, frames)
+        if seconds is not None and count:
+            timestamps = self._timestamps.last()
+            first = numpy.searchsorted(timestamps, timestamps[-1] - seconds - 1e-9)
+            count = min(count, len(timestamps) - first)
+        if since is not None:
+            first = numpy.searchsorted(self._framenumbers.last(), since)
+            count = min(count, len(self) - first)
+        return count
+
+    def _window(self, key, frames, seconds, since):
+        stream = self._streams.get(key)
+        if stream is None:
+            return None
+        return stream.last(self._count(frames, seconds, since))
+
+    def framenumbers(self, frames=None, seconds=None, since=None):
+        """Frame numbers of the window, all frames if no limit is given.
+
+        :param frames: Latest number of frames.
+        :param seconds: Frames at most this much older than the latest frame.
+        :param since: Frames from this frame number.
+        """
+        return self._framenumbers.last(self._count(frames, seconds, since))
+
+    def timestamps(self, frames=None, seconds=None, since=None):
+        """ QTM time in seconds of the frames in the window, see :func:`framenumbers` """
+        return self._timestamps.last(self._count(frames, seconds, since))
+
+    def markers(self, frames=None, seconds=None, since=None):
+        """ A (frames, markers, 3) array, see :func:`framenumbers` for the window """
+        return self._window("markers", frames, seconds, since)
+
+    def positions(self, frames=None, seconds=None, since=None):
+        """ A (frames, bodies, 3) array of 6DOF positions """
+        return self._window("positions", frames, seconds, since)
+
+    def rotations(self, frames=None, seconds=None, since=None):
+        """ A (frames, bodies, 3, 3) array of 6DOF rotation matrices """
+        return self._window("rotations", frames, seconds, since)
+
+    def analog(self, device, frames=None, seconds=None, since=None):
+        """ A (samples, channels) array of the samples of an analog device """
+        return self._window(("analog", device), frames, seconds, since)
+
+    def force(self, plate, frames=None, seconds=None, since=None):
+        """ A (samples, 9) array of the samples of a force plate """
+        return self._window(("force", plate), frames, seconds, since)
+
+
+def derivative(values, spacing, out=None):
+    """Derivative along the first axis, central differences inside and one sided at
+    the ends.
+
+    :param values: Array with at least 2 rows.
+    :param spacing: Time between rows.
+    :param out: Array of the same shape to write the result to.
+    """
+    if out is None:
+        out = numpy.empty(values.shape)
+    numpy.subtract(values[2:], values[:-2], out=out[1:-1])
+    out[1:-1] /= 2 * spacing
+    numpy.subtract(values[1], values[0], out=out[0])
+    numpy.subtract(values[-1], values[-2], out=out[-1])
+    out[0] /= spacing
+    out[-1] /= spacing
+    return out
+
+
+def _rolling(values, length):
+    return sliding_window_view(values, length, axis=0)
+
+
+def rolling_mean(values, length, out=None):
+    """Mean of every ``length`` consecutive rows.
+
+    :rtype: Array with len(values) - length + 1 rows
+    """
+    return numpy.mean(_rolling(values, length), axis=-1, out=out)
+
+
+def rolling_variance(values, length, out=None):
+    """ Variance of every ``length`` consecutive rows, see :func:`rolling_mean` """
+    return numpy.var(_rolling(values, length), axis=-1, out=out)
+
+
+def rolling_min(values, length, out=None):
+    """ Minimum of every ``length`` consecutive rows, see :func:`rolling_mean` """
+    return numpy.min(_rolling(values, length), axis=-1, out=out)
+
+
+def rolling_max(values, length, out=None):
+    """ Maximum of every ``length`` consecutive rows, see :func:`rolling_mean` """
+    return numpy.max(_rolling(values, length), axis=-1, out=out)
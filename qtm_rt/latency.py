@@ -0,0 +1,113 @@
+""" Socket options for frame delivery latency """
+
+import functools
+import logging
+import socket
+import sys
+
+LOG = logging.getLogger("qtm_rt")
+
+# Not exported by the socket module on all Python versions
+SO_BUSY_POLL = getattr(socket, "SO_BUSY_POLL", 46)
+
+_LINUX = sys.platform.startswith("linux")
+
+
+def _get(sock, level, option):
+    try:
+        return sock.getsockopt(level, option)
+    except OSError:
+        return None
+
+
+def socket_options(sock):
+    """Read the latency related options of a socket.
+
+    :rtype: A dict with the effective values of nodelay, quickack, rcvbuf and
+        busy_poll, None for options not available on this platform.
+    """
+    return {
+        "nodelay": bool(_get(sock, socket.IPPROTO_TCP, socket.TCP_NODELAY)),
+        "quickack": (
+            bool(_get(sock, socket.IPPROTO_TCP, socket.TCP_QUICKACK))
+            if hasattr(socket, "TCP_QUICKACK")
+            else None
+        ),
+        "rcvbuf": _get(sock, socket.SOL_SOCKET, socket.SO_RCVBUF),
+        "busy_poll": _get(sock, socket.SOL_SOCKET, SO_BUSY_POLL) if _LINUX else None,
+    }
+
+
+class LatencyProfile(object):
+    """Socket options applied by :func:`~qtm_rt.connect` when given as latency_profile.
+
+    Options not available on the platform are skipped. The values actually in effect
+    are available as :attr:`qtm_rt.QRTConnection.socket_options`.
+
+    Whether a profile lowers latency depends on the network and the OS, measure it
+    with ``benchmarks/latency_benchmark.py``. Over loopback the options have not been
+    seen to lower latency, and re-arming TCP_QUICKACK costs a system call per read.
+
+    :param nodelay: Set TCP_NODELAY, so commands are sent without waiting.
+    :param quickack: Set TCP_QUICKACK (Linux), so QTM is not held back by delayed
+        acknowledgements. Linux clears the option again, so it is re-armed after
+        every read.
+    :param rcvbuf: Receive buffer size in bytes, None to keep the default.
+    :param busy_poll: Microseconds to busy poll the network device for data (Linux,
+        SO_BUSY_POLL), None to disable. Usually requires CAP_NET_ADMIN.
+    """
+
+    def __init__(self, nodelay=True, quickack=True, rcvbuf=4 << 20, busy_poll=None):
+        self.nodelay = nodelay
+        self.quickack = quickack
+        self.rcvbuf = rcvbuf
+        self.busy_poll = busy_poll
+
+    def __repr__(self):
+        return "LatencyProfile(nodelay=%r, quickack=%r, rcvbuf=%r, busy_poll=%r)" % (
+            self.nodelay,
+            self.quickack,
+            self.rcvbuf,
+            self.busy_poll,
+        )
+
+    def apply(self, sock):
+        """Apply the profile to a connected TCP socket.
+
+        :rtype: The effective options, see :func:`socket_options`.
+        """
+        if self.nodelay:
+            _set(sock, socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.quickack and hasattr(socket, "TCP_QUICKACK"):
+            _set(sock, socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        if self.rcvbuf is not None:
+            _set(sock, socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if self.busy_poll is not None and _LINUX:
+            _set(sock, socket.SOL_SOCKET, SO_BUSY_POLL, self.busy_poll)
+
+        return socket_options(sock)
+
+    def install(self, protocol, sock):
+        """Re-arm TCP_QUICKACK before every read is handled by protocol.
+
+        :param protocol: The :class:`qtm_rt.protocol.QTMProtocol` reading from sock.
+        """
+        if not (self.quickack and hasattr(socket, "TCP_QUICKACK")):
+            return
+
+        protocol.set_on_read(
+            functools.partial(sock.setsockopt, socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        )
+
+
+def _set(sock, level, option, value):
+    try:
+        sock.setsockopt(level, option, value)
+    except OSError as exception:
+        LOG.warning("Could not set socket option %s: %s", option, exception)
+
+
+#: The options of :class:`LatencyProfile` that are meant to shorten frame delivery,
+#: TCP_NODELAY, TCP_QUICKACK and a 4 MB receive buffer. Measure that they do before
+#: relying on them.
+LOW_LATENCY = LatencyProfile()
@@ -0,0 +1,174 @@
+""" Counters and histograms for the receive path """
+
+import bisect
+
+TIME_BUCKETS = (
+    1e-6,
+    2.5e-6,
+    5e-6,
+    1e-5,
+    2.5e-5,
+    5e-5,
+    1e-4,
+    2.5e-4,
+    5e-4,
+    1e-3,
+    2.5e-3,
+    5e-3,
+    1e-2,
+    2.5e-2,
+    0.1,
+)
+
+SIZE_BUCKETS = (0, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram(object):
+    """Histogram with fixed buckets.
+
+    :param buckets: Sorted upper bounds of the buckets, a last bucket for larger
+        values is added.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        """ Add a value """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def reset(self):
+        """ Remove all values """
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def snapshot(self):
+        """ Buckets as (upper bound, count) pairs, the last bound is inf """
+        return {
+            "buckets": list(zip(self.buckets + (float("inf"),), self.counts)),
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class Metrics(object):
+    """Metrics for the data received from QTM.
+
+    Disabled by default, enabled with :func:`qtm_rt.QRTConnection.enable_metrics`.
+    Tracks:
+
+    - ``received_bytes``: bytes received from the socket.
+    - ``packets``: packets received per :class:`qtm_rt.packet.QRTPacketType`.
+    - ``parse_seconds``: histogram of the time to parse a packet.
+    - ``callback_seconds``: histogram of the time spent in the handler of a packet,
+      for data packets while streaming this is the on_packet callback.
+    - ``buffered_bytes``: histogram of bytes left in the receive buffer, waiting for
+      the rest of a packet, after each read.
+    """
+
+    def __init__(self, time_buckets=TIME_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.received_bytes = 0
+        self.packets = {}
+        self.parse_seconds = Histogram(time_buckets)
+        self.callback_seconds = Histogram(time_buckets)
+        self.buffered_bytes = Histogram(size_buckets)
+
+    def data_received(self, size, buffered):
+        """ Count a read of size bytes, leaving buffered bytes unparsed """
+        self.received_bytes += size
+        self.buffered_bytes.observe(buffered)
+
+    def packet_received(self, type_, parse_time, callback_time):
+        """ Count a packet of type_ """
+        self.packets[type_] = self.packets.get(type_, 0) + 1
+        self.parse_seconds.observe(parse_time)
+        self.callback_seconds.observe(callback_time)
+
+    def reset(self):
+        """ Reset all counters and histograms """
+        self.received_bytes = 0
+        self.packets = {}
+        self.parse_seconds.reset()
+        self.callback_seconds.reset()
+        self.buffered_bytes.reset()
+
+    def snapshot(self):
+        """ The current values as a dict """
+        return {
+            "received_bytes": self.received_bytes,
+            "packets": {type_.name: count for type_, count in self.packets.items()},
+            "parse_seconds": self.parse_seconds.snapshot(),
+            "callback_seconds": self.callback_seconds.snapshot(),
+            "buffered_bytes": self.buffered_bytes.snapshot(),
+        }
+
+    def prometheus(self, prefix="qtm_rt", labels=None):
+        """The current values in the Prometheus text exposition format.
+
+        :param prefix: Prefix of the metric names.
+        :param labels: A dict of labels added to every sample, for example to tell
+            connections apart.
+        """
+        labels = dict(labels or {})
+        lines = []
+
+        def sample(name, value, extra=None):
+            all_labels = dict(labels, **(extra or {}))
+            if all_labels:
+                name += "{%s}" % ",".join(
+                    '%s="%s"' % (key, _escape(val)) for key, val in all_labels.items()
+                )
+            lines.append("%s %s" % (name, _number(value)))
+
+        def header(name, type_, help_):
+            lines.append("# HELP %s %s" % (name, help_))
+            lines.append("# TYPE %s %s" % (name, type_))
+
+        def histogram(name, value, help_):
+            header(name, "histogram", help_)
+            total = 0
+            for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                total += count
+                sample(name + "_bucket", total, {"le": _number(bound)})
+            sample(name + "_sum", value.sum)
+            sample(name + "_count", value.count)
+
+        name = prefix + "_received_bytes_total"
+        header(name, "counter", "Bytes received from QTM.")
+        sample(name, self.received_bytes)
+
+        name = prefix + "_packets_total"
+        header(name, "counter", "Packets received from QTM by type.")
+        for type_, count in sorted(self.packets.items(), key=lambda item: item[0].value):
+            sample(name, count, {"type": type_.name})
+
+        histogram(
+            prefix + "_parse_seconds", self.parse_seconds, "Time to parse a packet."
+        )
+        histogram(
+            prefix + "_callback_seconds",
+            self.callback_seconds,
+            "Time spent handling a packet, including user callbacks.",
+        )
+        histogram(
+            prefix + "_buffered_bytes",
+            self.buffered_bytes,
+            "Bytes waiting in the receive buffer after a read.",
+        )
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,75 @@
+""" Helpers for extracting information from QTM parameter XML """
+
+from collections import namedtuple
+import xml.etree.ElementTree as ET
+
+# pylint: disable=C0103
+
+AnalogDeviceInfo = namedtuple("AnalogDeviceInfo", "id name channels frequency")
+
+
+def _parse(xml):
+    if xml is None:
+        return None
+    if isinstance(xml, ET.Element):
+        return xml
+    return ET.fromstring(xml)
+
+
+def _text(element, default=None):
+    if element is None or element.text is None:
+        return default
+    return element.text.strip()
+
+
+def frequency(xml):
+    """Get the capture frequency from general settings.
+
+    :param xml: Parameter XML as returned by :func:`~qtm_rt.QRTConnection.get_parameters`.
+    :rtype: The frequency as a float or None if not present.
+    """
+    root = _parse(xml)
+    if root is None:
+        return None
+    value = _text(root.find("General/Frequency"))
+    return None if value is None else float(value)
+
+
+def marker_labels(xml):
+    """Get the names of the labelled 3D markers, in stream order."""
+    root = _parse(xml)
+    if root is None:
+        return []
+    return [_text(name, "") for name in root.findall("The_3D/Label/Name")]
+
+
+def body_names(xml):
+    """Get the names of the 6DOF bodies, in stream order."""
+    root = _parse(xml)
+    if root is None:
+        return []
+    return [_text(name, "") for name in root.findall("The_6D/Body/Name")]
+
+
+def analog_devices(xml):
+    """Get the analog devices and their channel labels, in stream order.
+
+    :rtype: A list of :class:`AnalogDeviceInfo`.
+    """
+    root = _parse(xml)
+    if root is None:
+        return []
+
+    devices = []
+    for device in root.findall("Analog/Device"):
+        device_id = _text(device.find("Device_ID"))
+        rate = _text(device.find("Frequency"))
+        devices.append(
+            AnalogDeviceInfo(
+                None if device_id is None else int(device_id),
+                _text(device.find("Device_Name"), ""),
+                [_text(label, "") for label in device.findall("Channel/Label")],
+                None if rate is None else float(rate),
+            )
+        )
+    return devices
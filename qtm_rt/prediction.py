@@ -0,0 +1,165 @@
+""" Prediction of 6DOF poses ahead of the latest frame. Requires numpy. """
+
+import math
+import time as time_module
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.prediction requires numpy") from exception
+
+from qtm_rt import arrays, transforms
+from qtm_rt.clock import ClockOffset
+
+
+class PosePredictor(object):
+    """Extrapolates the poses of all rigid bodies to any time, to cancel latency.
+
+    Feed it the streamed frames and ask for the poses when they are needed, for
+    example at the frame rate of a headset::
+
+        predictor = PosePredictor()
+        await connection.stream_frames(components=["6d"], on_packet=predictor.add_packet)
+        ...
+        positions, rotations = predictor.predict_now(ahead=0.005)
+
+    The linear and angular velocity of every body are estimated from consecutive
+    frames and low pass filtered. A body that is not tracked keeps its latest pose and
+    velocities until it is older than ``max_age``.
+
+    :param velocity_cutoff: Cutoff frequency in Hz of the velocity filter, lower gives
+        smoother but later velocities.
+    :param horizon: Longest time in seconds that poses are extrapolated.
+    :param max_age: Poses older than this many seconds are predicted as NaN.
+    :param clock: Local clock in seconds, used by :func:`predict_now`.
+    :param clock_window: Seconds of frames the mapping from the local clock to QTM
+        time is estimated from, see :class:`qtm_rt.clock.ClockOffset`.
+    """
+
+    def __init__(
+        self,
+        velocity_cutoff=20.0,
+        horizon=0.1,
+        max_age=0.5,
+        clock=time_module.perf_counter,
+        clock_window=10.0,
+    ):
+        self.velocity_cutoff = velocity_cutoff
+        self.horizon = horizon
+        self.max_age = max_age
+        self.clock = clock
+        self._clock_offset = ClockOffset(clock_window)
+        self.reset()
+
+    def reset(self):
+        """ Forget all poses """
+        self.positions = None
+        self.quaternions = None
+        #: Estimated linear velocity of every body, in units / s
+        self.linear_velocity = None
+        #: Estimated angular velocity of every body, as a rotation vector in radians / s
+        #: about the global axes
+        self.angular_velocity = None
+        #: QTM time in seconds of the latest pose of every body, NaN if never seen
+        self.times = None
+        self._clock_offset.reset()
+
+    def add_packet(self, packet, received=None):
+        """Update the poses with the 6DOF data in a packet.
+
+        :param received: Local clock when the packet was received, now if None.
+        """
+        bodies = arrays.bodies_6d(packet)
+        if bodies is None:
+            bodies = arrays.bodies_6d_residual(packet)
+        if bodies is not None:
+            self.update(bodies[0], bodies[1], packet.timestamp / 1e6, received)
+
+    def update(self, positions, rotations, time, received=None):
+        """Update the poses.
+
+        :param positions: A (bodies, 3) array, NaN for bodies that are not tracked.
+        :param rotations: A (bodies, 3, 3) array of rotation matrices.
+        :param time: QTM time of the frame in seconds.
+        :param received: Local clock when the frame was received, now if None.
+        """
+        positions = numpy.asarray(positions, dtype=float)
+        quaternions = transforms.matrix_to_quaternion(rotations)
+        if self.positions is None or self.positions.shape != positions.shape:
+            self._allocate(len(positions))
+        elif numpy.any(self.times > time):
+            self._allocate(len(positions))  # Time restarted, with a new measurement
+            self._clock_offset.reset()
+
+        self._clock_offset.add(self.clock() if received is None else received, time)
+
+        valid = ~(numpy.isnan(positions).any(axis=-1) | numpy.isnan(quaternions).any(axis=-1))
+        with numpy.errstate(invalid="ignore", divide="ignore"):
+            period = (time - self.times)[:, None]
+            moving = valid & (period[:, 0] > 0)
+
+            linear = (positions - self.positions) / period
+            delta = transforms.quaternion_multiply(
+                quaternions, transforms.quaternion_conjugate(self.quaternions)
+            )
+            angular = transforms.quaternion_to_rotation_vector(delta) / period
+
+            alpha = 1.0 / (1.0 + 1.0 / (2 * math.pi * self.velocity_cutoff * period))
+            linear = self.linear_velocity + alpha * (linear - self.linear_velocity)
+            angular = self.angular_velocity + alpha * (angular - self.angular_velocity)
+
+        moving = moving[:, None]
+        numpy.copyto(self.linear_velocity, linear, where=moving)
+        numpy.copyto(self.angular_velocity, angular, where=moving)
+        new = (valid & numpy.isnan(self.times))[:, None]
+        numpy.copyto(self.linear_velocity, 0.0, where=new)
+        numpy.copyto(self.angular_velocity, 0.0, where=new)
+
+        numpy.copyto(self.positions, positions, where=valid[:, None])
+        numpy.copyto(self.quaternions, quaternions, where=valid[:, None])
+        numpy.copyto(self.times, time, where=valid)
+
+    def _allocate(self, count):
+        self.positions = numpy.full((count, 3), numpy.nan)
+        self.quaternions = numpy.full((count, 4), numpy.nan)
+        self.linear_velocity = numpy.zeros((count, 3))
+        self.angular_velocity = numpy.zeros((count, 3))
+        self.times = numpy.full(count, numpy.nan)
+
+    def predict(self, time):
+        """Poses of all bodies at a QTM time.
+
+        :param time: QTM time in seconds, as ``packet.timestamp / 1e6``.
+        :rtype: A (bodies, 3) array of positions and a (bodies, 3, 3) array of rotation
+            matrices, or None before the first frame
+        """
+        if self.positions is None:
+            return None
+
+        with numpy.errstate(invalid="ignore"):
+            age = time - self.times
+            ahead = numpy.clip(age, -self.horizon, self.horizon)[:, None]
+            stale = ~(age <= self.max_age)
+
+        positions = self.positions + self.linear_velocity * ahead
+        quaternions = transforms.quaternion_multiply(
+            transforms.rotation_vector_to_quaternion(self.angular_velocity * ahead),
+            self.quaternions,
+        )
+        positions[stale] = numpy.nan
+        quaternions[stale] = numpy.nan
+        return positions, transforms.quaternion_to_matrix(quaternions)
+
+    def predict_now(self, ahead=0.0):
+        """Poses of all bodies now, according to the local clock, plus ``ahead`` seconds.
+
+        The QTM time of now is estimated from the frame that arrived fastest during
+        the last ``clock_window`` seconds, so the minimum transport latency is not
+        included, add it to ``ahead`` if known.
+
+        :rtype: As :func:`predict`
+        """
+        now = self._clock_offset.to_qtm(self.clock())
+        if now is None:
+            return None
+        return self.predict(now + ahead)
@@ -5,8 +5,11 @@
 import asyncio
 import struct
 import collections
+import itertools
+from collections import namedtuple
 import logging
 
+from qtm_rt.events import EventBus
 from qtm_rt.packet import QRTPacketType
 from qtm_rt.packet import QRTPacket, QRTEvent
 from qtm_rt.packet import RTheader, RTEvent, RTCommand
@@ -16,6 +19,36 @@ from qtm_rt.receiver import Receiver
 
 LOG = logging.getLogger("qtm_rt")
 
+QRTFileTransfer = namedtuple("QRTFileTransfer", "received size elapsed throughput")
+
+
+# Commands QTM does not send a command response to
+_NO_RESPONSE_COMMANDS = ("getstate", "streamframes stop")
+
+
+def _pack_command(command, command_type):
+    cmd_length = len(command)
+    return struct.pack(
+        RTCommand % cmd_length,
+        RTheader.size + cmd_length + 1,
+        command_type.value,
+        command.encode(),
+        b"\0",
+    )
+
+
+def _response_type(command, command_type):
+    """ Packet type QTM responds to command with """
+    if command_type == QRTPacketType.PacketCommand:
+        command = command.lower()
+        if command.startswith("getparameters"):
+            return QRTPacketType.PacketXML
+        if command.startswith("getcurrentframe") or (
+            command.startswith("streamframes") and not command.startswith("streamframes stop")
+        ):
+            return QRTPacketType.PacketData
+    return QRTPacketType.PacketCommand
+
 
 class QRTCommandException(Exception):
     """
@@ -30,6 +63,12 @@ class QRTCommandException(Exception):
         return repr(self.value)
 
 
+class QRTTimeoutError(QRTCommandException, TimeoutError):
+    """
+        No response from QTM in time
+    """
+
+
 class QTMProtocol(asyncio.Protocol):
     """
         QTM RT Protocol implementation
@@ -42,12 +81,24 @@ class QTMProtocol(asyncio.Protocol):
         self.on_disconnect = on_disconnect
         self.on_event = on_event
         self.on_packet = None
-
-        self.request_queue = collections.deque()
-        self.event_future = None
+        # Called before every read from QTM is handled, see set_on_read
+        self._on_read = None
+
+        # One FIFO per response type, errors are matched to the oldest request
+        self._request_queues = {
+            QRTPacketType.PacketCommand: collections.deque(),
+            QRTPacketType.PacketXML: collections.deque(),
+            QRTPacketType.PacketData: collections.deque(),
+        }
+        self._request_sequence = itertools.count()
         self._start_streaming = False
+        # Reading paused by flow control, and whether the transport is paused
+        self._reading_paused = False
+        self._transport_paused = False
+        self._awaited_events = 0
 
         self.loop = loop or asyncio.get_event_loop()
+        self.events = EventBus(loop=self.loop)
         self.transport = None
 
         self._handlers = {
@@ -56,8 +107,11 @@ class QTMProtocol(asyncio.Protocol):
             QRTPacketType.PacketCommand: self._on_command,
             QRTPacketType.PacketEvent: self._on_event,
             QRTPacketType.PacketXML: self._on_xml,
-            QRTPacketType.PacketNoMoreData: self._on_no_more_data
+            QRTPacketType.PacketNoMoreData: self._on_no_more_data,
+            QRTPacketType.PacketC3DFile: self._on_file,
+            QRTPacketType.PacketQTMFile: self._on_file,
         }
+        self._file_transfer = None
 
         self._receiver = Receiver(self._handlers)
 
@@ -67,58 +121,151 @@ class QTMProtocol(asyncio.Protocol):
         # No need to check response, will throw if error
         await self.send_command(version_cmd)
 
-    async def _wait_loop(self, event):
-        while True:
-            self.event_future = self.event_future or self.loop.create_future()
-            result = await self.event_future
-
-            if event is None or event == result:
-                break
-        return result
-
     async def await_event(self, event=None, timeout=None):
-        """ Wait for any or specified event """
-        if self.event_future is not None:
-            raise Exception("Can't wait on multiple events!")
+        """ Wait for any or specified event, any number of waiters are allowed """
+        self._awaited_events += 1
+        self._update_reading()
+        try:
+            return await self.events.wait(event, timeout)
+        finally:
+            self._awaited_events -= 1
+            self._update_reading()
+
+    def pause_reading(self):
+        """Pause reading from QTM, for flow control.
+
+        Reading goes on while a response, event or file is awaited, or it could
+        never arrive.
+        """
+        self._reading_paused = True
+        self._update_reading()
+
+    def resume_reading(self):
+        """ Resume reading paused with :func:`pause_reading` """
+        self._reading_paused = False
+        self._update_reading()
+
+    def _awaiting(self):
+        if self._awaited_events or self._file_transfer is not None:
+            return True
+        return any(
+            not future.done()
+            for queue in self._request_queues.values()
+            for _, future, _ in queue
+        )
+
+    def _update_reading(self, _=None):
+        pause = self._reading_paused and not self._awaiting()
+        if self.transport is None or pause == self._transport_paused:
+            return
+        self._transport_paused = pause
+        if pause:
+            self.transport.pause_reading()
+        else:
+            self.transport.resume_reading()
 
-        result = await asyncio.wait_for(self._wait_loop(event), timeout)
-        return result
+    def _queue_request(self, response_type, accepts_error=True):
+        future = self.loop.create_future()
+        self._request_queues[response_type].append(
+            (next(self._request_sequence), future, accepts_error)
+        )
+        future.add_done_callback(self._update_reading)
+        self._update_reading()
+        return future
 
     def send_command(
-        self, command, callback=True, command_type=QRTPacketType.PacketCommand
+        self,
+        command,
+        callback=True,
+        command_type=QRTPacketType.PacketCommand,
+        response_type=None,
     ):
-        """ Sends commands to QTM """
+        """Sends commands to QTM
+
+        Responses are matched to commands in the order they were sent, separately for
+        each response type (command, XML or data), so several commands can be waited
+        for at the same time.
+
+        :param response_type: The packet type of the response, deduced from the
+            command if None.
+        """
         if self.transport is not None:
-            cmd_length = len(command)
             LOG.debug("S: %s", command)
-            self.transport.write(
-                struct.pack(
-                    RTCommand % cmd_length,
-                    RTheader.size + cmd_length + 1,
-                    command_type.value,
-                    command.encode(),
-                    b"\0",
-                )
-            )
+            self.transport.write(_pack_command(command, command_type))
 
-            future = self.loop.create_future()
             if callback:
-                self.request_queue.append(future)
-            else:
-                future.set_result(None)
+                if response_type is None:
+                    response_type = _response_type(command, command_type)
+                return self._queue_request(response_type)
+
+            future = self.loop.create_future()
+            future.set_result(None)
             return future
 
         raise QRTCommandException("Not connected!")
 
-    def receive_response(self):
-        """ Sends commands to QTM """
+    def send_commands(self, commands):
+        """Send several commands to QTM in one write.
+
+        :rtype: A list with one future per command. The future of a command
+            that QTM does not respond to is resolved with None directly.
+        """
         if self.transport is not None:
-            future = self.loop.create_future()
-            self.request_queue.append(future)
-            return future
+            futures = []
+            for command in commands:
+                LOG.debug("S: %s", command)
+                if command.lower().startswith(_NO_RESPONSE_COMMANDS):
+                    future = self.loop.create_future()
+                    future.set_result(None)
+                else:
+                    future = self._queue_request(
+                        _response_type(command, QRTPacketType.PacketCommand)
+                    )
+                futures.append(future)
+
+            self.transport.write(
+                b"".join(
+                    _pack_command(command, QRTPacketType.PacketCommand)
+                    for command in commands
+                )
+            )
+            return futures
+
+        raise QRTCommandException("Not connected!")
+
+    def receive_response(self, response_type=QRTPacketType.PacketXML):
+        """ Wait for a response that is not the answer to a specific command """
+        if self.transport is not None:
+            return self._queue_request(response_type, accepts_error=False)
 
         raise QRTCommandException("Not connected!")
 
+    def receive_file(self, writable, on_progress=None):
+        """Write the next file sent by QTM to writable as it arrives.
+
+        Must be called before the command that makes QTM send the file.
+
+        :rtype: A future resolved with a :class:`QRTFileTransfer` when the whole file
+            has been written.
+        """
+        if self.transport is None:
+            raise QRTCommandException("Not connected!")
+        if self._file_transfer is not None:
+            raise QRTCommandException("Already receiving a file!")
+
+        future = self.loop.create_future()
+        self._file_transfer = (writable, on_progress, future, self.loop.time())
+        future.add_done_callback(self._update_reading)
+        self._update_reading()
+        return future
+
+    def cancel_file(self):
+        """ Stop waiting for a file requested with receive_file """
+        if self._file_transfer is not None:
+            _, _, future, _ = self._file_transfer
+            self._file_transfer = None
+            future.cancel()
+
     def connection_made(self, transport):
         LOG.info("Connected")
         self.transport = transport
@@ -128,41 +275,79 @@ class QTMProtocol(asyncio.Protocol):
         self.on_packet = on_packet
         self._start_streaming = on_packet is not None
 
+    def set_metrics(self, metrics):
+        """ Set :class:`qtm_rt.metrics.Metrics` to update, None to disable """
+        self._receiver.metrics = metrics
+
+    def set_on_read(self, on_read):
+        """Set a function called without arguments before every read from QTM is
+        handled, for example to set socket options that the OS clears, None to remove.
+        """
+        self._on_read = on_read
+
     def data_received(self, data):
         """ Received from QTM and route accordingly """
+        if self._on_read is not None:
+            self._on_read()
         self._receiver.data_received(data)
 
-    def _deliver_promise(self, data):
+    def _deliver_promise(self, data, response_type):
         try:
-            future = self.request_queue.pop()
-            future.set_result(data)
+            _, future, _ = self._request_queues[response_type].popleft()
         except IndexError:
-            pass
+            return
+        if not future.done():
+            future.set_result(data)
 
     def _on_data(self, packet):
         if self.on_packet is not None:
             if self._start_streaming:
-                self._deliver_promise(b"Ok")
+                self._deliver_promise(b"Ok", QRTPacketType.PacketData)
                 self._start_streaming = False
 
             self.on_packet(packet)
         else:
-            self._deliver_promise(packet)
+            self._deliver_promise(packet, QRTPacketType.PacketData)
         return
     
     def _on_no_more_data(self, packet):
         if self.on_packet is not None:
             if self._start_streaming:
-                self._deliver_promise(b"Ok")
+                self._deliver_promise(b"Ok", QRTPacketType.PacketData)
                 self._start_streaming = False
         return
     
+    def _on_file(self, chunk):
+        if self._file_transfer is None:
+            if chunk.received == len(chunk.data):
+                LOG.warning("Discarding unrequested %s", chunk.type.name)
+            return
+
+        writable, on_progress, future, start = self._file_transfer
+        try:
+            writable.write(chunk.data)
+            elapsed = self.loop.time() - start
+            progress = QRTFileTransfer(
+                chunk.received,
+                chunk.size,
+                elapsed,
+                chunk.received / elapsed if elapsed > 0 else None,
+            )
+            if on_progress is not None:
+                on_progress(progress)
+        except Exception as exception:  # pylint: disable=W0703
+            self._file_transfer = None
+            future.set_exception(exception)
+            return
+
+        if chunk.received == chunk.size:
+            LOG.debug("Received %d bytes in %.3f s", chunk.size, elapsed)
+            self._file_transfer = None
+            future.set_result(progress)
+
     def _on_event(self, event):
         LOG.info(event)
-
-        if self.event_future is not None:
-            future, self.event_future = self.event_future, None
-            future.set_result(event)
+        self.events.publish(event)
 
         if self.on_event:
             self.on_event(event)
@@ -171,23 +356,39 @@ class QTMProtocol(asyncio.Protocol):
         LOG.debug("Error: %s", response)
         if self._start_streaming:
             self.set_on_packet(None)
-        try:
-            future = self.request_queue.pop()
-            future.set_exception(QRTCommandException(response))
-        except IndexError:
+
+        oldest = None
+        for queue in self._request_queues.values():
+            for request in queue:
+                if request[2]:
+                    if oldest is None or request[0] < oldest[1][0]:
+                        oldest = (queue, request)
+                    break
+
+        if oldest is None:
             raise QRTCommandException(response)
 
+        queue, request = oldest
+        queue.remove(request)
+        if not request[1].done():
+            request[1].set_exception(QRTCommandException(response))
+
     def _on_xml(self, response):
         LOG.debug("XML: %s ...", response[: min(len(response), 70)])
-        self._deliver_promise(response)
+        self._deliver_promise(response, QRTPacketType.PacketXML)
 
     def _on_command(self, response):
         LOG.debug("R: %s", response)
         if response != b"QTM RT Interface connected":
-            self._deliver_promise(response)
+            self._deliver_promise(response, QRTPacketType.PacketCommand)
 
     def connection_lost(self, exc):
         self.transport = None
+        self._transport_paused = False
+        if self._file_transfer is not None:
+            _, _, future, _ = self._file_transfer
+            self._file_transfer = None
+            future.set_exception(QRTCommandException("Disconnected"))
         LOG.info("Disconnected")
         if self.on_disconnect is not None:
             self.on_disconnect(exc)
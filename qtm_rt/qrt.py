@@ -4,6 +4,11 @@ import asyncio
 import logging
 from functools import wraps
 
+from qtm_rt.flow import PacketQueue
+from qtm_rt.metrics import Metrics
+from qtm_rt.tracing import remove_wrapper, trace_protocol, untrace_protocol
+from qtm_rt.watchdog import Watchdog
+from qtm_rt import parameters
 from qtm_rt.packet import QRTPacketType, QRTPacket
 from qtm_rt.protocol import QTMProtocol, QRTCommandException
 
@@ -12,22 +17,49 @@ from qtm_rt.protocol import QTMProtocol, QRTCommandException
 LOG = logging.getLogger("qtm_rt")  # pylint: disable C0103
 
 
+_PARAMETERS = [
+    "all",
+    "general",
+    "3d",
+    "6d",
+    "analog",
+    "force",
+    "gazevector",
+    "eyetracker",
+    "image",
+    "skeleton",
+    "skeleton:global",
+    "calibration",
+]
+
+
+def _check_response(expected_responses, response):
+    for expected_response in expected_responses:
+        if response.startswith(expected_response):
+            return response
+
+    raise QRTCommandException(
+        "Expected %s but got %s" % (expected_responses, response)
+    )
+
+
 def validate_response(expected_responses):
-    """ Decorator to validate responses from QTM """
+    """ Decorator to validate responses from QTM, of coroutines or plain functions """
 
     def internal_decorator(function):
+        if not asyncio.iscoroutinefunction(function):
+
+            @wraps(function)
+            def blocking_wrapper(*args, **kwargs):
+                return _check_response(expected_responses, function(*args, **kwargs))
+
+            return blocking_wrapper
+
         @wraps(function)
         async def wrapper(*args, **kwargs):
 
             response = await function(*args, **kwargs)
-
-            for expected_response in expected_responses:
-                if response.startswith(expected_response):
-                    return response
-
-            raise QRTCommandException(
-                "Expected %s but got %s" % (expected_responses, response)
-            )
+            return _check_response(expected_responses, response)
 
         return wrapper
 
@@ -40,10 +72,18 @@ class QRTConnection(object):
         Returned by :func:`~qtm_rt.connect` when successfuly connected to QTM.
     """
 
-    def __init__(self, protocol: QTMProtocol, timeout):
+    def __init__(self, protocol: QTMProtocol, timeout, socket_options=None):
         super(QRTConnection, self).__init__()
         self._protocol = protocol
         self._timeout = timeout
+        #: Effective socket options when connected with a latency profile,
+        #: see :func:`qtm_rt.latency.socket_options`.
+        self.socket_options = socket_options
+        #: The :class:`qtm_rt.metrics.Metrics` if enabled, otherwise None
+        self.metrics = None
+        #: The :class:`qtm_rt.watchdog.Watchdog` if started, otherwise None
+        self.watchdog = None
+        self._frames = "allframes"
 
     def disconnect(self):
         """Disconnect from QTM."""
@@ -77,8 +117,19 @@ class QRTConnection(object):
         await self._protocol.send_command("getstate", callback=False)
         return await self._protocol.await_event()
 
+    @property
+    def events(self):
+        """The :class:`qtm_rt.events.EventBus` with the events from QTM, to wait for
+        events from several tasks, iterate over events or look at recent events::
+
+            with connection.events.subscribe() as events:
+                async for record in events:
+                    print(record.event)
+        """
+        return self._protocol.events
+
     async def await_event(self, event=None, timeout=30):
-        """Wait for an event from QTM.
+        """Wait for an event from QTM. Several tasks can wait at the same time.
 
         :param event: A :class:`qtm_rt.QRTEvent`
             to wait for a specific event. Otherwise wait for any event.
@@ -104,20 +155,7 @@ class QRTConnection(object):
             parameters = ["all"]
         else:
             for parameter in parameters:
-                if not parameter in [
-                    "all",
-                    "general",
-                    "3d",
-                    "6d",
-                    "analog",
-                    "force",
-                    "gazevector",
-                    "eyetracker",
-                    "image",
-                    "skeleton",
-                    "skeleton:global",
-                    "calibration",
-                ]:
+                if not parameter in _PARAMETERS:
                     raise QRTCommandException("%s is not a valid parameter" % parameter)
 
         cmd = "getparameters %s" % " ".join(parameters)
@@ -162,6 +200,9 @@ class QRTConnection(object):
 
         _validate_components(components)
 
+        self._frames = frames
+        if self.watchdog is not None:
+            on_packet = self.watchdog.wrap(on_packet, frames)
         self._protocol.set_on_packet(on_packet)
 
         cmd = "streamframes %s %s" % (frames, " ".join(components))
@@ -169,6 +210,93 @@ class QRTConnection(object):
             self._protocol.send_command(cmd), timeout=self._timeout
         )
 
+    def enable_metrics(self, metrics=None):
+        """Start counting bytes, packets and time spent on the received data.
+
+        :param metrics: A :class:`qtm_rt.metrics.Metrics` to update, for example to
+            share one between connections. A new one is created if None.
+
+        :rtype: The :class:`qtm_rt.metrics.Metrics`
+        """
+        self.metrics = metrics if metrics is not None else Metrics()
+        self._protocol.set_metrics(self.metrics)
+        return self.metrics
+
+    def disable_metrics(self):
+        """ Stop updating metrics """
+        self.metrics = None
+        self._protocol.set_metrics(None)
+
+    def enable_tracing(self, tracer):
+        """Report how long each stage of the receive pipeline takes: framing,
+        parsing, dispatch and the on_packet callback.
+
+        :param tracer: A :class:`qtm_rt.tracing.Tracer`, for example a
+            :class:`qtm_rt.tracing.ChromeTrace`.
+        """
+        trace_protocol(self._protocol, tracer)
+
+    def disable_tracing(self):
+        """ Stop tracing, tracing has no overhead when disabled """
+        untrace_protocol(self._protocol)
+
+    async def start_watchdog(
+        self, on_overrun=None, on_lag=None, lag_threshold=0.05, interval=0.1, frequency=None
+    ):
+        """Start measuring event loop lag and how long on_packet calls take.
+
+        :param on_overrun: Function called with a :class:`qtm_rt.watchdog.QRTOverrun`
+            when an on_packet call takes longer than the frame period.
+        :param on_lag: Function called with the lag in seconds when the event loop
+            lags more than lag_threshold.
+        :param lag_threshold: Event loop lag in seconds to report.
+        :param interval: Seconds between event loop lag measurements.
+        :param frequency: Capture frequency, read from QTM's general settings if None.
+
+        :rtype: The :class:`qtm_rt.watchdog.Watchdog`
+        """
+        if frequency is None:
+            frequency = parameters.frequency(await self.get_parameters(["general"]))
+
+        self.stop_watchdog()
+        self.watchdog = Watchdog(
+            frequency=frequency,
+            on_overrun=on_overrun,
+            on_lag=on_lag,
+            lag_threshold=lag_threshold,
+            interval=interval,
+            loop=self._protocol.loop,
+        )
+        if self._protocol.on_packet is not None:
+            self._protocol.on_packet = self.watchdog.wrap(
+                self._protocol.on_packet, self._frames
+            )
+        self.watchdog.start()
+        return self.watchdog
+
+    def stop_watchdog(self):
+        """ Stop the watchdog """
+        if self.watchdog is None:
+            return
+
+        watchdog, self.watchdog = self.watchdog, None
+        watchdog.stop()
+        self._protocol.on_packet = remove_wrapper(
+            self._protocol.on_packet,
+            lambda wrapper: getattr(wrapper, "watchdog", None) is watchdog,
+        )
+
+    def packet_queue(self, high_water=64, low_water=16):
+        """Create a queue to use as on_packet callback that pauses reading from QTM
+        while the consumer is behind.
+
+        :param high_water: Number of queued packets at which reading is paused.
+        :param low_water: Number of queued packets at which reading is resumed.
+
+        :rtype: A :class:`qtm_rt.flow.PacketQueue`
+        """
+        return PacketQueue(self._protocol, high_water=high_water, low_water=low_water)
+
     async def stream_frames_stop(self):
         """Stop streaming frames."""
 
@@ -300,6 +428,29 @@ class QRTConnection(object):
             timeout=self._timeout,
         )
 
+    async def pipeline(self, commands, return_exceptions=False):
+        """Send several commands to QTM in one go and wait for all responses.
+
+        The commands are written to the socket together, so the whole batch only
+        takes one round trip. Responses are returned unvalidated, as they would be
+        from :func:`~qtm_rt.QRTConnection.send_xml`::
+
+            responses = await connection.pipeline(
+                ["qtmversion", "byteorder", "getparameters 3d 6d"]
+            )
+
+        :param commands: A list of RT command strings.
+        :param return_exceptions: If True, a failed command returns its
+            :class:`qtm_rt.QRTCommandException` in the result list instead of raising.
+
+        :rtype: A list with the response to each command, in the same order.
+        """
+        futures = self._protocol.send_commands(commands)
+        return await asyncio.wait_for(
+            asyncio.gather(*futures, return_exceptions=return_exceptions),
+            timeout=self._timeout,
+        )
+
     async def calibrate(self, timeout=600):  # Timeout 10 min.
         """Start calibration and return calibration result.
 
@@ -318,10 +469,55 @@ class QRTConnection(object):
         return await asyncio.wait_for(
             self._protocol.receive_response(), timeout=timeout)
 
+    async def get_capture_c3d(self, output, on_progress=None, timeout=None):
+        """Get the latest capture as a C3D file. The file is written as it arrives
+        instead of being kept in memory.
+
+        :param output: Path of the file to create, or a writable binary file object.
+        :param on_progress: Function called with a :class:`qtm_rt.protocol.QRTFileTransfer`
+            every time a part of the file has been written.
+        :param timeout: Max time to wait for the whole file, None to wait forever.
+
+        :rtype: A :class:`qtm_rt.protocol.QRTFileTransfer` with the size, elapsed time
+            and throughput in bytes per second.
+        """
+        return await self._get_capture("getcapturec3d", output, on_progress, timeout)
+
+    async def get_capture_qtm(self, output, on_progress=None, timeout=None):
+        """Get the latest capture as a QTM file. The file is written as it arrives
+        instead of being kept in memory.
 
+        :param output: Path of the file to create, or a writable binary file object.
+        :param on_progress: Function called with a :class:`qtm_rt.protocol.QRTFileTransfer`
+            every time a part of the file has been written.
+        :param timeout: Max time to wait for the whole file, None to wait forever.
 
-# TODO GetCaptureC3D
-# TODO GetCaptureQTM
+        :rtype: A :class:`qtm_rt.protocol.QRTFileTransfer` with the size, elapsed time
+            and throughput in bytes per second.
+        """
+        return await self._get_capture("getcaptureqtm", output, on_progress, timeout)
+
+    async def _get_capture(self, cmd, output, on_progress, timeout):
+        if hasattr(output, "write"):
+            writable = output
+        else:
+            writable = open(output, "wb")
+
+        try:
+            transfer = self._protocol.receive_file(writable, on_progress)
+            try:
+                response = await asyncio.wait_for(
+                    self._protocol.send_command(cmd), timeout=self._timeout
+                )
+                if response != b"Sending capture":
+                    raise QRTCommandException(response)
+
+                return await asyncio.wait_for(transfer, timeout=timeout)
+            finally:
+                self._protocol.cancel_file()
+        finally:
+            if writable is not output:
+                writable.close()
 
 
 async def connect(
@@ -332,6 +528,7 @@ async def connect(
     on_disconnect=None,
     timeout=5,
     loop=None,
+    latency_profile=None,
 ) -> QRTConnection:
     """Async function to connect to QTM
 
@@ -343,13 +540,15 @@ async def connect(
     :param on_event: Function to be called when there's an event from QTM.
     :param timeout: The default timeout time for calls to QTM.
     :param loop: Alternative event loop, will use asyncio default if None.
+    :param latency_profile: A :class:`qtm_rt.latency.LatencyProfile` to tune the socket
+        with, for example :data:`qtm_rt.latency.LOW_LATENCY`.
 
     :rtype: A :class:`.QRTConnection`
     """
     loop = loop or asyncio.get_event_loop()
 
     try:
-        _, protocol = await loop.create_connection(
+        transport, protocol = await loop.create_connection(
             lambda: QTMProtocol(
                 loop=loop, on_event=on_event, on_disconnect=on_disconnect
             ),
@@ -360,6 +559,13 @@ async def connect(
         LOG.error(exception)
         return None
 
+    socket_options = None
+    if latency_profile is not None:
+        sock = transport.get_extra_info("socket")
+        socket_options = latency_profile.apply(sock)
+        latency_profile.install(protocol, sock)
+        LOG.debug("Socket options: %s", socket_options)
+
     try:
         await protocol.set_version(version)
     except QRTCommandException as exception:
@@ -369,7 +575,7 @@ async def connect(
         LOG.error(exception)
         return None
 
-    return QRTConnection(protocol, timeout=timeout)
+    return QRTConnection(protocol, timeout=timeout, socket_options=socket_options)
 
 
 def _validate_components(components):
@@ -1,4 +1,6 @@
+from collections import namedtuple
 import logging
+import time
 
 from qtm_rt.packet import QRTPacketType
 from qtm_rt.packet import QRTPacket, QRTEvent
@@ -6,46 +8,161 @@ from qtm_rt.packet import RTheader, RTEvent, RTCommand
 
 LOG = logging.getLogger("qtm_rt")
 
+QRTFileChunk = namedtuple("QRTFileChunk", "type data received size")
+
+_FILE_PACKET_TYPES = (QRTPacketType.PacketC3DFile.value, QRTPacketType.PacketQTMFile.value)
+
+
+def _strip_nul(data):
+    return data[:-1]
+
+
+def _event(data):
+    event, = RTEvent.unpack(data)
+    return QRTEvent(ord(event))
+
+
+def _unchanged(data):
+    return data
+
+
+# Packet type value to type and parser
+_PARSERS = {type_.value: (type_, _unchanged) for type_ in QRTPacketType}
+_PARSERS.update(
+    {
+        QRTPacketType.PacketError.value: (QRTPacketType.PacketError, _strip_nul),
+        QRTPacketType.PacketCommand.value: (QRTPacketType.PacketCommand, _strip_nul),
+        QRTPacketType.PacketXML.value: (QRTPacketType.PacketXML, _strip_nul),
+        QRTPacketType.PacketData.value: (QRTPacketType.PacketData, QRTPacket),
+        QRTPacketType.PacketEvent.value: (QRTPacketType.PacketEvent, _event),
+    }
+)
+
+_PACKET_DATA = QRTPacketType.PacketData.value
+
 
 class Receiver(object):
     def __init__(self, handlers):
         self._handlers = handlers
         self._received_data = b""
 
+        self._metrics = None
+        # Set by qtm_rt.tracing while the parse and dispatch stages are traced
+        self._traced = False
+        # Data packets skip the generic parse and dispatch unless they are measured
+        self._data_handler = None
+        self._update_fast_path()
+
+        # File packets are passed on in chunks as they arrive instead of being buffered
+        self._file_type = None
+        self._file_size = 0
+        self._file_received = 0
+
+    @property
+    def metrics(self):
+        """ A :class:`qtm_rt.metrics.Metrics` to update, None when disabled """
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self._metrics = metrics
+        self._update_fast_path()
+
+    def _update_fast_path(self):
+        """ Use the fast path for data packets unless measured or traced """
+        if self._metrics is None and not self._traced:
+            self._data_handler = self._handlers.get(QRTPacketType.PacketData)
+        else:
+            self._data_handler = None
+
     def data_received(self, data):
-        """ Received from QTM and route accordingly """
-        self._received_data += data
+        """Received from QTM and route accordingly.
+
+        data can be a memoryview of a buffer that is reused for the next read. Packets
+        and incomplete data are copied out of it, once, as they are kept.
+        """
+        data_in = data
+        if self._file_type is not None:
+            data = self._file_data_received(data)
+            if not data:
+                if self._metrics is not None:
+                    self._metrics.data_received(len(data_in), 0)
+                return
+
+        data = self._received_data + data if self._received_data else data
+        data_len = len(data)
         h_size = RTheader.size
-        data = self._received_data
-        data_len = len(data);
-
-        while data_len >= h_size:
-            size, type_ = RTheader.unpack_from(data, 0)
-            if data_len >= size:
-                self._parse_received(data[h_size:size], type_)
-                data = data[size:]
-                data_len = len(data);
+        unpack_header = RTheader.unpack_from
+        data_handler = self._data_handler
+        position = 0
+
+        while data_len - position >= h_size:
+            size, type_ = unpack_header(data, position)
+            end = position + size
+            if type_ == _PACKET_DATA and data_handler is not None:
+                if end > data_len:
+                    break
+                data_handler(QRTPacket(bytes(data[position + h_size : end])))
+                position = end
+            elif type_ in _FILE_PACKET_TYPES:
+                self._file_type = QRTPacketType(type_)
+                self._file_size = size - h_size
+                self._file_received = 0
+                data = self._file_data_received(data[position + h_size :])
+                data_len = len(data)
+                position = 0
+            elif end <= data_len:
+                self._parse_received(bytes(data[position + h_size : end]), type_)
+                position = end
             else:
-                break;
+                break
+
+        self._received_data = bytes(data[position:])
+
+        if self._metrics is not None:
+            self._metrics.data_received(len(data_in), data_len - position)
 
-        self._received_data = data
+    def _file_data_received(self, data):
+        """ Pass on the part of data belonging to the current file, return the rest """
+        remaining = self._file_size - self._file_received
+        chunk, data = bytes(data[:remaining]), data[remaining:]
+        self._file_received += len(chunk)
+
+        if chunk or self._file_size == 0:
+            self._dispatch(
+                self._file_type,
+                QRTFileChunk(
+                    self._file_type, chunk, self._file_received, self._file_size
+                ),
+            )
+
+        if self._file_received == self._file_size:
+            self._file_type = None
+        return data
+
+    def _dispatch(self, type_, data):
+        handler = self._handlers.get(type_)
+        if handler is None:
+            LOG.error("Non handled packet type! - %s", type_)
+        else:
+            handler(data)
 
     def _parse_received(self, data, type_):
-        type_ = QRTPacketType(type_)
-
-        if (
-            type_ == QRTPacketType.PacketError
-            or type_ == QRTPacketType.PacketCommand
-            or type_ == QRTPacketType.PacketXML
-        ):
-            data = data[:-1]
-        elif type_ == QRTPacketType.PacketData:
-            data = QRTPacket(data)
-        elif type_ == QRTPacketType.PacketEvent:
-            event, = RTEvent.unpack(data)
-            data = QRTEvent(ord(event))
+        metrics = self._metrics
+        if metrics is None:
+            self._dispatch(*self._parse(data, type_))
+            return
+
+        start = time.perf_counter()
+        type_, data = self._parse(data, type_)
+        parsed = time.perf_counter()
+        self._dispatch(type_, data)
+        metrics.packet_received(type_, parsed - start, time.perf_counter() - parsed)
 
+    @staticmethod
+    def _parse(data, type_):
         try:
-            self._handlers[type_](data)
+            type_, parse = _PARSERS[type_]
         except KeyError:
-            LOG.error("Non handled packet type! - %s", type_)
+            raise ValueError("%r is not a valid QRTPacketType" % type_)
+        return type_, parse(data)
@@ -0,0 +1,249 @@
+""" Connection to QTM that survives network failures """
+
+import asyncio
+from collections import namedtuple
+import logging
+
+from qtm_rt.qrt import connect
+from qtm_rt.protocol import QRTCommandException
+
+LOG = logging.getLogger("qtm_rt")
+
+QRTStreamGap = namedtuple("QRTStreamGap", "last_framenumber framenumber missing")
+
+
+class ReconnectingConnection(object):
+    """Connection to QTM that reconnects automatically when the connection is lost.
+
+    After reconnecting, the RT protocol version is negotiated again, control is taken
+    again if it was taken through this object and the last
+    :func:`~qtm_rt.ReconnectingConnection.stream_frames` call is repeated. The first
+    frame received after a reconnect is preceded by a call to ``on_gap`` with a
+    :class:`QRTStreamGap` telling how many frames were missed; ``missing`` is None when
+    the frame numbers restarted, for example because a new measurement was started.
+
+    All other :class:`qtm_rt.QRTConnection` methods are available and act on the
+    current connection::
+
+        connection = qtm_rt.ReconnectingConnection("127.0.0.1", on_gap=print)
+        await connection.connect()
+        await connection.stream_frames(components=["3d"], on_packet=on_packet)
+
+    :param host: Address of the computer running QTM.
+    :param port: Port number to connect to.
+    :param version: Version of the rt protocol to use.
+    :param on_event: Function to be called when there's an event from QTM.
+    :param on_disconnect: Function to be called when the connection is lost.
+    :param on_reconnect: Function to be called when the connection and stream have
+        been restored.
+    :param on_gap: Function to be called with a :class:`QRTStreamGap` before the first
+        frame after a reconnect.
+    :param timeout: The default timeout time for calls to QTM.
+    :param backoff: Delay in seconds before the first reconnection attempt.
+    :param max_backoff: Max delay between reconnection attempts, the delay doubles
+        after each failed attempt.
+    """
+
+    def __init__(
+        self,
+        host,
+        port=22223,
+        version="1.25",
+        on_event=None,
+        on_disconnect=None,
+        on_reconnect=None,
+        on_gap=None,
+        timeout=5,
+        backoff=0.5,
+        max_backoff=30,
+        loop=None,
+    ):
+        self.host = host
+        self.port = port
+        self.version = version
+        self.on_event = on_event
+        self.on_disconnect = on_disconnect
+        self.on_reconnect = on_reconnect
+        self.on_gap = on_gap
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.loop = loop
+
+        self.reconnect_count = 0
+
+        self._connection = None
+        self._closing = False
+        self._reconnect_task = None
+        self._password = None
+        self._stream = None
+        self._last_framenumber = None
+        self._resumed = False
+
+    def __getattr__(self, name):
+        connection = self.__dict__.get("_connection")
+        if connection is None:
+            raise QRTCommandException("Not connected!")
+        return getattr(connection, name)
+
+    @property
+    def connection(self):
+        """ The current :class:`qtm_rt.QRTConnection` or None while reconnecting """
+        return self._connection
+
+    async def connect(self, retry=False):
+        """Connect to QTM.
+
+        :param retry: Keep trying with backoff until connected instead of returning
+            False after the first failed attempt.
+
+        :rtype: True if connected.
+        """
+        self._closing = False
+        delay = self.backoff
+        while True:
+            self._connection = await self._connect()
+            if self._connection is not None or not retry:
+                return self._connection is not None
+
+            LOG.info("Retrying connection in %.1f s", delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def disconnect(self):
+        """ Disconnect from QTM and stop reconnecting """
+        self._closing = True
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._connection is not None and self._connection.has_transport():
+            self._connection.disconnect()
+        self._connection = None
+
+    def has_transport(self):
+        """ Check if connected to QTM """
+        return self._connection is not None and self._connection.has_transport()
+
+    async def take_control(self, password):
+        """Take control of QTM, control is taken again after a reconnect.
+
+        :param password: Password as entered in QTM.
+        """
+        result = await self._current().take_control(password)
+        self._password = password
+        return result
+
+    async def release_control(self):
+        """ Release control of QTM """
+        self._password = None
+        return await self._current().release_control()
+
+    async def stream_frames(self, frames="allframes", components=None, on_packet=None):
+        """Stream frames from QTM, streaming is restarted after a reconnect.
+
+        See :func:`~qtm_rt.QRTConnection.stream_frames`.
+        """
+        connection = self._current()
+        self._stream = (frames, components, on_packet)
+        self._last_framenumber = None
+        self._resumed = False
+        return await connection.stream_frames(
+            frames=frames, components=components, on_packet=self._on_packet
+        )
+
+    async def stream_frames_stop(self):
+        """ Stop streaming frames, also when called while reconnecting """
+        self._stream = None
+        return await self._current().stream_frames_stop()
+
+    def _current(self):
+        if self._connection is None:
+            raise QRTCommandException("Not connected!")
+        return self._connection
+
+    async def _connect(self):
+        return await connect(
+            self.host,
+            port=self.port,
+            version=self.version,
+            on_event=self.on_event,
+            on_disconnect=self._on_disconnect,
+            timeout=self.timeout,
+            loop=self.loop,
+        )
+
+    def _on_packet(self, packet):
+        # Frames in flight can arrive after the stream was stopped
+        stream = self._stream
+        if stream is None:
+            return
+
+        if self._resumed:
+            self._resumed = False
+            if self._last_framenumber is not None and self.on_gap is not None:
+                last = self._last_framenumber
+                missing = (
+                    packet.framenumber - last - 1 if packet.framenumber > last else None
+                )
+                self.on_gap(QRTStreamGap(last, packet.framenumber, missing))
+
+        self._last_framenumber = packet.framenumber
+        stream[2](packet)
+
+    def _on_disconnect(self, exception):
+        self._connection = None
+        if self.on_disconnect is not None:
+            self.on_disconnect(exception)
+
+        if self._closing or self._reconnect_task is not None:
+            return
+
+        LOG.warning("Connection to QTM lost, reconnecting")
+        loop = self.loop or asyncio.get_event_loop()
+        self._reconnect_task = loop.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        try:
+            await self._reconnect_loop()
+        finally:
+            # Whatever ended it, a later disconnect can start a new reconnect
+            self._reconnect_task = None
+
+    async def _reconnect_loop(self):
+        delay = self.backoff
+        while not self._closing:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+            connection = None
+            try:
+                connection = await self._connect()
+                if connection is None:
+                    continue
+                if self._password is not None:
+                    await connection.take_control(self._password)
+                if self._stream is not None:
+                    frames, components, _ = self._stream
+                    self._resumed = True
+                    await connection.stream_frames(
+                        frames=frames, components=components, on_packet=self._on_packet
+                    )
+            except Exception as exception:  # pylint: disable=W0703
+                LOG.error("Failed to restore connection state: %r", exception)
+                if connection is not None:
+                    self._discard(connection)
+                continue
+
+            self._connection = connection
+            self.reconnect_count += 1
+            LOG.info("Reconnected to QTM")
+            if self.on_reconnect is not None:
+                self.on_reconnect()
+            return
+
+    @staticmethod
+    def _discard(connection):
+        # Closing triggers _on_disconnect, which must not start another reconnect
+        connection._protocol.on_disconnect = None  # pylint: disable=W0212
+        if connection.has_transport():
+            connection.disconnect()
@@ -0,0 +1,353 @@
+""" Relay serving one upstream QTM connection to many RT protocol clients """
+
+import asyncio
+import logging
+
+from qtm_rt.packet import (
+    QRTPacketType,
+    QRTComponentType,
+    QRTEvent,
+    RTheader,
+    RTDataQRTPacket,
+    RTComponentData,
+)
+from qtm_rt.protocol import QRTCommandException
+from qtm_rt.receiver import Receiver
+
+LOG = logging.getLogger("qtm_rt")
+
+COMPONENT_TYPES = {
+    "2d": QRTComponentType.Component2d,
+    "2dlin": QRTComponentType.Component2dLin,
+    "3d": QRTComponentType.Component3d,
+    "3dres": QRTComponentType.Component3dRes,
+    "3dnolabels": QRTComponentType.Component3dNoLabels,
+    "3dnolabelsres": QRTComponentType.Component3dNoLabelsRes,
+    "analog": QRTComponentType.ComponentAnalog,
+    "analogsingle": QRTComponentType.ComponentAnalogSingle,
+    "force": QRTComponentType.ComponentForce,
+    "forcesingle": QRTComponentType.ComponentForceSingle,
+    "6d": QRTComponentType.Component6d,
+    "6dres": QRTComponentType.Component6dRes,
+    "6deuler": QRTComponentType.Component6dEuler,
+    "6deulerres": QRTComponentType.Component6dEulerRes,
+    "gazevector": QRTComponentType.ComponentGazeVector,
+    "eyetracker": QRTComponentType.ComponentEyeTracker,
+    "image": QRTComponentType.ComponentImage,
+    "timecode": QRTComponentType.ComponentTimecode,
+    "skeleton": QRTComponentType.ComponentSkeleton,
+    "skeleton:global": QRTComponentType.ComponentSkeleton,
+}
+
+
+def _packet(type_, payload):
+    return RTheader.pack(RTheader.size + len(payload), type_.value) + payload
+
+
+def _string_packet(type_, text):
+    if isinstance(text, str):
+        text = text.encode()
+    return _packet(type_, text + b"\0")
+
+
+def filter_components(data, components):
+    """Build the payload of a data packet containing only some of its components.
+
+    :param data: Payload of a data packet, as in :attr:`qtm_rt.QRTPacket.data`.
+    :param components: A set of :class:`qtm_rt.packet.QRTComponentType` to keep.
+    """
+    timestamp, framenumber, component_count = RTDataQRTPacket.unpack_from(data, 0)
+
+    kept = []
+    position = RTDataQRTPacket.size
+    for _ in range(component_count):
+        c_size, c_type = RTComponentData.unpack_from(data, position)
+        if QRTComponentType(c_type) in components:
+            kept.append(data[position : position + c_size])
+        position += c_size
+
+    return RTDataQRTPacket.pack(timestamp, framenumber, len(kept)) + b"".join(kept)
+
+
+class _RelayClient(object):
+    """ One downstream client of a QRTRelay """
+
+    def __init__(self, relay):
+        self.relay = relay
+        self.transport = None
+        self.components = None
+        self.divisor = 1
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+        self._paused = False
+        self._commands = asyncio.Queue()
+        self._worker = None
+        self._receiver = Receiver(
+            {
+                QRTPacketType.PacketCommand: self._commands.put_nowait,
+                QRTPacketType.PacketXML: lambda _: self._commands.put_nowait(None),
+            }
+        )
+
+    # asyncio.Protocol interface
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.set_write_buffer_limits(high=self.relay.max_buffer)
+        self._worker = asyncio.ensure_future(self._process_commands())
+        self.relay.workers.add(self._worker)
+        self._worker.add_done_callback(self.relay.workers.discard)
+        self.relay.clients.append(self)
+        self.send(_string_packet(QRTPacketType.PacketCommand, "QTM RT Interface connected"))
+        LOG.info("Relay client connected: %s", transport.get_extra_info("peername"))
+
+    def data_received(self, data):
+        self._receiver.data_received(data)
+
+    def eof_received(self):
+        return False
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+
+    def connection_lost(self, _):
+        self.relay.clients.remove(self)
+        self._worker.cancel()
+        self.transport = None
+        LOG.info("Relay client disconnected")
+
+    # Relay interface
+
+    def send(self, data):
+        if self.transport is not None:
+            self.transport.write(data)
+
+    def send_frame(self, framenumber, frames):
+        """ Send a frame unless the client is behind, frames caches filtered packets """
+        if framenumber % self.divisor:
+            return
+        if self._paused:
+            self.frames_dropped += 1
+            return
+
+        data = frames.get(self.components)
+        if data is None:
+            data = frames[self.components] = _packet(
+                QRTPacketType.PacketData,
+                filter_components(frames[None], self.components),
+            )
+        self.send(data)
+        self.frames_sent += 1
+
+    async def _process_commands(self):
+        while True:
+            command = await self._commands.get()
+            if command is None:
+                self._error("XML packets are not supported by the relay")
+                continue
+
+            try:
+                await self._process_command(command.decode(errors="replace"))
+            except QRTCommandException as exception:
+                self._error(exception.value)
+            except Exception as exception:  # pylint: disable=W0703
+                # Keep serving the client whatever went wrong upstream
+                LOG.warning("Relay command %s failed: %r", command, exception)
+                self._error("Relay failed: %s" % (str(exception) or type(exception).__name__))
+
+    async def _process_command(self, command):
+        LOG.debug("Relay R: %s", command)
+        words = command.split()
+        name = words[0].lower() if words else ""
+        relay = self.relay
+
+        if name == "version" and len(words) == 2:
+            self.send(
+                _string_packet(QRTPacketType.PacketCommand, "Version set to %s" % words[1])
+            )
+        elif name == "byteorder":
+            self.send(
+                _string_packet(QRTPacketType.PacketCommand, "Byte order is little endian")
+            )
+        elif name == "qtmversion":
+            response = await relay.cached(command.lower())
+            self.send(_string_packet(QRTPacketType.PacketCommand, response))
+        elif name == "getparameters":
+            response = await relay.cached(command.lower())
+            self.send(_string_packet(QRTPacketType.PacketXML, response))
+        elif name == "getstate":
+            if relay.last_event is not None:
+                self.send(
+                    _packet(QRTPacketType.PacketEvent, bytes([relay.last_event.value]))
+                )
+        elif name == "streamframes" and len(words) == 2 and words[1].lower() == "stop":
+            self.components = None
+        elif name == "streamframes" and len(words) >= 3:
+            self.divisor = _parse_divisor(words[1])
+            self.components = _parse_components(words[2:], relay.components)
+            self._send_current_frame(self.components)
+        elif name == "getcurrentframe" and len(words) >= 2:
+            self._send_current_frame(_parse_components(words[1:], relay.components))
+        else:
+            raise QRTCommandException("Command not supported by relay: %s" % command)
+
+    def _send_current_frame(self, components):
+        relay = self.relay
+        if relay.last_frame is None:
+            self.send(_packet(QRTPacketType.PacketNoMoreData, b""))
+        else:
+            self.send(
+                _packet(
+                    QRTPacketType.PacketData,
+                    filter_components(relay.last_frame, components),
+                )
+            )
+
+    def _error(self, message):
+        self.send(_string_packet(QRTPacketType.PacketError, str(message)))
+
+
+def _parse_divisor(frames):
+    frames = frames.lower()
+    if frames == "allframes":
+        return 1
+    if frames.startswith("frequencydivisor:"):
+        try:
+            divisor = int(frames.split(":", 1)[1])
+        except ValueError:
+            divisor = 0
+        if divisor > 0:
+            return divisor
+    raise QRTCommandException("Relay only supports allframes and frequencydivisor:n")
+
+
+def _parse_components(names, available):
+    components = set()
+    for name in names:
+        component = COMPONENT_TYPES.get(name.lower())
+        if component is None or component not in available:
+            raise QRTCommandException("Component %s is not relayed" % name)
+        components.add(component)
+    return frozenset(components)
+
+
+class QRTRelay(object):
+    """Serve one upstream connection to QTM to many local RT protocol clients.
+
+    The relay streams the union of the components its clients may ask for from
+    QTM once, and fans every frame out to the clients that are streaming, each
+    getting only the components it requested. A client that can not keep up with
+    the stream gets frames dropped instead of growing the relay's buffers.
+    Parameters and the QTM version are fetched from QTM once and served from a cache.
+
+    Clients connect with any RT protocol client, including :func:`qtm_rt.connect`.
+    Supported commands are version, byteorder, qtmversion, getparameters, getstate,
+    streamframes (allframes or frequencydivisor:n) and getcurrentframe, everything
+    else is answered with an error::
+
+        connection = await qtm_rt.connect("192.168.0.10")
+        relay = QRTRelay(connection, components=["3d", "6d", "analog"])
+        await relay.start(port=22223)
+
+    :param connection: A connected :class:`qtm_rt.QRTConnection`.
+    :param components: Components to stream from QTM.
+    :param frames: Which frames to stream from QTM, see
+        :func:`~qtm_rt.QRTConnection.stream_frames`.
+    :param max_buffer: Bytes that may be waiting to be sent to a client before
+        frames to it are dropped.
+    """
+
+    def __init__(self, connection, components, frames="allframes", max_buffer=1 << 20):
+        self.connection = connection
+        self.stream_components = list(components)
+        self.components = set(COMPONENT_TYPES[name.lower()] for name in components)
+        self.frames = frames
+        self.max_buffer = max_buffer
+
+        self.clients = []
+        self.workers = set()
+        self.last_frame = None
+        self.last_event = None
+
+        self._cache = {}
+        self._server = None
+        self._on_event = None
+
+    async def start(self, host="127.0.0.1", port=22223):
+        """ Start streaming from QTM and accept clients on host and port """
+        protocol = self.connection._protocol  # pylint: disable=W0212
+        self._on_event = protocol.on_event
+        protocol.on_event = self._event
+
+        await self.connection.stream_frames(
+            frames=self.frames, components=self.stream_components, on_packet=self._frame
+        )
+
+        loop = asyncio.get_event_loop()
+        self._server = await loop.create_server(lambda: _RelayClient(self), host, port)
+        LOG.info("Relay listening on %s:%s", host, port)
+
+    async def stop(self):
+        """ Stop accepting clients, disconnect all clients and stop streaming """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        for client in list(self.clients):
+            client.transport.close()
+        for worker in list(self.workers):
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+        self.connection._protocol.on_event = self._on_event  # pylint: disable=W0212
+        if self.connection.has_transport():
+            await self.connection.stream_frames_stop()
+
+    @property
+    def sockets(self):
+        """ The listening sockets """
+        return self._server.sockets if self._server is not None else []
+
+    async def cached(self, command):
+        """ Get the response to command from QTM, sending it only the first time """
+        future = self._cache.get(command)
+        if future is None:
+            future = self._cache[command] = asyncio.ensure_future(
+                self.connection.pipeline([command])
+            )
+        try:
+            response, = await asyncio.shield(future)
+        except Exception:
+            # Ask QTM again next time instead of repeating the failure
+            if self._cache.get(command) is future:
+                del self._cache[command]
+            raise
+        return response
+
+    def clear_cache(self):
+        """ Drop cached responses, for example after the settings in QTM changed """
+        self._cache = {}
+
+    def _frame(self, packet):
+        self.last_frame = packet.data
+        frames = {None: packet.data}
+        for client in self.clients:
+            if client.components is not None:
+                client.send_frame(packet.framenumber, frames)
+
+    def _event(self, event):
+        self.last_event = event
+        if event == QRTEvent.EventCameraSettingsChanged:
+            self.clear_cache()
+
+        data = _packet(QRTPacketType.PacketEvent, bytes([event.value]))
+        for client in self.clients:
+            client.send(data)
+
+        if self._on_event is not None:
+            self._on_event(event)
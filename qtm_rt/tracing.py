@@ -0,0 +1,205 @@
+""" Timing spans for the stages of the receive pipeline """
+
+import abc
+import collections
+import json
+import os
+import threading
+import time
+
+FRAMING = "framing"
+PARSE = "parse"
+DISPATCH = "dispatch"
+CALLBACK = "callback"
+
+_TRACED_RECEIVER = ("data_received", "_parse", "_dispatch")
+
+
+class Tracer(abc.ABC):
+    """Receives a span for every stage of the receive pipeline that has been traced.
+
+    The stages, which nest in this order, are:
+
+    - ``framing``: :func:`qtm_rt.Receiver.data_received` splitting a read into packets.
+    - ``parse``: parsing a packet, for data packets the headers of the components
+      in :class:`qtm_rt.QRTPacket`.
+    - ``dispatch``: the handler of the packet type.
+    - ``callback``: the on_packet callback given to
+      :func:`~qtm_rt.QRTConnection.stream_frames`.
+
+    Every stage runs in a wrapper function named after it, so stacks sampled by a
+    profiler such as py-spy show which stage the time is spent in.
+    """
+
+    @abc.abstractmethod
+    def span(self, stage, start, end, args):
+        """Called when a stage has finished.
+
+        :param stage: Name of the stage.
+        :param start: :func:`time.perf_counter` when the stage started.
+        :param end: :func:`time.perf_counter` when the stage ended.
+        :param args: A dict describing what was processed.
+        """
+
+
+class ChromeTrace(Tracer):
+    """Records spans for the Chrome trace viewer (chrome://tracing or Perfetto).
+
+    Only the latest ``max_events`` spans are kept::
+
+        trace = ChromeTrace()
+        connection.enable_tracing(trace)
+        ...
+        trace.write("qtm_rt.trace.json")
+    """
+
+    def __init__(self, max_events=1000000):
+        self.spans = collections.deque(maxlen=max_events)
+        self._origin = time.perf_counter()
+
+    def span(self, stage, start, end, args):
+        self.spans.append((stage, start, end, threading.get_ident(), args))
+
+    def clear(self):
+        """ Remove the recorded spans """
+        self.spans.clear()
+
+    def events(self):
+        """ The recorded spans as Chrome trace events """
+        pid = os.getpid()
+        return [
+            {
+                "name": stage,
+                "cat": "qtm_rt",
+                "ph": "X",
+                "ts": (start - self._origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+            for stage, start, end, tid, args in self.spans
+        ]
+
+    def write(self, output):
+        """Write the trace as JSON.
+
+        :param output: Path of the file to create, or a writable text file object.
+        """
+        trace = {"traceEvents": self.events(), "displayTimeUnit": "ms"}
+        if hasattr(output, "write"):
+            json.dump(trace, output)
+        else:
+            with open(output, "w") as trace_file:
+                json.dump(trace, trace_file)
+
+
+def trace_receiver(receiver, tracer):
+    """Trace the framing, parse and dispatch stages of a :class:`qtm_rt.Receiver`.
+
+    The stages are traced by replacing methods on the instance, so a receiver that
+    is not traced runs exactly as before.
+    """
+    untrace_receiver(receiver)
+
+    cls = type(receiver)
+    data_received = cls.data_received.__get__(receiver, cls)
+    parse = cls._parse  # pylint: disable=W0212
+    dispatch = cls._dispatch.__get__(receiver, cls)  # pylint: disable=W0212
+    clock = time.perf_counter
+    span = tracer.span
+
+    def framing(data):
+        start = clock()
+        try:
+            data_received(data)
+        finally:
+            span(FRAMING, start, clock(), {"bytes": len(data)})
+
+    def parsing(data, type_):
+        start = clock()
+        result = parse(data, type_)
+        span(PARSE, start, clock(), {"type": result[0].name, "bytes": len(data)})
+        return result
+
+    def dispatching(type_, data):
+        start = clock()
+        try:
+            dispatch(type_, data)
+        finally:
+            span(DISPATCH, start, clock(), {"type": type_.name})
+
+    receiver.data_received = framing
+    receiver._parse = parsing  # pylint: disable=W0212
+    receiver._dispatch = dispatching  # pylint: disable=W0212
+    receiver._traced = True  # pylint: disable=W0212
+    receiver._update_fast_path()  # pylint: disable=W0212
+
+
+def untrace_receiver(receiver):
+    """ Stop tracing a receiver """
+    for name in _TRACED_RECEIVER:
+        receiver.__dict__.pop(name, None)
+    receiver._traced = False  # pylint: disable=W0212
+    receiver._update_fast_path()  # pylint: disable=W0212
+
+
+def trace_protocol(protocol, tracer):
+    """Trace all stages of a :class:`qtm_rt.protocol.QTMProtocol`, including the
+    on_packet callback.
+    """
+    untrace_protocol(protocol)
+    trace_receiver(protocol._receiver, tracer)  # pylint: disable=W0212
+
+    clock = time.perf_counter
+    span = tracer.span
+
+    def traced(on_packet):
+        if on_packet is None:
+            return None
+
+        def callback(packet):
+            start = clock()
+            try:
+                # Through the attribute, so that wrappers inside can be removed
+                callback.__wrapped__(packet)
+            finally:
+                span(CALLBACK, start, clock(), {"framenumber": packet.framenumber})
+
+        callback.__wrapped__ = on_packet
+        callback.tracer = tracer
+        return callback
+
+    set_on_packet = type(protocol).set_on_packet.__get__(protocol, type(protocol))
+    protocol.set_on_packet = lambda on_packet: set_on_packet(traced(on_packet))
+    protocol.on_packet = traced(protocol.on_packet)
+
+
+def untrace_protocol(protocol):
+    """ Stop tracing a protocol """
+    untrace_receiver(protocol._receiver)  # pylint: disable=W0212
+    if protocol.__dict__.pop("set_on_packet", None) is not None:
+        protocol.on_packet = remove_wrapper(
+            protocol.on_packet, lambda wrapper: hasattr(wrapper, "tracer")
+        )
+
+
+def remove_wrapper(callback, is_wrapper):
+    """Remove a wrapper from a chain of on_packet wrappers.
+
+    The chain is followed through the ``__wrapped__`` attribute of the wrappers. The
+    wrappers added by qtm_rt call the function in their ``__wrapped__`` attribute, so
+    a wrapper inside them can be removed by changing it.
+
+    :param is_wrapper: Function returning True for the wrapper to remove.
+    :rtype: callback without the first wrapper that is_wrapper returns True for
+    """
+    outer, current = None, callback
+    while current is not None:
+        if is_wrapper(current):
+            if outer is None:
+                return current.__wrapped__
+            outer.__wrapped__ = current.__wrapped__
+            return callback
+        outer, current = current, getattr(current, "__wrapped__", None)
+    return callback
@@ -0,0 +1,252 @@
+""" Trajectories of unlabelled markers by frame to frame association. Requires numpy. """
+
+from collections import namedtuple
+import itertools
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.tracking requires numpy") from exception
+
+from qtm_rt import arrays
+
+QRTTrackedFrame = namedtuple("QRTTrackedFrame", "packet positions ids")
+
+_METHODS = ("greedy", "hungarian")
+_OFFSETS = numpy.array(list(itertools.product((0, 1), repeat=3)), dtype=numpy.int64)
+_HASH = numpy.array([73856093, 19349663, 83492791], dtype=numpy.int64)
+
+
+def _hash(cells):
+    # Different cells can get the same key, which only adds candidates
+    return numpy.bitwise_xor.reduce(cells * _HASH, axis=-1)
+
+
+def neighbours(previous, current, radius):
+    """All pairs of points closer than radius, found through a grid hash.
+
+    :param previous: A (points, 3) array.
+    :param current: A (points, 3) array.
+    :rtype: Arrays of previous indices, current indices and distances of the pairs
+    """
+    empty = numpy.zeros(0, dtype=numpy.int64)
+    if len(previous) == 0 or len(current) == 0:
+        return empty, empty, numpy.zeros(0)
+
+    # With cells twice the radius, the cube around a point overlaps at most 8 cells
+    size = 2.0 * radius
+    previous_keys = _hash(numpy.floor(previous / size).astype(numpy.int64))
+    order = numpy.argsort(previous_keys)
+    sorted_keys = previous_keys[order]
+
+    corner = numpy.floor((current - radius) / size).astype(numpy.int64)
+    keys = _hash(corner[:, None, :] + _OFFSETS).ravel()
+    # Sorted keys make the binary searches faster
+    key_order = numpy.argsort(keys)
+    keys = keys[key_order]
+    points = key_order // len(_OFFSETS)
+    low = numpy.searchsorted(sorted_keys, keys, "left")
+    counts = numpy.searchsorted(sorted_keys, keys, "right") - low
+
+    total = counts.sum()
+    points = numpy.repeat(points, counts)
+    starts = numpy.repeat(low - (numpy.cumsum(counts) - counts), counts)
+    tracks = order[starts + numpy.arange(total)]
+
+    # Remove pairs found twice through colliding keys
+    pairs = numpy.unique(tracks * len(current) + points)
+    tracks, points = numpy.divmod(pairs, len(current))
+
+    distances = numpy.linalg.norm(previous[tracks] - current[points], axis=-1)
+    close = distances <= radius
+    return tracks[close], points[close], distances[close]
+
+
+def assign_greedy(previous, current, distances):
+    """Match pairs in order of increasing distance, every index at most once.
+
+    Vectorized as rounds of accepting the pairs that are the nearest for both their
+    indices, which gives the same matching as taking one pair at a time.
+
+    :rtype: Arrays of matched previous and current indices
+    """
+    order = numpy.argsort(distances, kind="stable")
+    previous, current = previous[order], current[order]
+    matched_previous, matched_current = [], []
+    used_previous = numpy.zeros(previous.max() + 1 if len(previous) else 0, dtype=bool)
+    used_current = numpy.zeros(current.max() + 1 if len(current) else 0, dtype=bool)
+
+    while len(previous):
+        nearest_previous = numpy.zeros(len(previous), dtype=bool)
+        nearest_previous[numpy.unique(previous, return_index=True)[1]] = True
+        nearest_current = numpy.zeros(len(current), dtype=bool)
+        nearest_current[numpy.unique(current, return_index=True)[1]] = True
+        mutual = nearest_previous & nearest_current
+
+        matched_previous.append(previous[mutual])
+        matched_current.append(current[mutual])
+        used_previous[previous[mutual]] = True
+        used_current[current[mutual]] = True
+        keep = ~(used_previous[previous] | used_current[current])
+        previous, current = previous[keep], current[keep]
+
+    if not matched_previous:
+        return previous, current
+    return numpy.concatenate(matched_previous), numpy.concatenate(matched_current)
+
+
+def _scipy():
+    try:
+        from scipy.optimize import linear_sum_assignment
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError as exception:
+        raise ImportError("Hungarian assignment requires scipy") from exception
+    return linear_sum_assignment, coo_matrix, connected_components
+
+
+def assign_hungarian(previous, current, distances):
+    """Match pairs with the least total distance, every index at most once. Requires scipy.
+
+    Each group of pairs that share indices is solved on its own, so the cost grows
+    with the size of the ambiguous groups instead of the number of points.
+
+    :rtype: Arrays of matched previous and current indices
+    """
+    linear_sum_assignment, coo_matrix, connected_components = _scipy()
+    if len(previous) == 0:
+        return previous, current
+
+    offset = previous.max() + 1
+    size = offset + current.max() + 1
+    graph = coo_matrix(
+        (numpy.ones(len(previous)), (previous, current + offset)), shape=(size, size)
+    )
+    _, labels = connected_components(graph, directed=False)
+    groups = labels[previous]
+    sizes = numpy.bincount(groups)
+
+    single = sizes[groups] == 1
+    matched_previous, matched_current = [previous[single]], [current[single]]
+
+    shared = numpy.flatnonzero(~single)
+    shared = shared[numpy.argsort(groups[shared], kind="stable")]
+    boundaries = numpy.flatnonzero(numpy.diff(groups[shared])) + 1
+    for pairs in numpy.split(shared, boundaries) if len(shared) else []:
+        rows, row_index = numpy.unique(previous[pairs], return_inverse=True)
+        columns, column_index = numpy.unique(current[pairs], return_inverse=True)
+        missing = distances[pairs].max() * len(pairs) + 1
+        cost = numpy.full((len(rows), len(columns)), missing)
+        cost[row_index, column_index] = distances[pairs]
+        row, column = linear_sum_assignment(cost)
+        real = cost[row, column] < missing
+        matched_previous.append(rows[row[real]])
+        matched_current.append(columns[column[real]])
+
+    return numpy.concatenate(matched_previous), numpy.concatenate(matched_current)
+
+
+class MarkerTracker(object):
+    """Gives unlabelled markers ids that are kept from frame to frame.
+
+    Every track is predicted to the next frame with its latest movement, and matched
+    to a marker within ``max_distance`` of the prediction. Candidate pairs are found
+    through a grid hash of the predictions, so the cost grows with the number of
+    markers rather than its square, and matched either greedily, nearest first, or
+    with the least total distance (Hungarian, requires scipy)::
+
+        tracker = MarkerTracker(max_distance=20)
+
+        def on_frame(frame):
+            print(frame.packet.framenumber, frame.ids)
+
+        await connection.stream_frames(
+            components=["3dnolabels"], on_packet=tracker.wrap(on_frame)
+        )
+
+    :param max_distance: Longest movement between frames, in mm.
+    :param method: "greedy" or "hungarian".
+    :param max_missing: Number of frames a track is kept without a marker.
+    """
+
+    def __init__(self, max_distance, method="greedy", max_missing=0):
+        if method not in _METHODS:
+            raise ValueError("method must be one of %s" % ", ".join(_METHODS))
+        self.max_distance = max_distance
+        self.method = method
+        self.max_missing = max_missing
+        self._assign = assign_greedy if method == "greedy" else assign_hungarian
+        if method == "hungarian":
+            _scipy()  # Fail now rather than on the first frame
+        self.reset()
+
+    def reset(self):
+        """ Forget all tracks, ids start from 0 again """
+        self.next_id = 0
+        #: Id, position, movement in the latest frame and number of missed frames
+        #: of every track
+        self.ids = numpy.zeros(0, dtype=numpy.int64)
+        self.positions = numpy.zeros((0, 3))
+        self.velocities = numpy.zeros((0, 3))
+        self.missing = numpy.zeros(0, dtype=numpy.int64)
+
+    def add_packet(self, packet):
+        """Track the unlabelled markers of a packet.
+
+        :rtype: A :class:`QRTTrackedFrame`, None if the packet has no unlabelled markers
+        """
+        markers = arrays.markers_3d_no_label(packet)
+        if markers is None:
+            markers = arrays.markers_3d_no_label_residual(packet)
+        if markers is None:
+            return None
+        return QRTTrackedFrame(packet, markers[0], self.update(markers[0]))
+
+    def update(self, positions):
+        """Match the markers of a new frame to the tracks.
+
+        :param positions: A (markers, 3) array.
+        :rtype: A (markers,) array of track ids, -1 for markers with NaN positions
+        """
+        positions = numpy.asarray(positions, dtype=float)
+        ids = numpy.full(len(positions), -1, dtype=numpy.int64)
+        valid = numpy.flatnonzero(~numpy.isnan(positions).any(axis=-1))
+
+        predicted = self.positions + self.velocities
+        tracks, points, distances = neighbours(predicted, positions[valid], self.max_distance)
+        tracks, points = self._assign(tracks, points, distances)
+        points = valid[points]
+
+        ids[points] = self.ids[tracks]
+        self.velocities[tracks] = positions[points] - self.positions[tracks]
+        self.positions = predicted
+        self.positions[tracks] = positions[points]
+        self.missing += 1
+        self.missing[tracks] = 0
+
+        kept = self.missing <= self.max_missing
+        new = valid[ids[valid] < 0]
+        new_ids = numpy.arange(self.next_id, self.next_id + len(new))
+        self.next_id += len(new)
+        ids[new] = new_ids
+
+        self.ids = numpy.concatenate([self.ids[kept], new_ids])
+        self.positions = numpy.concatenate([self.positions[kept], positions[new]])
+        self.velocities = numpy.concatenate(
+            [self.velocities[kept], numpy.zeros((len(new), 3))]
+        )
+        self.missing = numpy.concatenate(
+            [self.missing[kept], numpy.zeros(len(new), dtype=numpy.int64)]
+        )
+        return ids
+
+    def wrap(self, on_packet):
+        """ Wrap a callback taking a :class:`QRTTrackedFrame` as an on_packet callback """
+
+        def tracked(packet):
+            frame = self.add_packet(packet)
+            if frame is not None:
+                on_packet(frame)
+
+        tracked.__wrapped__ = on_packet
+        return tracked
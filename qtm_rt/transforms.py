@@ -0,0 +1,305 @@
+""" Batch rotation conversions for 6DOF and skeleton data. Requires numpy.
+
+Every function takes arrays with any number of leading dimensions, one rotation per
+row, so all bodies or segments of a frame, or of many frames, are converted at once.
+Rows that are NaN, as QTM sends for bodies that are not tracked, give NaN results.
+
+Conventions follow QTM:
+
+- Rotation matrices are indexed [row, column] and rotate from the local coordinate
+  system of the body to the global one. Use :func:`qtm_rt.arrays.rotation_matrices`
+  or :func:`qtm_rt.arrays.bodies_6d` for the matrices in :func:`qtm_rt.QRTPacket.get_6d`.
+- Quaternions are in x, y, z, w order, as in :func:`qtm_rt.QRTPacket.get_skeletons`.
+- Angles are in degrees unless ``degrees=False``.
+"""
+
+try:
+    import numpy
+except ImportError as exception:
+    raise ImportError("qtm_rt.transforms requires numpy") from exception
+
+#: The default euler angle definition of QTM: roll, pitch and yaw about the
+#: rotated x, y and z axes.
+QUALISYS_STANDARD = "xyz"
+
+_AXES = {"x": 0, "y": 1, "z": 2}
+_EPSILON = 1e-7
+
+
+def _sequence(sequence):
+    try:
+        axes = [_AXES[axis] for axis in sequence.lower()]
+    except KeyError:
+        axes = []
+    if len(axes) != 3 or axes[0] == axes[1] or axes[1] == axes[2]:
+        raise ValueError("%r is not a valid euler angle sequence" % sequence)
+    return axes
+
+
+def _normalize(vectors):
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        return vectors / numpy.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def matrix_to_quaternion(matrices):
+    """Convert rotation matrices to unit quaternions.
+
+    :param matrices: A (..., 3, 3) array.
+    :rtype: A (..., 4) array of quaternions in x, y, z, w order, with w >= 0
+    """
+    matrices = numpy.asarray(matrices, dtype=float)
+    diagonal = numpy.diagonal(matrices, axis1=-2, axis2=-1)
+    trace = diagonal.sum(axis=-1)
+    # The largest of w and the diagonal gives the best conditioned formula
+    choice = numpy.argmax(numpy.concatenate([diagonal, trace[..., None]], axis=-1), axis=-1)
+
+    quaternions = numpy.empty(matrices.shape[:-2] + (4,))
+    m = matrices
+    use = choice == 3
+    quaternions[use, 0] = m[use, 2, 1] - m[use, 1, 2]
+    quaternions[use, 1] = m[use, 0, 2] - m[use, 2, 0]
+    quaternions[use, 2] = m[use, 1, 0] - m[use, 0, 1]
+    quaternions[use, 3] = 1 + trace[use]
+    for i in range(3):
+        j, k = (i + 1) % 3, (i + 2) % 3
+        use = choice == i
+        quaternions[use, i] = 1 - trace[use] + 2 * m[use, i, i]
+        quaternions[use, j] = m[use, j, i] + m[use, i, j]
+        quaternions[use, k] = m[use, k, i] + m[use, i, k]
+        quaternions[use, 3] = m[use, k, j] - m[use, j, k]
+
+    quaternions = _normalize(quaternions)
+    return numpy.where(quaternions[..., 3:] < 0, -quaternions, quaternions)
+
+
+def quaternion_to_matrix(quaternions):
+    """Convert quaternions, which are normalized first, to rotation matrices.
+
+    :param quaternions: A (..., 4) array in x, y, z, w order.
+    :rtype: A (..., 3, 3) array
+    """
+    x, y, z, w = numpy.moveaxis(_normalize(numpy.asarray(quaternions, dtype=float)), -1, 0)
+    xx, yy, zz = x * x, y * y, z * z
+    xy, xz, yz = x * y, x * z, y * z
+    wx, wy, wz = w * x, w * y, w * z
+    return numpy.stack(
+        [
+            numpy.stack([1 - 2 * (yy + zz), 2 * (xy - wz), 2 * (xz + wy)], axis=-1),
+            numpy.stack([2 * (xy + wz), 1 - 2 * (xx + zz), 2 * (yz - wx)], axis=-1),
+            numpy.stack([2 * (xz - wy), 2 * (yz + wx), 1 - 2 * (xx + yy)], axis=-1),
+        ],
+        axis=-2,
+    )
+
+
+def quaternion_to_euler(quaternions, sequence=QUALISYS_STANDARD, local=True, degrees=True):
+    """Convert quaternions to euler angles.
+
+    All definitions QTM can be set to use are supported: any sequence of three axes,
+    such as "xyz", "zyx" or "zxz", about the rotated (local) or the global axes. The
+    second angle is in [-90, 90] when the axes are different and in [0, 180] when the
+    first and last axes are the same, the others are in [-180, 180]. In gimbal lock
+    the third angle is 0.
+
+    :param quaternions: A (..., 4) array in x, y, z, w order.
+    :param sequence: The axes of the first, second and third rotation.
+    :param local: True for rotations about the rotated axes, False for the global axes.
+    :rtype: A (..., 3) array with the first, second and third angle
+    """
+    i, j, k = _sequence(sequence)
+    if local:
+        # A sequence about rotated axes is the reversed sequence about global axes
+        i, k = k, i
+    quaternions = numpy.asarray(quaternions, dtype=float)
+
+    # Bernardes & Viollet, "Quaternion to Euler angles conversion: A direct, general
+    # and computationally efficient method", PLoS ONE 17(11), 2022
+    symmetric = i == k
+    if symmetric:
+        k = 3 - i - j
+    sign = (i - j) * (j - k) * (k - i) // 2
+    w, b, c, d = (
+        quaternions[..., 3],
+        quaternions[..., i],
+        quaternions[..., j],
+        quaternions[..., k] * sign,
+    )
+    if symmetric:
+        a = w
+    else:
+        a, b, c, d = w - c, b + d, c + w, d - b
+
+    second = 2 * numpy.arctan2(numpy.hypot(c, d), numpy.hypot(a, b))
+    half_sum = numpy.arctan2(b, a)
+    half_difference = numpy.arctan2(d, c)
+    first = half_sum - half_difference
+    third = half_sum + half_difference
+
+    with numpy.errstate(invalid="ignore"):
+        at_zero = numpy.abs(second) <= _EPSILON
+        at_pi = numpy.abs(second - numpy.pi) <= _EPSILON
+    # In gimbal lock only the sum or difference of the first and third angles is
+    # known, the angle that ends up last is set to 0
+    if local:
+        first = numpy.where(at_zero | at_pi, 0.0, first)
+        third = numpy.where(at_zero, 2 * half_sum, third)
+        third = numpy.where(at_pi, 2 * half_difference, third)
+    else:
+        third = numpy.where(at_zero | at_pi, 0.0, third)
+        first = numpy.where(at_zero, 2 * half_sum, first)
+        first = numpy.where(at_pi, -2 * half_difference, first)
+
+    if not symmetric:
+        third = third * sign
+        second = second - numpy.pi / 2
+    if local:
+        first, third = third, first
+
+    first = (first + numpy.pi) % (2 * numpy.pi) - numpy.pi
+    third = (third + numpy.pi) % (2 * numpy.pi) - numpy.pi
+    angles = numpy.stack([first, second, third], axis=-1)
+    return numpy.degrees(angles) if degrees else angles
+
+
+def matrix_to_euler(matrices, sequence=QUALISYS_STANDARD, local=True, degrees=True):
+    """Convert rotation matrices to euler angles, see :func:`quaternion_to_euler`.
+
+    :param matrices: A (..., 3, 3) array.
+    :rtype: A (..., 3) array with the first, second and third angle
+    """
+    return quaternion_to_euler(matrix_to_quaternion(matrices), sequence, local, degrees)
+
+
+def _axis_rotation(axis, angles):
+    cos, sin = numpy.cos(angles), numpy.sin(angles)
+    zero, one = numpy.zeros_like(angles), numpy.ones_like(angles)
+    if axis == 0:
+        rows = [[one, zero, zero], [zero, cos, -sin], [zero, sin, cos]]
+    elif axis == 1:
+        rows = [[cos, zero, sin], [zero, one, zero], [-sin, zero, cos]]
+    else:
+        rows = [[cos, -sin, zero], [sin, cos, zero], [zero, zero, one]]
+    return numpy.stack([numpy.stack(row, axis=-1) for row in rows], axis=-2)
+
+
+def euler_to_matrix(angles, sequence=QUALISYS_STANDARD, local=True, degrees=True):
+    """Convert euler angles to rotation matrices, see :func:`quaternion_to_euler`.
+
+    :param angles: A (..., 3) array with the first, second and third angle.
+    :rtype: A (..., 3, 3) array
+    """
+    axes = _sequence(sequence)
+    angles = numpy.asarray(angles, dtype=float)
+    if degrees:
+        angles = numpy.radians(angles)
+    rotations = [_axis_rotation(axis, angles[..., n]) for n, axis in enumerate(axes)]
+    if not local:
+        rotations.reverse()
+    return rotations[0] @ rotations[1] @ rotations[2]
+
+
+def quaternion_to_axis_angle(quaternions, degrees=True):
+    """Convert quaternions to a rotation axis and angle.
+
+    The axis of rotations close to zero is the x axis.
+
+    :param quaternions: A (..., 4) array in x, y, z, w order.
+    :rtype: A (..., 3) array of unit axes and a (...,) array of angles in [0, 180]
+    """
+    quaternions = _normalize(numpy.asarray(quaternions, dtype=float))
+    quaternions = numpy.where(quaternions[..., 3:] < 0, -quaternions, quaternions)
+    vectors = quaternions[..., :3]
+    sine = numpy.linalg.norm(vectors, axis=-1)
+    angles = 2 * numpy.arctan2(sine, quaternions[..., 3])
+
+    with numpy.errstate(invalid="ignore"):
+        rotated = sine > _EPSILON
+    axes = numpy.where(
+        rotated[..., None], vectors / numpy.where(rotated, sine, 1)[..., None], [1, 0, 0]
+    )
+    axes[numpy.isnan(angles)] = numpy.nan
+    return axes, numpy.degrees(angles) if degrees else angles
+
+
+def matrix_to_axis_angle(matrices, degrees=True):
+    """Convert rotation matrices to a rotation axis and angle, see
+    :func:`quaternion_to_axis_angle`.
+    """
+    return quaternion_to_axis_angle(matrix_to_quaternion(matrices), degrees)
+
+
+def slerp(start, end, fraction):
+    """Spherical linear interpolation between quaternions, along the shortest path.
+
+    :param start: A (..., 4) array of quaternions at fraction 0.
+    :param end: A (..., 4) array of quaternions at fraction 1.
+    :param fraction: Interpolation fraction, a scalar or an array that broadcasts
+        against the leading dimensions of the quaternions.
+    :rtype: A (..., 4) array of unit quaternions
+    """
+    start = _normalize(numpy.asarray(start, dtype=float))
+    end = _normalize(numpy.asarray(end, dtype=float))
+    fraction = numpy.asarray(fraction, dtype=float)[..., None]
+
+    dot = numpy.sum(start * end, axis=-1, keepdims=True)
+    with numpy.errstate(invalid="ignore"):
+        end = numpy.where(dot < 0, -end, end)
+        dot = numpy.clip(numpy.abs(dot), 0.0, 1.0)
+        angle = numpy.arccos(dot)
+        sine = numpy.sin(angle)
+        # Nearly equal rotations are interpolated linearly
+        close = sine < _EPSILON
+        sine = numpy.where(close, 1.0, sine)
+        start_weight = numpy.where(close, 1 - fraction, numpy.sin((1 - fraction) * angle) / sine)
+        end_weight = numpy.where(close, fraction, numpy.sin(fraction * angle) / sine)
+    return _normalize(start_weight * start + end_weight * end)
+
+
+def quaternion_multiply(first, second):
+    """Hamilton product, the rotation of second followed by the rotation of first.
+
+    :param first: A (..., 4) array in x, y, z, w order.
+    :param second: A (..., 4) array in x, y, z, w order.
+    :rtype: A (..., 4) array
+    """
+    x1, y1, z1, w1 = numpy.moveaxis(numpy.asarray(first, dtype=float), -1, 0)
+    x2, y2, z2, w2 = numpy.moveaxis(numpy.asarray(second, dtype=float), -1, 0)
+    return numpy.stack(
+        [
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+            w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        ],
+        axis=-1,
+    )
+
+
+def quaternion_conjugate(quaternions):
+    """ The inverse rotation of unit quaternions """
+    quaternions = numpy.array(quaternions, dtype=float)
+    quaternions[..., :3] *= -1
+    return quaternions
+
+
+def rotation_vector_to_quaternion(vectors):
+    """Convert rotation vectors, the axis scaled by the angle in radians, to quaternions.
+
+    :param vectors: A (..., 3) array.
+    :rtype: A (..., 4) array in x, y, z, w order
+    """
+    vectors = numpy.asarray(vectors, dtype=float)
+    angles = numpy.linalg.norm(vectors, axis=-1, keepdims=True)
+    # sin(angle / 2) / angle, without dividing by zero
+    scale = 0.5 * numpy.sinc(angles / (2 * numpy.pi))
+    return numpy.concatenate([vectors * scale, numpy.cos(angles / 2)], axis=-1)
+
+
+def quaternion_to_rotation_vector(quaternions):
+    """Convert quaternions to rotation vectors, the axis scaled by the angle in radians.
+
+    :param quaternions: A (..., 4) array in x, y, z, w order.
+    :rtype: A (..., 3) array with angles up to pi
+    """
+    axes, angles = quaternion_to_axis_angle(quaternions, degrees=False)
+    return axes * angles[..., None]
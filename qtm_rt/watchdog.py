@@ -0,0 +1,195 @@
+""" Watchdog for event loop lag and slow on_packet callbacks """
+
+import asyncio
+from collections import namedtuple
+import logging
+import time
+
+from qtm_rt.clock import ClockOffset
+
+LOG = logging.getLogger("qtm_rt")
+
+QRTOverrun = namedtuple("QRTOverrun", "framenumber duration period")
+
+
+def frame_period(frequency, frames="allframes"):
+    """Time between streamed frames.
+
+    :param frequency: Capture frequency of QTM, only needed for allframes and
+        frequencydivisor:n.
+    :param frames: The frames argument given to
+        :func:`~qtm_rt.QRTConnection.stream_frames`.
+
+    :rtype: The period in seconds or None if it can not be derived.
+    """
+    frames = frames.lower()
+    try:
+        if frames.startswith("frequency:"):
+            return 1.0 / float(frames.split(":", 1)[1])
+        if frequency:
+            if frames.startswith("frequencydivisor:"):
+                return float(frames.split(":", 1)[1]) / frequency
+            return 1.0 / frequency
+    except (ValueError, ZeroDivisionError):
+        pass
+    return None
+
+
+class Watchdog(object):
+    """Detect when the on_packet callback or other code on the event loop is too slow.
+
+    Because on_packet is called from the code receiving data from QTM, a callback that
+    is slower than the frame period delays every later frame, command response and
+    event. The watchdog measures:
+
+    - The duration of every on_packet call. A call longer than the frame period is an
+      overrun, reported to ``on_overrun`` with a :class:`QRTOverrun`.
+    - Frames delivered late: frames whose delivery, relative to the QTM timestamp,
+      is more than one frame period behind the fastest delivery of the last
+      ``clock_window`` seconds, so that drift between the clocks is followed.
+    - Event loop lag: how much later than scheduled a periodic timer runs, reported
+      to ``on_lag`` when above ``lag_threshold``.
+
+    Without hooks, overruns and lag are logged as warnings, at most once per second.
+    Usually created with :func:`~qtm_rt.QRTConnection.start_watchdog`.
+
+    :param frequency: Capture frequency of QTM, used to derive the frame period.
+    :param on_overrun: Function called with a :class:`QRTOverrun`.
+    :param on_lag: Function called with the lag in seconds.
+    :param lag_threshold: Lag in seconds above which on_lag is called.
+    :param interval: Seconds between event loop lag measurements.
+    :param clock_window: Seconds of frames the fastest delivery is taken from.
+    """
+
+    def __init__(
+        self,
+        frequency=None,
+        on_overrun=None,
+        on_lag=None,
+        lag_threshold=0.05,
+        interval=0.1,
+        loop=None,
+        clock_window=10.0,
+    ):
+        self.frequency = frequency
+        self.on_overrun = on_overrun
+        self.on_lag = on_lag
+        self.lag_threshold = lag_threshold
+        self.interval = interval
+        self.loop = loop
+
+        self.period = None
+        self.frames = 0
+        self.late_frames = 0
+        self.overruns = 0
+        self.max_callback = 0.0
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+        self._clock = ClockOffset(clock_window)
+        self._last_timestamp = None
+        self._last_warning = 0.0
+        self._task = None
+
+    def start(self):
+        """ Start measuring event loop lag """
+        if self._task is None:
+            loop = self.loop or asyncio.get_event_loop()
+            self._task = loop.create_task(self._measure_lag())
+
+    def stop(self):
+        """ Stop measuring event loop lag """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def metrics(self):
+        """ Watchdog counters as a dict """
+        return {
+            "period": self.period,
+            "frames": self.frames,
+            "late_frames": self.late_frames,
+            "overruns": self.overruns,
+            "max_callback": self.max_callback,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+        }
+
+    def wrap(self, on_packet, frames="allframes"):
+        """Wrap an on_packet callback to measure it.
+
+        :param frames: The frames argument of the stream, to derive the frame period.
+        """
+        if on_packet is None:
+            return None
+
+        self.period = frame_period(self.frequency, frames)
+        self._clock.reset()
+        self._last_timestamp = None
+        clock = time.perf_counter
+
+        def watched(packet):
+            start = clock()
+            self._delivered(packet, start)
+            try:
+                # Through the attribute, so that wrappers inside can be removed
+                watched.__wrapped__(packet)
+            finally:
+                self._finished(packet, clock() - start)
+
+        watched.__wrapped__ = on_packet
+        watched.watchdog = self
+        return watched
+
+    def _delivered(self, packet, now):
+        self.frames += 1
+        if self.period is None:
+            return
+
+        timestamp = packet.timestamp
+        if self._last_timestamp is not None and timestamp < self._last_timestamp:
+            self._clock.reset()  # Timestamps restarted with a new measurement
+        self._last_timestamp = timestamp
+
+        offset = self._clock.add(now, timestamp / 1e6)
+        if offset - self._clock.offset > self.period:
+            self.late_frames += 1
+
+    def _finished(self, packet, duration):
+        if duration > self.max_callback:
+            self.max_callback = duration
+        if self.period is None or duration <= self.period:
+            return
+
+        self.overruns += 1
+        overrun = QRTOverrun(packet.framenumber, duration, self.period)
+        if self.on_overrun is not None:
+            self.on_overrun(overrun)
+        else:
+            self._warn(
+                "on_packet took %.1f ms for frame %d, frame period is %.1f ms",
+                duration * 1e3,
+                packet.framenumber,
+                self.period * 1e3,
+            )
+
+    async def _measure_lag(self):
+        loop = self.loop or asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - expected)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
+            if self.lag > self.lag_threshold:
+                if self.on_lag is not None:
+                    self.on_lag(self.lag)
+                else:
+                    self._warn("Event loop lagging %.1f ms", self.lag * 1e3)
+
+    def _warn(self, message, *args):
+        now = time.monotonic()
+        if now - self._last_warning >= 1.0:
+            self._last_warning = now
+            LOG.warning(message, *args)
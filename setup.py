@@ -16,17 +16,21 @@ setup(
     license="MIT",
     packages=["qtm_rt"],
     package_data={"qtm_rt": ["data/demo.qtm"]},
+    extras_require={
+        # sliding_window_view is new in numpy 1.20
+        "numpy": ["numpy>=1.20"],
+        "arrow": ["pyarrow"],
+        "hdf5": ["h5py", "numpy>=1.20"],
+    },
     classifiers=[
         "Operating System :: OS Independent",
         "Intended Audience :: Developers",
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python",
-        "Programming Language :: Python :: 3.5",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Topic :: Scientific/Engineering",
         "Topic :: Utilities",
     ],
-    python_requires=">=3.5.3",
+    python_requires=">=3.7",
     zip_safe=True,
 )
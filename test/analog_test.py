@@ -0,0 +1,116 @@
+"""
+    Tests for the analog stream assembler
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt.analog import AnalogAssembler, QRTAnalogGap  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, analog  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+SAMPLES_PER_FRAME = 4
+
+
+def chunk(framenumber, device=1, count=SAMPLES_PER_FRAME, first=None):
+    """ Two channels, the sample number and minus the sample number """
+    if first is None:
+        first = (framenumber - 1) * SAMPLES_PER_FRAME
+    numbers = list(range(first, first + count))
+    return QRTPacket(
+        data_body(framenumber, [analog([(device, first, [numbers, [-n for n in numbers]])])])
+    )
+
+
+def test_chunks_are_stitched():
+    assembler = AnalogAssembler(capacity=10)
+    for framenumber in range(1, 5):
+        assert assembler.add_packet(chunk(framenumber)) == []
+
+    assert assembler.devices == [1]
+    samples = assembler.samples(1)
+    assert samples.shape == (10, 2)
+    assert samples[:, 0].tolist() == list(range(6, 16))
+    assert samples[:, 1].tolist() == [-n for n in range(6, 16)]
+    assert assembler.first_sample_number(1) == 6
+    assert assembler.first_sample_number(1, count=3) == 13
+    assert not samples.flags.writeable
+
+
+def test_gaps_and_overlaps_are_reported():
+    assembler = AnalogAssembler()
+    assembler.add_packet(chunk(1))
+    # Frame 2 lost
+    assert assembler.add_packet(chunk(3)) == [QRTAnalogGap(1, 4, 8)]
+    # Two samples sent again
+    assert assembler.add_packet(chunk(4, first=10, count=6)) == [QRTAnalogGap(1, 12, 10)]
+
+    samples = assembler.samples(1)[:, 0]
+    assert numpy.isnan(samples[4:8]).all()
+    expected = list(range(0, 4)) + list(range(8, 16))
+    assert samples[~numpy.isnan(samples)].tolist() == expected
+    statistics = assembler.statistics(1)
+    assert statistics["lost"] == 4
+    assert statistics["overlapped"] == 2
+    assert statistics["gaps"] == 2
+    assert statistics["next_sample_number"] == 16
+
+
+def test_restart():
+    assembler = AnalogAssembler(max_gap=100)
+    assembler.add_packet(chunk(1))
+    assembler.add_packet(chunk(2))
+    # Too long to fill
+    assert assembler.add_packet(chunk(3, first=1000)) == [QRTAnalogGap(1, 8, 1000)]
+    assert assembler.samples(1)[:, 0].tolist() == [1000, 1001, 1002, 1003]
+
+    # Frame numbers restart with a new measurement
+    assert assembler.add_packet(chunk(1)) == []
+    assert assembler.samples(1)[:, 0].tolist() == [0, 1, 2, 3]
+
+
+def test_resample_to_frames():
+    assembler = AnalogAssembler()
+    with pytest.raises(KeyError):
+        assembler.resample(1, [1])
+    for framenumber in range(1, 6):
+        assembler.add_packet(chunk(framenumber))
+
+    with pytest.raises(ValueError):
+        assembler.resample(1, [1], method="cubic")
+
+    linear = assembler.resample(1, [1, 2, 3.5, 5, 7])
+    assert linear.shape == (5, 2)
+    assert linear[:4, 0].tolist() == [0, 4, 10, 16]
+    assert linear[:4, 1].tolist() == [0, -4, -10, -16]
+    assert numpy.isnan(linear[4]).all()
+
+    mean = assembler.resample(1, [1, 2, 5, 6], method="mean")
+    assert mean[:3, 0].tolist() == [1.5, 5.5, 17.5]
+    assert numpy.isnan(mean[3]).all()
+
+
+def test_resample_mean_with_gap():
+    assembler = AnalogAssembler()
+    for framenumber in (1, 2, 4, 5):
+        assembler.add_packet(chunk(framenumber))
+    mean = assembler.resample(1, [1, 2, 3, 4, 5], method="mean")[:, 0]
+    assert numpy.isnan(mean[2])
+    assert mean[[0, 1, 3, 4]].tolist() == [1.5, 5.5, 13.5, 17.5]
+
+
+def test_resample_uneven_chunks():
+    # 2.5 samples per frame, chunks of 2 and 3 samples
+    assembler = AnalogAssembler()
+    first = 0
+    for framenumber in range(1, 9):
+        count = 3 if framenumber % 2 else 2
+        assembler.add_packet(chunk(framenumber, count=count, first=first))
+        first += count
+    positions = assembler.sample_positions(1, [1, 2, 3, 9])
+    assert positions.tolist() == pytest.approx([0, 3, 5, 18 + 18 / 7])
+    assert assembler.resample(1, [2.5])[0, 0] == pytest.approx(4)
@@ -0,0 +1,130 @@
+"""
+    Tests for the NumPy views of packet components
+"""
+
+import math
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import arrays  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import (  # pylint: disable=C0413
+    data_body,
+    markers_3d,
+    markers_3d_no_label,
+    bodies_6d,
+    skeletons,
+    analog,
+    force,
+)
+
+# pylint: disable=W0621, C0111
+
+NAN = float("nan")
+
+
+def test_markers_match_getters():
+    packet = QRTPacket(
+        data_body(
+            1,
+            [
+                markers_3d([(1, 2, 3), (NAN, NAN, NAN)]),
+                markers_3d([(1, 2, 3, 0.5)], residual=True),
+                markers_3d_no_label([(4, 5, 6, 7), (8, 9, 10, 11)]),
+            ],
+        )
+    )
+
+    positions = arrays.markers_3d(packet)
+    assert positions.shape == (2, 3)
+    assert positions[0].tolist() == list(packet.get_3d_markers()[1][0])
+    assert numpy.isnan(positions[1]).all()
+
+    positions, residuals = arrays.markers_3d_residual(packet)
+    assert positions.tolist() == [[1, 2, 3]]
+    assert residuals.tolist() == [0.5]
+
+    positions, ids = arrays.markers_3d_no_label(packet)
+    assert positions.tolist() == [[4, 5, 6], [8, 9, 10]]
+    assert ids.tolist() == [7, 11]
+
+
+def test_missing_and_empty_components():
+    packet = QRTPacket(data_body(1, [markers_3d([])]))
+    assert arrays.markers_3d(packet).shape == (0, 3)
+    assert arrays.bodies_6d(packet) is None
+    assert arrays.skeletons(packet) is None
+
+
+def test_bodies_are_row_column_matrices():
+    # QTM sends the matrix column by column
+    rotation_z_90 = (0, 1, 0, -1, 0, 0, 0, 0, 1)
+    packet = QRTPacket(
+        data_body(1, [bodies_6d([((1, 2, 3), rotation_z_90), ((NAN,) * 3, (NAN,) * 9)])])
+    )
+
+    positions, rotations = arrays.bodies_6d(packet)
+    assert positions[0].tolist() == [1, 2, 3]
+    # The x axis of the body points along the global y axis
+    assert rotations[0].dot([1, 0, 0]).tolist() == [0, 1, 0]
+    assert numpy.isnan(rotations[1]).all()
+    assert not rotations.flags.writeable
+
+
+def test_skeletons():
+    half = math.sqrt(0.5)
+    packet = QRTPacket(
+        data_body(
+            1,
+            [
+                skeletons(
+                    [
+                        [(1, (0, 0, 1), (0, 0, 0, 1)), (2, (0, 1, 0), (0, 0, half, half))],
+                        [(5, (1, 1, 1), (1, 0, 0, 0))],
+                    ]
+                )
+            ],
+        )
+    )
+
+    result = arrays.skeletons(packet)
+    assert len(result) == 2
+    ids, positions, rotations = result[0]
+    assert ids.tolist() == [1, 2]
+    assert positions.tolist() == [[0, 0, 1], [0, 1, 0]]
+    assert rotations[1].tolist() == pytest.approx([0, 0, half, half])
+    assert result[1][0].tolist() == [5]
+
+
+def test_analog_and_force():
+    packet = QRTPacket(
+        data_body(
+            1,
+            [
+                analog([(1, 100, [[1, 2, 3], [4, 5, 6]]), (2, 0, []), (3, 7, [[8.0]])]),
+                force([(1, 20, [list(range(9)), list(range(9, 18))]), (2, 21, [])]),
+            ],
+        )
+    )
+
+    devices = arrays.analog(packet)
+    assert [(device, sample_number) for device, sample_number, _ in devices] == [
+        (1, 100),
+        (2, None),
+        (3, 7),
+    ]
+    assert devices[0][2].tolist() == [[1, 2, 3], [4, 5, 6]]
+    assert devices[1][2].shape == (0, 0)
+    assert devices[2][2].tolist() == [[8]]
+
+    plates = arrays.force(packet)
+    assert [(plate, number) for plate, number, _ in plates] == [(1, 20), (2, 21)]
+    assert plates[0][2].shape == (2, 9)
+    assert plates[0][2][1].tolist() == list(range(9, 18))
+    assert plates[1][2].shape == (0, 9)
+
+    assert arrays.analog_single(packet) is None
+    assert arrays.force_single(packet) is None
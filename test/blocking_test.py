@@ -0,0 +1,198 @@
+"""
+    Tests for BlockingQRTConnection
+"""
+
+import io
+import socket
+
+import pytest
+
+from qtm_rt.blocking import BlockingQRTConnection
+from qtm_rt.packet import QRTPacketType, QRTEvent
+from qtm_rt.protocol import QRTCommandException, QRTTimeoutError
+
+from .helpers import rt_packet, data_packet, markers_3d
+
+# pylint: disable=W0621, C0111, W0212
+
+
+@pytest.fixture
+def pair():
+    client, server = socket.socketpair()
+    connection = BlockingQRTConnection(client, timeout=1)
+    yield connection, server
+    connection.disconnect()
+    server.close()
+
+
+def command(text):
+    return rt_packet(QRTPacketType.PacketCommand, text)
+
+
+def sent(server):
+    server.settimeout(1)
+    return server.recv(4096)
+
+
+def test_command(pair):
+    connection, server = pair
+    server.sendall(command("QTM RT Interface connected") + command("Version is 1.25"))
+
+    assert connection.qtm_version() == b"Version is 1.25"
+    assert b"qtmversion" in sent(server)
+
+
+def test_command_error(pair):
+    connection, server = pair
+    server.sendall(rt_packet(QRTPacketType.PacketError, "Not master"))
+
+    with pytest.raises(QRTCommandException):
+        connection.take_control("password")
+
+
+def test_validate_response(pair):
+    connection, server = pair
+    server.sendall(command("Unexpected"))
+
+    with pytest.raises(QRTCommandException):
+        connection.new()
+
+
+def test_get_parameters(pair):
+    connection, server = pair
+    server.sendall(rt_packet(QRTPacketType.PacketXML, "<QTM_Parameters_Ver_1.25/>"))
+
+    assert connection.get_parameters(["3d"]) == b"<QTM_Parameters_Ver_1.25/>"
+    assert b"getparameters 3d" in sent(server)
+
+
+def test_get_current_frame(pair):
+    connection, server = pair
+    server.sendall(data_packet(7, [markers_3d([(1, 2, 3)])]))
+
+    packet = connection.get_current_frame(components=["3d"])
+    assert packet.framenumber == 7
+
+
+def test_get_current_frame_no_data(pair):
+    connection, server = pair
+    server.sendall(rt_packet(QRTPacketType.PacketNoMoreData, b""))
+
+    with pytest.raises(QRTCommandException):
+        connection.get_current_frame(components=["3d"])
+
+
+def test_stream_frames(pair):
+    connection, server = pair
+    server.sendall(b"".join(data_packet(i, [markers_3d([(i, i, i)])]) for i in range(3)))
+
+    assert connection.stream_frames(components=["3d"]) == b"Ok"
+    assert [connection.recv_frame().framenumber for _ in range(3)] == [0, 1, 2]
+    assert connection.recv_frame(timeout=0.01) is None
+
+
+def test_recv_frame_split(pair):
+    connection, server = pair
+    packet = data_packet(1, [markers_3d([(1, 2, 3)])])
+    server.sendall(packet[:5])
+    assert connection.recv_frame(timeout=0.01) is None
+    server.sendall(packet[5:])
+    assert connection.recv_frame().framenumber == 1
+
+
+def test_get_state(pair):
+    connection, server = pair
+    events = []
+    connection.on_event = events.append
+    server.sendall(rt_packet(QRTPacketType.PacketEvent, bytes([QRTEvent.EventRTfromFileStarted.value])))
+
+    assert connection.get_state() == QRTEvent.EventRTfromFileStarted
+    assert events == [QRTEvent.EventRTfromFileStarted]
+
+
+def test_get_capture(pair):
+    connection, server = pair
+    content = b"c3d file content"
+    server.sendall(
+        command("Sending capture") + rt_packet(QRTPacketType.PacketC3DFile, content)
+    )
+
+    output = io.BytesIO()
+    assert connection.get_capture_c3d(output) == len(content)
+    assert output.getvalue() == content
+
+
+def test_disconnected(pair):
+    connection, server = pair
+    server.close()
+
+    with pytest.raises(QRTCommandException):
+        connection.byte_order()
+    assert not connection.has_transport()
+
+
+def test_timeout_drops_late_response(pair):
+    connection, server = pair
+    connection._timeout = 0.05
+
+    with pytest.raises(QRTTimeoutError):
+        connection.qtm_version()
+    assert isinstance(QRTTimeoutError("x"), (QRTCommandException, socket.timeout))
+
+    # The late reply to qtmversion must not answer byteorder
+    server.sendall(command("Version is 1.25") + command("Byte order is little endian"))
+    assert connection.byte_order() == b"Byte order is little endian"
+
+
+def test_error_matches_oldest_command(pair):
+    connection, server = pair
+    connection._timeout = 0.05
+    with pytest.raises(QRTTimeoutError):
+        connection.get_parameters(["3d"])
+
+    # The error answers the abandoned getparameters, not new
+    server.sendall(
+        rt_packet(QRTPacketType.PacketError, "Parse error")
+        + command("Creating new connection")
+    )
+    assert connection.new() == b"Creating new connection"
+
+
+def test_calibrate_result_in_same_read(pair):
+    connection, server = pair
+    server.sendall(
+        command("Starting calibration") + rt_packet(QRTPacketType.PacketXML, "<calibration/>")
+    )
+    assert connection.calibrate(timeout=1) == b"<calibration/>"
+
+
+def test_frames_survive_buffer_reuse(pair):
+    connection, server = pair
+    connection.stream_frames_stop()
+    server.sendall(b"".join(data_packet(i, [markers_3d([(i, i, i)])]) for i in range(3)))
+    first = connection.recv_frame()
+    server.sendall(data_packet(9, [markers_3d([(9, 9, 9)])]))
+    frames = [connection.recv_frame() for _ in range(3)]
+
+    assert [frame.framenumber for frame in [first] + frames] == [0, 1, 2, 9]
+    assert first.get_3d_markers()[1][0].x == 0
+    assert isinstance(first.data, bytes)
+
+
+def test_current_frame_is_not_streamed(pair):
+    connection, server = pair
+    server.sendall(data_packet(7, [markers_3d([(1, 2, 3)])]))
+
+    assert connection.get_current_frame(components=["3d"]).framenumber == 7
+    assert connection.recv_frame(timeout=0.01) is None
+
+
+def test_queues_are_bounded():
+    client, server = socket.socketpair()
+    connection = BlockingQRTConnection(client, timeout=1, max_queued=3)
+    server.sendall(b"".join(data_packet(i, [markers_3d([(i, i, i)])]) for i in range(5)))
+
+    assert connection.recv_frame().framenumber == 2
+    assert [connection.recv_frame().framenumber for _ in range(2)] == [3, 4]
+    connection.disconnect()
+    server.close()
@@ -0,0 +1,83 @@
+"""
+    Tests for C3DWriter
+"""
+
+import io
+import math
+import struct
+
+import pytest
+
+from qtm_rt.c3d import C3DWriter, C3DHeader, C3D_BLOCK_SIZE
+from qtm_rt.packet import QRTPacket
+
+from .helpers import data_body, markers_3d, analog
+
+# pylint: disable=W0621, C0111
+
+PARAMETERS = b"""<QTM_Parameters_Ver_1.25>
+<General><Frequency>100</Frequency></General>
+<The_3D><Label><Name>head</Name></Label><Label><Name>toe</Name></Label></The_3D>
+<Analog><Device><Device_ID>1</Device_ID><Frequency>200</Frequency>
+<Channel><Label>emg</Label></Channel></Device></Analog>
+</QTM_Parameters_Ver_1.25>"""
+
+
+def read_frames(data):
+    header = C3DHeader.unpack_from(data, 0)
+    point_count, analog_count, last_frame, data_start = (
+        header[2],
+        header[3],
+        header[5],
+        header[8],
+    )
+    frame_size = 4 * (4 * point_count + analog_count)
+    position = (data_start - 1) * C3D_BLOCK_SIZE
+    frames = []
+    while position < len(data):
+        frames.append(struct.unpack_from("<%df" % (frame_size // 4), data, position))
+        position += frame_size
+    return last_frame, frames
+
+
+def test_write_packets():
+    output = io.BytesIO()
+    writer = C3DWriter.from_parameters(output, PARAMETERS)
+    for framenumber in range(3):
+        writer.add_packet(
+            QRTPacket(
+                data_body(
+                    framenumber,
+                    [
+                        markers_3d([(1, 2, framenumber), (math.nan,) * 3]),
+                        analog([(1, framenumber * 2, [[framenumber, -framenumber]])]),
+                    ],
+                )
+            )
+        )
+    writer.close()
+
+    last_frame, frames = read_frames(output.getvalue())
+    assert last_frame == 3
+    assert len(frames) == 3
+    assert frames[2] == (1, 2, 2, 0, 0, 0, 0, -1, 2, -2)
+
+
+def test_analog_behind_points():
+    output = io.BytesIO()
+    writer = C3DWriter(output, ["a"], 100, analog_labels=["x"], analog_rate=200)
+    writer.add_points([(1, 1, 1)])
+    writer.add_points([(2, 2, 2)])
+    assert writer.frame_count == 0
+
+    writer.add_analog([(1,), (2,), (3,)])
+    assert writer.frame_count == 1
+
+    writer.close()
+    _, frames = read_frames(output.getvalue())
+    assert frames[1][-2:] == (3, 0)
+
+
+def test_analog_rate_not_multiple():
+    with pytest.raises(ValueError):
+        C3DWriter(io.BytesIO(), ["a"], 100, analog_labels=["x"], analog_rate=150)
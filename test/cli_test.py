@@ -0,0 +1,149 @@
+"""
+    Tests for the python -m qtm_rt command line tools
+"""
+
+import json
+
+import pytest
+
+from qtm_rt import cli
+from qtm_rt.discovery import QRTDiscoveryResponse
+from qtm_rt.packet import QRTPacket, QRTPacketType, RTheader
+from qtm_rt.protocol import QRTCommandException
+from qtm_rt.receiver import Receiver
+
+from .helpers import data_body, markers_3d
+
+# pylint: disable=W0621, C0111, W0212
+
+
+def packet(framenumber, timestamp):
+    return QRTPacket(data_body(framenumber, [markers_3d([(1, 2, 3)])], timestamp))
+
+
+def test_stats():
+    stats = cli.StreamStats()
+    for framenumber, now in [(1, 0.001), (2, 0.012), (5, 0.043)]:
+        stats.add(packet(framenumber, framenumber * 10000), now=now)
+
+    summary = stats.summary()
+    assert summary["frames"] == 3
+    assert summary["gaps"] == 1
+    assert summary["missing_frames"] == 2
+    assert summary["latency_p50"] == pytest.approx(0.001)
+    assert summary["latency_max"] == pytest.approx(0.002)
+    assert summary["bytes"] == 3 * (RTheader.size + len(packet(1, 0).data))
+    assert list(summary["decode_seconds"]) == ["Component3d"]
+
+
+def test_stats_latency_follows_clock_drift():
+    stats = cli.StreamStats(clock_window=1.0)
+    # The local clock runs 0.1 % faster than QTM's, 5 ms ahead after 5 s
+    for framenumber in range(500):
+        stats.add(packet(framenumber, framenumber * 10000), now=framenumber * 0.01001)
+
+    assert stats.summary()["latency_max"] < 0.0015
+
+
+def test_render():
+    stats = cli.StreamStats()
+    stats.add(packet(1, 0))
+    view = cli.render(stats, "127.0.0.1:22223", ["3d"])
+    assert "127.0.0.1:22223" in view
+    assert "Component3d" in view
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.stopped = False
+        self.disconnected = False
+
+    async def stream_frames(self, frames, components, on_packet):
+        for framenumber in range(1, 4):
+            on_packet(packet(framenumber, framenumber * 10000))
+
+    async def stream_frames_stop(self):
+        self.stopped = True
+
+    def has_transport(self):
+        return not self.disconnected
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+def test_top_bench_and_record(mocker, tmp_path, capsys):
+    connection = FakeConnection()
+
+    async def connect(*_, **__):
+        return connection
+
+    mocker.patch("qtm_rt.cli.connect", side_effect=connect)
+    record = tmp_path / "stream.rt"
+
+    result = cli.main(
+        ["top", "--host", "192.0.2.1", "--bench", "0.01", "--json", "--record", str(record)]
+    )
+
+    assert result == 0
+    assert connection.stopped and connection.disconnected
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["frames"] == 3
+
+    replayed = []
+    Receiver({QRTPacketType.PacketData: replayed.append}).data_received(record.read_bytes())
+    assert [p.framenumber for p in replayed] == [1, 2, 3]
+
+
+def test_top_connection_failed(mocker, capsys):
+    async def connect(*_, **__):
+        return None
+
+    mocker.patch("qtm_rt.cli.connect", side_effect=connect)
+    assert cli.main(["top", "--host", "192.0.2.1", "--bench", "0"]) == 1
+    assert "Failed to connect" in capsys.readouterr().err
+
+
+def test_top_stream_failed(mocker, capsys):
+    connection = FakeConnection()
+
+    async def stream_frames(**_):
+        raise QRTCommandException("Unknown component")
+
+    connection.stream_frames = stream_frames
+
+    async def connect(*_, **__):
+        return connection
+
+    mocker.patch("qtm_rt.cli.connect", side_effect=connect)
+    assert cli.main(["top", "--host", "192.0.2.1", "--components", "4d"]) == 1
+    assert "Unknown component" in capsys.readouterr().err
+    assert connection.disconnected
+
+
+def test_requires_command():
+    with pytest.raises(SystemExit):
+        cli.main([])
+
+
+class FakeDiscovery(object):
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    async def scan(self):
+        return [QRTDiscoveryResponse(b"QTM 2024", "192.0.2.7", 22222)]
+
+
+def test_discovered_server_uses_little_endian_port(mocker, capsys):
+    mocker.patch("qtm_rt.cli.DiscoveryService", FakeDiscovery)
+    ports = []
+
+    async def connect(host, port, **_):
+        ports.append((host, port))
+
+    mocker.patch("qtm_rt.cli.connect", side_effect=connect)
+    assert cli.main(["top", "--bench", "0"]) == 1
+    assert ports == [("192.0.2.7", 22223)]
+
+    assert cli.main(["discover"]) == 0
+    assert "192.0.2.7:22223  QTM 2024" in capsys.readouterr().out
@@ -0,0 +1,29 @@
+"""
+    Tests for the clock offset
+"""
+
+import pytest
+
+from qtm_rt.clock import ClockOffset
+
+# pylint: disable=C0111
+
+
+def test_windowed_minimum():
+    clock = ClockOffset(window=1.0)
+    assert clock.offset is None
+    assert clock.to_qtm(5.0) is None
+
+    assert clock.add(10.0, 9.0) == pytest.approx(1.0)
+    clock.add(10.5, 9.6)
+    assert clock.offset == pytest.approx(0.9)
+    clock.add(11.0, 9.95)
+    assert clock.offset == pytest.approx(0.9)
+    # The fastest frame is older than the window
+    clock.add(11.6, 10.5)
+    assert clock.offset == pytest.approx(1.05)
+    assert clock.to_qtm(12.05) == pytest.approx(11.0)
+    assert clock.to_local(11.0) == pytest.approx(12.05)
+
+    clock.reset()
+    assert clock.offset is None
@@ -0,0 +1,87 @@
+"""
+    Tests for DiscoveryService
+"""
+
+import asyncio
+import socket
+import sys
+
+import pytest
+
+from qtm_rt.discovery import (
+    DiscoveryService,
+    QRTDiscoveryResponse,
+    local_interfaces,
+    _interface_addresses,
+)
+
+# pylint: disable=W0621, C0111, W0212
+
+QTM_A = QRTDiscoveryResponse(b"QTM A", "192.0.2.1", 22222)
+QTM_B = QRTDiscoveryResponse(b"QTM B", "192.0.2.2", 22222)
+
+
+@pytest.fixture
+def service(mocker):
+    service = DiscoveryService(interfaces=["192.0.2.10", "198.51.100.10"], ttl=5)
+    responses = {"192.0.2.10": [QTM_A, QTM_B], "198.51.100.10": [QTM_A]}
+
+    async def probe(interface):
+        return list(responses[interface])
+
+    mocker.patch.object(service, "_probe", side_effect=probe)
+    service.responses = responses
+    return service
+
+
+@pytest.mark.asyncio
+async def test_scan_deduplicates(service):
+    servers = await service.scan()
+    assert sorted(servers) == sorted([QTM_A, QTM_B])
+    assert service._probe.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_scan_cached(service):
+    await service.scan()
+    await service.scan()
+    assert service._probe.call_count == 2
+
+    await service.scan(force=True)
+    assert service._probe.call_count == 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_scans_share_probe(service):
+    await asyncio.gather(service.scan(), service.scan())
+    assert service._probe.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_monitor(service):
+    service.ttl = 0.01
+    events = service.monitor(interval=0.02)
+
+    added = [await events.__anext__(), await events.__anext__()]
+    assert sorted(event.response for event in added) == sorted([QTM_A, QTM_B])
+    assert {event.type for event in added} == {"added"}
+
+    service.responses["192.0.2.10"] = []
+    event = await asyncio.wait_for(events.__anext__(), 1)
+    assert event.type == "removed"
+    assert event.response == QTM_B
+    await events.aclose()
+
+
+def test_local_interfaces_fall_back_to_any_address(mocker):
+    mocker.patch("qtm_rt.discovery._interface_addresses", return_value=set())
+    mocker.patch(
+        "socket.getaddrinfo",
+        return_value=[(socket.AF_INET, socket.SOCK_DGRAM, 17, "", ("127.0.1.1", 0))],
+    )
+    assert local_interfaces() == ["0.0.0.0", "127.0.0.1", "127.0.1.1"]
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_interface_addresses_on_linux():
+    assert "127.0.0.1" in _interface_addresses()
@@ -0,0 +1,113 @@
+"""
+    Tests for the event bus
+"""
+
+import asyncio
+
+import pytest
+
+from qtm_rt.events import EventBus
+from qtm_rt.packet import QRTEvent
+
+# pylint: disable=W0621, C0111, W0212
+
+
+@pytest.fixture
+def bus(event_loop):
+    return EventBus(history=3, loop=event_loop)
+
+
+@pytest.mark.asyncio
+async def test_wait_filters(bus):
+    waiters = [
+        asyncio.ensure_future(bus.wait()),
+        asyncio.ensure_future(bus.wait(QRTEvent.EventCaptureStarted)),
+        asyncio.ensure_future(
+            bus.wait([QRTEvent.EventCaptureStopped, QRTEvent.EventCaptureSaved])
+        ),
+        asyncio.ensure_future(bus.wait(lambda event: event.name.endswith("Saved"))),
+    ]
+    await asyncio.sleep(0)
+
+    bus.publish(QRTEvent.EventCaptureStarted)
+    bus.publish(QRTEvent.EventCaptureSaved)
+
+    results = await asyncio.gather(*waiters)
+    assert results == [
+        QRTEvent.EventCaptureStarted,
+        QRTEvent.EventCaptureStarted,
+        QRTEvent.EventCaptureSaved,
+        QRTEvent.EventCaptureSaved,
+    ]
+    assert not bus._waiters
+
+
+@pytest.mark.asyncio
+async def test_wait_timeout(bus):
+    for _ in range(3):
+        with pytest.raises(asyncio.TimeoutError):
+            await bus.wait(timeout=0.01)
+    # Removed without waiting for an event
+    assert not bus._waiters
+
+    bus.publish(QRTEvent.EventConnected)
+    assert not bus._waiters
+
+
+@pytest.mark.asyncio
+async def test_subscribe(bus):
+    received = []
+
+    async def consume(subscription):
+        async for record in subscription:
+            received.append(record.event)
+
+    subscription = bus.subscribe(
+        [QRTEvent.EventRTfromFileStarted, QRTEvent.EventRTfromFileStopped]
+    )
+    task = asyncio.ensure_future(consume(subscription))
+
+    bus.publish(QRTEvent.EventRTfromFileStarted)
+    bus.publish(QRTEvent.EventConnected)
+    await asyncio.sleep(0)
+    bus.publish(QRTEvent.EventRTfromFileStopped)
+    subscription.close()
+    await asyncio.wait_for(task, 1)
+
+    assert received == [QRTEvent.EventRTfromFileStarted, QRTEvent.EventRTfromFileStopped]
+    assert not bus._subscriptions
+
+
+@pytest.mark.asyncio
+async def test_subscription_max_size(bus):
+    with bus.subscribe(max_size=2) as subscription:
+        for event in (
+            QRTEvent.EventConnected,
+            QRTEvent.EventCaptureStarted,
+            QRTEvent.EventCaptureStopped,
+        ):
+            bus.publish(event)
+
+        assert (await subscription.get(timeout=1)).event == QRTEvent.EventCaptureStarted
+        assert (await subscription.get(timeout=1)).event == QRTEvent.EventCaptureStopped
+        with pytest.raises(asyncio.TimeoutError):
+            await subscription.get(timeout=0.01)
+
+
+def test_history(bus):
+    for event in (
+        QRTEvent.EventConnected,
+        QRTEvent.EventCaptureStarted,
+        QRTEvent.EventCaptureStopped,
+        QRTEvent.EventCaptureSaved,
+    ):
+        bus.publish(event)
+
+    assert [record.event for record in bus.history] == [
+        QRTEvent.EventCaptureStarted,
+        QRTEvent.EventCaptureStopped,
+        QRTEvent.EventCaptureSaved,
+    ]
+    assert bus.last(QRTEvent.EventCaptureStarted).event == QRTEvent.EventCaptureStarted
+    assert bus.last(QRTEvent.EventConnected) is None
+    assert bus.history[0].time <= bus.history[-1].time
@@ -0,0 +1,105 @@
+"""
+    Tests for ColumnarWriter
+"""
+
+import pytest
+
+from qtm_rt.export import ColumnarWriter
+from qtm_rt.packet import QRTPacket
+
+from .helpers import data_body, markers_3d, bodies_6d, analog
+
+# pylint: disable=W0621, C0111
+
+PARAMETERS = b"""<QTM_Parameters_Ver_1.25>
+<The_3D><Labels>2</Labels>
+<Label><Name>head</Name></Label><Label><Name>toe</Name></Label>
+</The_3D>
+<The_6D><Bodies>1</Bodies><Body><Name>wand</Name></Body></The_6D>
+<Analog><Device><Device_ID>1</Device_ID><Device_Name>daq</Device_Name>
+<Channels>2</Channels><Frequency>400</Frequency>
+<Channel><Label>emg</Label></Channel><Channel><Label>sync</Label></Channel>
+</Device></Analog>
+</QTM_Parameters_Ver_1.25>"""
+
+
+class ListSink:
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def write(self, table, columns):
+        self.writes.append((table, [(name, list(values)) for name, values in columns]))
+
+    def close(self):
+        self.closed = True
+
+
+def make_packet(framenumber):
+    return QRTPacket(
+        data_body(
+            framenumber,
+            [
+                markers_3d([(1, 2, 3), (4, 5, framenumber)]),
+                bodies_6d([((7, 8, 9), range(9))]),
+                analog([(1, framenumber * 4, [[0.5] * 4, [1.5] * 4])]),
+            ],
+        )
+    )
+
+
+def test_columns_from_parameters():
+    sink = ListSink()
+    writer = ColumnarWriter(sink, parameters=PARAMETERS, chunk_size=10)
+    writer.add_packet(make_packet(1))
+    writer.close()
+
+    assert sink.closed
+    tables = dict(sink.writes)
+    names = [name for name, _ in tables["frames"]]
+    assert names[:5] == ["frame", "timestamp", "head_x", "head_y", "head_z"]
+    assert "toe_z" in names
+    assert names[-12:-8] == ["wand_x", "wand_y", "wand_z", "wand_rot0"]
+    assert dict(tables["frames"])["wand_rot8"] == [8]
+
+    analog_columns = dict(tables["analog_1"])
+    assert list(analog_columns) == ["sample_number", "emg", "sync"]
+    assert analog_columns["sample_number"] == [4, 5, 6, 7]
+
+
+def test_chunked_flush():
+    sink = ListSink()
+    writer = ColumnarWriter(sink, chunk_size=2)
+    for framenumber in range(5):
+        writer.add_packet(make_packet(framenumber))
+
+    frames = [columns for table, columns in sink.writes if table == "frames"]
+    assert len(frames) == 2
+    assert dict(frames[1])["marker_1_z"] == [2, 3]
+
+    writer.close()
+    frames = [columns for table, columns in sink.writes if table == "frames"]
+    assert dict(frames[-1])["frame"] == [4]
+
+
+def test_item_count_change():
+    writer = ColumnarWriter(ListSink())
+    writer.add_packet(make_packet(1))
+    with pytest.raises(ValueError):
+        writer.add_packet(QRTPacket(data_body(2, [markers_3d([(1, 2, 3)])])))
+
+
+def test_parquet_sink(tmp_path):
+    pytest.importorskip("pyarrow")
+    from qtm_rt.export import ParquetSink
+    import pyarrow.parquet as pq
+
+    path = str(tmp_path / "session.parquet")
+    with ColumnarWriter(ParquetSink(path), parameters=PARAMETERS, chunk_size=2) as writer:
+        for framenumber in range(5):
+            writer.add_packet(make_packet(framenumber))
+
+    parquet_file = pq.ParquetFile(path)
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.read().column("head_x").to_pylist() == [1] * 5
+    assert pq.read_table(str(tmp_path / "session.analog_1.parquet")).num_rows == 20
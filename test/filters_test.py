@@ -0,0 +1,174 @@
+"""
+    Tests for the smoothing filters
+"""
+
+import math
+import warnings
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import filters  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, markers_3d, bodies_6d  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111, W0212
+
+FREQUENCY = 100.0
+NAN = float("nan")
+
+
+def run(filter_, signal):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        return numpy.array(
+            [filter_(values, n / FREQUENCY).copy() for n, values in enumerate(signal)]
+        )
+
+
+@pytest.fixture
+def noisy():
+    rng = numpy.random.default_rng(2)
+    return 10 + rng.normal(0, 1, (400, 5, 3))
+
+
+@pytest.fixture(
+    params=[
+        lambda: filters.OneEuroFilter(min_cutoff=1.0, beta=0.0),
+        lambda: filters.ButterworthFilter(FREQUENCY, 5),
+        lambda: filters.KalmanFilter(process_noise=10, measurement_noise=1),
+    ],
+    ids=["one_euro", "butterworth", "kalman"],
+)
+def any_filter(request):
+    return request.param()
+
+
+def test_smooths_noise(any_filter, noisy):
+    output = run(any_filter, noisy)
+    assert output.shape == noisy.shape
+    assert output[100:].std() < noisy[100:].std() / 2
+    assert output[100:].mean() == pytest.approx(10, abs=0.3)
+
+
+def test_constant_passes_unchanged(any_filter):
+    output = run(any_filter, numpy.full((50, 4), 3.5))
+    assert output == pytest.approx(3.5)
+
+
+def test_dropout_only_affects_missing_elements(any_filter, noisy):
+    reference = run(any_filter.clone(), noisy)
+    signal = noisy.copy()
+    signal[200:210, 2] = NAN
+
+    output = run(any_filter, signal)
+    assert numpy.isnan(output[200:210, 2]).all()
+    assert not numpy.isnan(output[210:]).any()
+    # Other elements are filtered exactly as without the dropout
+    assert output[:, [0, 1, 3, 4]] == pytest.approx(reference[:, [0, 1, 3, 4]])
+    assert output[250:, 2] == pytest.approx(10, abs=1.5)
+
+
+def test_shape_change_restarts(any_filter):
+    any_filter(numpy.ones(3), 0.0)
+    assert any_filter(numpy.full(4, 2.0), 0.01) == pytest.approx(2.0)
+
+
+def test_filter_requires_allocate_and_filter():
+    with pytest.raises(TypeError):
+        filters.Filter()
+
+    class Incomplete(filters.Filter):
+        def _allocate(self, shape):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_butterworth_coefficients():
+    # scipy.signal.butter(2, 0.1)
+    (b0, b1, b2, a1, a2), = filters.butterworth_sections(100, 5, 2)
+    assert (b0, b1, b2) == pytest.approx((0.02008337, 0.04016673, 0.02008337))
+    assert (a1, a2) == pytest.approx((-1.56101808, 0.64135154))
+    assert len(filters.butterworth_sections(100, 5, 5)) == 3
+
+    with pytest.raises(ValueError):
+        filters.ButterworthFilter(100, 60)
+
+
+@pytest.mark.parametrize("order", [1, 2, 3, 4, 5])
+def test_butterworth_magnitude_response(order):
+    frequency, cutoff = 100.0, 5.0
+    tested = numpy.array([1.0, 3.0, 5.0, 8.0, 20.0])
+    z = numpy.exp(2j * numpy.pi * tested / frequency)
+    response = numpy.ones(len(tested), dtype=complex)
+    for b0, b1, b2, a1, a2 in filters.butterworth_sections(frequency, cutoff, order):
+        response *= (b0 + b1 / z + b2 / z ** 2) / (1 + a1 / z + a2 / z ** 2)
+
+    # Bilinear transform of the analog Butterworth response
+    ratio = numpy.tan(numpy.pi * tested / frequency) / numpy.tan(numpy.pi * cutoff / frequency)
+    expected = 1 / numpy.sqrt(1 + ratio ** (2 * order))
+    assert numpy.abs(response) == pytest.approx(expected, rel=1e-9)
+    assert numpy.abs(response[2]) == pytest.approx(numpy.sqrt(0.5))
+
+
+def test_one_euro_follows_fast_movement():
+    ramp = numpy.arange(100.0)[:, None] * 10
+    slow = run(filters.OneEuroFilter(min_cutoff=1.0, beta=0.0), ramp)
+    fast = run(filters.OneEuroFilter(min_cutoff=1.0, beta=0.1), ramp)
+    assert abs(fast[-1, 0] - ramp[-1, 0]) < abs(slow[-1, 0] - ramp[-1, 0]) / 5
+
+
+def test_kalman_velocity_and_prediction():
+    kalman = filters.KalmanFilter(process_noise=1, measurement_noise=0.01, predict_missing=True)
+    ramp = numpy.arange(200.0)[:, None] * 2  # 200 units / s
+    ramp[150:160] = NAN
+
+    output = run(kalman, ramp)
+    assert kalman.velocity == pytest.approx([200], rel=1e-3)
+    # Missing values are predicted
+    assert output[155, 0] == pytest.approx(310, rel=1e-3)
+
+
+def test_stage():
+    rotation = (1, 0, 0, 0, 1, 0, 0, 0, 1)
+    stage = filters.FilterStage(filters.OneEuroFilter())
+    frames = []
+    on_packet = stage.wrap(frames.append)
+
+    for framenumber in range(1, 4):
+        on_packet(
+            QRTPacket(
+                data_body(
+                    framenumber,
+                    [
+                        markers_3d([(1, 2, 3), (NAN, NAN, NAN)]),
+                        bodies_6d([((4, 5, 6), rotation), ((NAN,) * 3, (NAN,) * 9)]),
+                    ],
+                )
+            )
+        )
+
+    frame = frames[-1]
+    assert frame.packet.framenumber == 3
+    assert frame.markers[0] == pytest.approx([1, 2, 3])
+    assert numpy.isnan(frame.markers[1]).all()
+    assert frame.positions[0] == pytest.approx([4, 5, 6])
+    assert frame.rotations[0] == pytest.approx(numpy.eye(3))
+    assert numpy.isnan(frame.rotations[1]).all()
+    assert on_packet.__wrapped__ == frames.append
+
+
+def test_stage_keeps_quaternion_hemisphere():
+    stage = filters.FilterStage(filters.OneEuroFilter())
+    quaternion = numpy.array([[0.0, 0.0, 1.0, 0.0]])
+    assert stage._continuous(filters.transforms.quaternion_to_matrix(quaternion))[0] == (
+        pytest.approx([0, 0, 1, 0])
+    )
+    # 179 and 181 degrees about z give quaternions of opposite hemispheres
+    for angle in (179, 181):
+        matrix = filters.transforms.euler_to_matrix([0, 0, angle])
+        assert stage._continuous(matrix[None])[0, 2] > 0.99
@@ -0,0 +1,80 @@
+"""
+    Tests for PacketQueue
+"""
+
+import asyncio
+
+import pytest
+
+from qtm_rt.flow import PacketQueue
+from qtm_rt.packet import QRTPacketType
+from qtm_rt.protocol import QTMProtocol
+
+from .helpers import rt_packet
+
+# pylint: disable=W0621, C0111
+
+
+@pytest.fixture
+def protocol(mocker):
+    protocol = mocker.MagicMock(name="QTMProtocol")
+    protocol.transport = mocker.MagicMock(name="transport")
+    return protocol
+
+
+@pytest.mark.asyncio
+async def test_pause_and_resume(protocol):
+    queue = PacketQueue(protocol, high_water=3, low_water=1)
+    for packet in range(4):
+        queue.put_nowait(packet)
+
+    assert queue.paused
+    assert protocol.pause_reading.call_count == 1
+
+    assert await queue.get() == 0
+    assert await queue.get() == 1
+    assert queue.paused
+    assert await queue.get() == 2
+    assert not queue.paused
+    assert protocol.resume_reading.call_count == 1
+
+    metrics = queue.metrics()
+    assert metrics["pause_count"] == 1
+    assert metrics["max_size"] == 4
+    assert metrics["paused_time"] >= 0
+
+
+def test_invalid_water_marks(protocol):
+    with pytest.raises(ValueError):
+        PacketQueue(protocol, high_water=2, low_water=2)
+
+
+@pytest.mark.asyncio
+async def test_responses_are_read_while_paused(mocker):
+    protocol = QTMProtocol()
+    transport = mocker.MagicMock(name="transport")
+    protocol.connection_made(transport)
+    queue = PacketQueue(protocol, high_water=2, low_water=1)
+    queue.put_nowait(0)
+    queue.put_nowait(1)
+    assert transport.pause_reading.call_count == 1
+
+    future = protocol.send_command("getparameters all")
+    assert transport.resume_reading.call_count == 1
+    protocol.data_received(rt_packet(QRTPacketType.PacketXML, "<QTM_Parameters_Ver_1.25/>"))
+    assert await future == b"<QTM_Parameters_Ver_1.25/>"
+    await asyncio.sleep(0)
+    # Paused again once nothing is awaited
+    assert transport.pause_reading.call_count == 2
+
+    waiter = asyncio.ensure_future(protocol.await_event())
+    await asyncio.sleep(0)
+    assert transport.resume_reading.call_count == 2
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert transport.pause_reading.call_count == 3
+
+    queue.resume()
+    assert transport.resume_reading.call_count == 3
+    assert queue.paused is False
@@ -0,0 +1,138 @@
+"""
+    Tests for the force plate quantities
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import force  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, force as force_component  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+
+def sample(vector, point, torque, surface=0.0):
+    """ A force acting at point on the surface with a free moment about z """
+    vector = numpy.asarray(vector, dtype=float)
+    point = numpy.array([point[0], point[1], surface], dtype=float)
+    moment = numpy.cross(point, vector) + [0, 0, torque]
+    return numpy.concatenate([vector, moment, point])
+
+
+def test_centre_of_pressure_and_free_moment():
+    samples = numpy.array(
+        [
+            sample((10, -20, 700), (0.1, 0.2), 1.5),
+            sample((-5, 3, -400), (-0.3, 0.05), -0.5, surface=0.04),
+            sample((10, 0, 5), (0.1, 0.2), 0.0),
+        ]
+    )
+    cop = force.centre_of_pressure(samples[:2], surface=0.0)
+    assert cop[0].tolist() == pytest.approx([0.1, 0.2, 0])
+    cop = force.centre_of_pressure(samples, surface=0.04)
+    assert cop[1].tolist() == pytest.approx([-0.3, 0.05, 0.04])
+    # Below the threshold
+    assert numpy.isnan(cop[2]).all()
+
+    result = force.quantities(samples[:1])
+    assert result.free_moment.tolist() == pytest.approx([1.5])
+    assert result.magnitude.tolist() == pytest.approx([numpy.linalg.norm([10, -20, 700])])
+    assert result.contact.tolist() == [True]
+    assert force.contact(samples, threshold=4).tolist() == [True, True, True]
+
+    result = force.quantities(samples, surface=0.04)
+    assert result.free_moment[1] == pytest.approx(-0.5)
+    assert numpy.isnan(result.free_moment[2])
+
+
+def test_leading_axes():
+    plates = numpy.array(
+        [
+            [sample((0, 0, 100 + n), (0.01 * n, 0), 0) for n in range(5)],
+            [sample((0, 0, 200), (0, 0.02 * n), 0) for n in range(5)],
+        ]
+    )
+    cop = force.centre_of_pressure(plates)
+    assert cop.shape == (2, 5, 3)
+    assert cop[0, :, 0].tolist() == pytest.approx([0.01 * n for n in range(5)])
+    assert cop[1, :, 1].tolist() == pytest.approx([0.02 * n for n in range(5)])
+
+
+def test_transform():
+    angle = numpy.radians(30)
+    rotation = numpy.array(
+        [
+            [numpy.cos(angle), -numpy.sin(angle), 0],
+            [numpy.sin(angle), numpy.cos(angle), 0],
+            [0, 0, 1],
+        ]
+    )
+    translation = numpy.array([1.0, 2.0, 0.0])
+    local = numpy.array([sample((10, 5, 600), (0.1, -0.2), 2.0)])
+    lab = force.transform(local, rotation, translation)
+
+    assert lab[0, :3].tolist() == pytest.approx(rotation @ [10, 5, 600])
+    expected = rotation @ [0.1, -0.2, 0] + translation
+    assert lab[0, 6:].tolist() == pytest.approx(expected)
+    assert force.centre_of_pressure(lab)[0].tolist() == pytest.approx(expected)
+    assert force.quantities(lab).free_moment[0] == pytest.approx(2.0)
+
+    # One transform per plate
+    both = force.transform(
+        numpy.stack([local, local]),
+        numpy.stack([numpy.eye(3), rotation]),
+        numpy.stack([numpy.zeros(3), translation]),
+    )
+    assert numpy.allclose(both[0], local)
+    assert numpy.allclose(both[1], lab)
+
+
+def test_combine_plates():
+    plates = numpy.array(
+        [
+            [sample((0, 0, 300), (0.0, 0.0), 1.0), sample((0, 0, 300), (0, 0), 0)],
+            [sample((0, 0, 100), (0.4, 0.8), 0.5), sample((1, 2, 3), (5, 5), 9)],
+            [numpy.full(9, numpy.nan), numpy.full(9, numpy.nan)],
+        ]
+    )
+    combined = force.combine(plates)
+    assert combined.shape == (2, 9)
+    assert combined[0, :3].tolist() == pytest.approx([0, 0, 400])
+    assert combined[0, 6:].tolist() == pytest.approx([0.1, 0.2, 0])
+    # The unloaded plate is left out
+    assert combined[1, :3].tolist() == pytest.approx([0, 0, 300])
+    assert combined[1, 6:].tolist() == pytest.approx([0, 0, 0])
+    assert force.quantities(combined).free_moment[0] == pytest.approx(1.5)
+
+    assert numpy.allclose(force.combine(plates.swapaxes(0, 1), axis=1), combined)
+    assert numpy.isnan(force.combine(plates[2:])).all()
+
+
+def test_plate_samples():
+    packet = QRTPacket(data_body(1, []))
+    assert force.plate_samples(packet) is None
+    assert force.plate_samples_single(packet) is None
+
+    packet = QRTPacket(
+        data_body(
+            1,
+            [
+                force_component(
+                    [
+                        (1, 10, [tuple(range(9)), tuple(range(9, 18))]),
+                        (2, 20, [tuple(range(18, 27))]),
+                    ]
+                )
+            ],
+        )
+    )
+    ids, numbers, samples = force.plate_samples(packet)
+    assert ids.tolist() == [1, 2]
+    assert numbers.tolist() == [10, 20]
+    assert samples.shape == (2, 2, 9)
+    assert samples[0].ravel().tolist() == list(range(18))
+    assert samples[1, 0].tolist() == list(range(18, 27))
+    assert numpy.isnan(samples[1, 1]).all()
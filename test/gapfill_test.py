@@ -0,0 +1,141 @@
+"""
+    Tests for GapFiller
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import transforms  # pylint: disable=C0413
+from qtm_rt.gapfill import GapFiller, rigid_transform  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, markers_3d  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+NAN = float("nan")
+
+
+def trajectory(frames, markers=3):
+    """ Markers moving on parabolas """
+    time = numpy.arange(frames, dtype=float)[:, None, None]
+    offsets = numpy.arange(markers, dtype=float)[None, :, None] * [10, 0, 0]
+    return offsets + time * [1, 2, 0] + time ** 2 * [0, 0, 0.1]
+
+
+def run(filler, positions):
+    output = [filler.add(frame) for frame in positions]
+    output = [frame for frame in output if frame is not None] + filler.flush()
+    assert len(output) == len(positions)
+    return (
+        numpy.array([frame.positions for frame in output]),
+        numpy.array([frame.synthetic for frame in output]),
+    )
+
+
+def test_output_is_delayed_by_lookahead():
+    filler = GapFiller(lookahead=3)
+    frames = trajectory(5)
+    assert [filler.add(frame) is None for frame in frames] == [True] * 3 + [False] * 2
+    assert len(filler.flush()) == 3
+
+
+def test_linear_fills_short_gaps():
+    expected = trajectory(40)
+    positions = expected.copy()
+    positions[10:15, 1] = NAN
+    positions[20:35, 2] = NAN  # Longer than max_gap
+
+    filled, synthetic = run(GapFiller(max_gap=8, lookahead=8), positions)
+    assert synthetic[10:15, 1].all()
+    assert synthetic.sum() == 5
+    # x and y are linear
+    assert filled[10:15, 1, :2] == pytest.approx(expected[10:15, 1, :2])
+    assert numpy.isnan(filled[20:35, 2]).all()
+    assert filled[~numpy.isnan(positions)] == pytest.approx(expected[~numpy.isnan(positions)])
+
+
+def test_gap_beyond_lookahead_is_not_filled():
+    positions = trajectory(30)
+    positions[10:15, 0] = NAN
+    _, synthetic = run(GapFiller(max_gap=8, lookahead=2), positions)
+    assert synthetic[13:15, 0].all()
+    assert not synthetic[10:13, 0].any()
+
+
+def test_spline_follows_curvature():
+    expected = trajectory(40)
+    positions = expected.copy()
+    positions[10:16, 0] = NAN
+
+    linear, _ = run(GapFiller(lookahead=8), positions)
+    spline, synthetic = run(GapFiller(lookahead=8, method="spline"), positions)
+    assert synthetic[10:16, 0].all()
+    linear_error = numpy.abs(linear[10:16, 0] - expected[10:16, 0]).max()
+    spline_error = numpy.abs(spline[10:16, 0] - expected[10:16, 0]).max()
+    assert spline_error < linear_error / 5
+
+
+def test_rigid_fill():
+    # Four markers on a body that turns and moves
+    body = numpy.array([[0, 0, 0], [100, 0, 0], [0, 50, 0], [0, 0, 30.0]])
+    frames = []
+    for frame in range(60):
+        rotation = transforms.euler_to_matrix([frame, 2 * frame, 0])
+        frames.append(body @ rotation.T + [frame, 0, 5])
+    expected = numpy.array(frames)
+    positions = expected.copy()
+    positions[20:50, 3] = NAN  # Too long to interpolate
+
+    filled, synthetic = run(
+        GapFiller(max_gap=5, lookahead=5, rigid_groups=[[0, 1, 2, 3]]), positions
+    )
+    assert synthetic[20:50, 3].all()
+    assert synthetic.sum() == 30
+    assert filled[20:50, 3] == pytest.approx(expected[20:50, 3])
+
+
+def test_rigid_fill_needs_three_markers():
+    positions = trajectory(30, markers=4)
+    positions[5:25, 2:] = NAN
+    _, synthetic = run(GapFiller(max_gap=2, lookahead=2, rigid_groups=[[0, 1, 2, 3]]), positions)
+    assert not synthetic[8:22].any()
+
+
+def test_rigid_transform():
+    source = numpy.random.default_rng(3).normal(size=(6, 3))
+    rotation = transforms.euler_to_matrix([30, -20, 100])
+    found, translation = rigid_transform(source, source @ rotation.T + [1, 2, 3])
+    assert found == pytest.approx(rotation)
+    assert translation == pytest.approx([1, 2, 3])
+
+
+def test_wrap_and_marker_count_change():
+    filler = GapFiller(lookahead=1)
+    frames = []
+    on_packet = filler.wrap(frames.append)
+    for framenumber in range(1, 4):
+        on_packet(QRTPacket(data_body(framenumber, [markers_3d([(1, 2, 3)])])))
+    assert [frame.packet.framenumber for frame in frames] == [1, 2]
+    assert frames[0].positions.tolist() == [[1, 2, 3]]
+
+    # A new marker count starts over
+    assert filler.add(numpy.zeros((2, 3))) is None
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        GapFiller(method="cubic")
+    with pytest.raises(ValueError):
+        GapFiller(lookahead=10, history=8)
+
+
+def test_missing_at_start_and_end():
+    positions = trajectory(10)
+    positions[0, 0] = NAN
+    positions[9, 1] = NAN
+    filled, synthetic = run(GapFiller(lookahead=3), positions)
+    assert not synthetic.any()
+    assert numpy.isnan(filled[0, 0]).all()
+    assert numpy.isnan(filled[9, 1]).all()
@@ -0,0 +1,105 @@
+"""
+    Helpers for building binary RT packets in tests
+"""
+
+import struct
+
+from qtm_rt.packet import (
+    QRTPacketType,
+    QRTComponentType,
+    RTheader,
+    RTDataQRTPacket,
+    RTComponentData,
+    RT3DComponent,
+    RT6DComponent,
+    RTAnalogComponent,
+    RTAnalogDevice,
+    RTSampleNumber,
+    RTForceComponent,
+    RTForcePlate,
+    RTSkeletonComponent,
+    RTSegmentCount,
+)
+
+# pylint: disable=C0111
+
+
+def rt_packet(type_, body):
+    if isinstance(body, str):
+        body = body.encode() + b"\0"
+    return RTheader.pack(RTheader.size + len(body), type_.value) + body
+
+
+def component(type_, payload):
+    return RTComponentData.pack(RTComponentData.size + len(payload), type_.value) + payload
+
+
+def data_body(framenumber, components, timestamp=None):
+    if timestamp is None:
+        timestamp = framenumber * 10000
+    return RTDataQRTPacket.pack(timestamp, framenumber, len(components)) + b"".join(
+        components
+    )
+
+
+def data_packet(framenumber, components, timestamp=None):
+    return rt_packet(
+        QRTPacketType.PacketData, data_body(framenumber, components, timestamp)
+    )
+
+
+def markers_3d(positions, residual=False):
+    payload = RT3DComponent.format.pack(len(positions), 0, 0)
+    for position in positions:
+        payload += struct.pack("<%df" % len(position), *position)
+    return component(
+        QRTComponentType.Component3dRes if residual else QRTComponentType.Component3d,
+        payload,
+    )
+
+
+def markers_3d_no_label(markers):
+    payload = RT3DComponent.format.pack(len(markers), 0, 0)
+    for x, y, z, id_ in markers:
+        payload += struct.pack("<3fi", x, y, z, id_)
+    return component(QRTComponentType.Component3dNoLabels, payload)
+
+
+def bodies_6d(bodies):
+    payload = RT6DComponent.format.pack(len(bodies), 0, 0)
+    for position, matrix in bodies:
+        payload += struct.pack("<3f9f", *(tuple(position) + tuple(matrix)))
+    return component(QRTComponentType.Component6d, payload)
+
+
+def analog(devices):
+    """ devices is a list of (id, sample_number, [channel samples]) """
+    payload = RTAnalogComponent.format.pack(len(devices))
+    for device_id, sample_number, channels in devices:
+        sample_count = len(channels[0]) if channels else 0
+        payload += RTAnalogDevice.format.pack(device_id, len(channels), sample_count)
+        if sample_count > 0:
+            payload += RTSampleNumber.format.pack(sample_number)
+            for samples in channels:
+                payload += struct.pack("<%df" % sample_count, *samples)
+    return component(QRTComponentType.ComponentAnalog, payload)
+
+
+def force(plates):
+    """ plates is a list of (id, force_number, [9 float forces]) """
+    payload = RTForceComponent.format.pack(len(plates))
+    for plate_id, force_number, forces in plates:
+        payload += RTForcePlate.format.pack(plate_id, len(forces), force_number)
+        for values in forces:
+            payload += struct.pack("<9f", *values)
+    return component(QRTComponentType.ComponentForce, payload)
+
+
+def skeletons(skeleton_list):
+    """ skeleton_list is a list of [(id, position, quaternion)] """
+    payload = RTSkeletonComponent.format.pack(len(skeleton_list))
+    for segments in skeleton_list:
+        payload += RTSegmentCount.format.pack(len(segments))
+        for segment_id, position, rotation in segments:
+            payload += struct.pack("<i3f4f", segment_id, *(tuple(position) + tuple(rotation)))
+    return component(QRTComponentType.ComponentSkeleton, payload)
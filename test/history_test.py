@@ -0,0 +1,149 @@
+"""
+    Tests for FrameHistory and the windowed analysis
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import history  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, markers_3d, bodies_6d, analog, force  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+IDENTITY = (1, 0, 0, 0, 1, 0, 0, 0, 1)
+
+
+def test_ring_buffer_windows_are_contiguous_views():
+    ring = history.RingBuffer(4, (2,))
+    assert ring.last().shape == (0, 2)
+    for value in range(6):
+        ring.append([value, -value])
+    assert len(ring) == 4
+    window = ring.last()
+    assert window[:, 0].tolist() == [2, 3, 4, 5]
+    assert ring.last(2)[:, 0].tolist() == [4, 5]
+    assert window.base is not None
+    assert window.flags.c_contiguous
+    assert not window.flags.writeable
+
+    ring.extend(numpy.array([[6, 0], [7, 0], [8, 0]]))
+    assert ring.last()[:, 0].tolist() == [5, 6, 7, 8]
+    ring.extend(numpy.arange(20).reshape(10, 2))
+    assert ring.last()[:, 0].tolist() == [12, 14, 16, 18]
+
+
+def packet(framenumber, components):
+    return QRTPacket(data_body(framenumber, components, timestamp=framenumber * 10000))
+
+
+def test_frame_windows():
+    frames = history.FrameHistory(frames=5)
+    for framenumber in range(1, 9):
+        frames.add_packet(
+            packet(
+                framenumber,
+                [
+                    markers_3d([(framenumber, 0, 0), (0, framenumber, 0)]),
+                    bodies_6d([((framenumber, 0, 0), IDENTITY)]),
+                ],
+            )
+        )
+
+    assert len(frames) == 5
+    assert frames.framenumbers().tolist() == [4, 5, 6, 7, 8]
+    assert frames.timestamps(frames=2).tolist() == pytest.approx([0.07, 0.08])
+    assert frames.markers().shape == (5, 2, 3)
+    assert frames.markers(frames=3)[:, 0, 0].tolist() == [6, 7, 8]
+    # 10 ms between frames
+    assert frames.markers(seconds=0.02)[:, 1, 1].tolist() == [6, 7, 8]
+    assert frames.positions(since=7)[:, 0, 0].tolist() == [7, 8]
+    assert frames.rotations().shape == (5, 1, 3, 3)
+    assert frames.analog(1) is None
+
+
+def test_analog_and_force_windows():
+    frames = history.FrameHistory(frames=3)
+    for framenumber in range(1, 5):
+        first = framenumber * 10
+        frames.add_packet(
+            packet(
+                framenumber,
+                [
+                    analog([(1, first, [[first, first + 1], [-first, -first - 1]])]),
+                    force([(2, framenumber, [[framenumber] * 9])]),
+                ],
+            )
+        )
+
+    samples = frames.analog(1)
+    assert samples.shape == (6, 2)
+    assert samples[:, 0].tolist() == [20, 21, 30, 31, 40, 41]
+    assert frames.analog(1, frames=1)[:, 1].tolist() == [-40, -41]
+    assert frames.force(2)[:, 0].tolist() == [2, 3, 4]
+
+
+def test_missing_component_keeps_frames_aligned():
+    frames = history.FrameHistory(frames=10)
+    frames.add_packet(packet(1, [markers_3d([(1, 0, 0)])]))
+    frames.add_packet(packet(2, [analog([(1, 0, [[1, 2]])])]))
+    frames.add_packet(packet(3, [markers_3d([(3, 0, 0)]), analog([(1, 2, [[3, 4]])])]))
+
+    assert frames.markers()[:, 0, 0].tolist() == [1, 3]
+    assert frames.markers(frames=2)[:, 0, 0].tolist() == [3]
+    assert frames.analog(1, frames=2)[:, 0].tolist() == [1, 2, 3, 4]
+    assert frames.analog(1, frames=1)[:, 0].tolist() == [3, 4]
+
+
+def test_variable_chunk_sizes():
+    frames = history.FrameHistory(frames=4)
+    first = 0
+    sizes = [2, 2, 5, 3, 9, 1, 4]
+    for framenumber, size in enumerate(sizes, 1):
+        samples = list(range(first, first + size))
+        frames.add_packet(packet(framenumber, [analog([(1, first, [samples])])]))
+        first += size
+
+    # All samples of the 4 latest frames, 9 + 1 + 4 + 3
+    expected = list(range(sum(sizes[:3]), first))
+    assert frames.analog(1)[:, 0].tolist() == expected
+    assert frames.analog(1, frames=3)[:, 0].tolist() == expected[3:]
+    assert frames.analog(1, frames=1)[:, 0].tolist() == expected[-4:]
+
+
+def test_restart_and_shape_change():
+    frames = history.FrameHistory(frames=10)
+    frames.add_packet(packet(5, [markers_3d([(1, 0, 0)])]))
+    frames.add_packet(packet(6, [markers_3d([(1, 0, 0), (2, 0, 0)])]))
+    assert frames.markers().shape == (1, 2, 3)
+
+    frames.add_packet(packet(1, [markers_3d([(1, 0, 0), (2, 0, 0)])]))
+    assert frames.framenumbers().tolist() == [1]
+
+
+def test_derivative():
+    time = numpy.arange(10) * 0.1
+    values = numpy.stack([time ** 2, 3 * time], axis=-1)
+    out = numpy.empty(values.shape)
+    result = history.derivative(values, 0.1, out=out)
+    assert result is out
+    assert result[1:-1, 0] == pytest.approx(2 * time[1:-1])
+    assert result[:, 1] == pytest.approx(3)
+
+
+def test_rolling():
+    values = numpy.array([[1.0, 5], [3, 5], [2, 5], [8, 5]])
+    assert history.rolling_mean(values, 2).tolist() == [[2, 5], [2.5, 5], [5, 5]]
+    assert history.rolling_variance(values, 2)[:, 0].tolist() == [1, 0.25, 9]
+    assert history.rolling_min(values, 3)[:, 0].tolist() == [1, 2]
+    out = numpy.empty((2, 2))
+    assert history.rolling_max(values, 3, out=out) is out
+    assert out[:, 0].tolist() == [3, 8]
+
+
+def test_empty_history():
+    frames = history.FrameHistory()
+    assert frames.framenumbers(seconds=1).tolist() == []
+    assert frames.markers(seconds=1) is None
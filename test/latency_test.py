@@ -0,0 +1,109 @@
+"""
+    Tests for the latency socket profile
+"""
+
+import asyncio
+import socket
+
+import pytest
+
+from qtm_rt.latency import LatencyProfile, socket_options
+from qtm_rt.packet import QRTEvent, QRTPacketType
+from qtm_rt.protocol import QTMProtocol
+from qtm_rt.qrt import connect
+
+from .helpers import rt_packet
+
+# pylint: disable=W0621, C0111, W0212
+
+
+@pytest.fixture
+def tcp_socket():
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+    client = socket.create_connection(server.getsockname())
+    accepted, _ = server.accept()
+    yield client
+    for sock in (client, accepted, server):
+        sock.close()
+
+
+def test_apply(tcp_socket):
+    assert socket_options(tcp_socket)["nodelay"] is False
+
+    options = LatencyProfile(rcvbuf=1 << 16).apply(tcp_socket)
+
+    assert options["nodelay"] is True
+    assert options["rcvbuf"] >= 1 << 16
+
+
+def test_apply_nothing(tcp_socket):
+    before = socket_options(tcp_socket)
+    options = LatencyProfile(nodelay=False, quickack=False, rcvbuf=None).apply(tcp_socket)
+    assert options == before
+
+
+@pytest.mark.skipif(not hasattr(socket, "TCP_QUICKACK"), reason="Requires TCP_QUICKACK")
+def test_install_rearms_quickack(tcp_socket, mocker):
+    received = []
+    protocol = QTMProtocol(loop=mocker.MagicMock())
+    protocol.on_event = received.append
+    tcp_socket = mocker.MagicMock(wraps=tcp_socket)
+
+    LatencyProfile().install(protocol, tcp_socket)
+    assert "data_received" not in protocol.__dict__
+    protocol.data_received(
+        rt_packet(QRTPacketType.PacketEvent, bytes([QRTEvent.EventConnected.value]))
+    )
+
+    assert received == [QRTEvent.EventConnected]
+    tcp_socket.setsockopt.assert_called_once_with(
+        socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_connect_with_profile(tcp_socket, mocker):
+    async def set_version(*_):
+        pass
+
+    protocol = mocker.MagicMock()
+    protocol.set_version = set_version
+    transport = mocker.MagicMock()
+    transport.get_extra_info.return_value = tcp_socket
+
+    async def create_connection(*_):
+        return transport, protocol
+
+    mocker.patch.object(
+        asyncio.get_running_loop(),
+        "create_connection",
+        mocker.MagicMock(side_effect=create_connection),
+    )
+
+    connection = await connect("192.0.2.0", latency_profile=LatencyProfile())
+
+    transport.get_extra_info.assert_called_once_with("socket")
+    assert connection.socket_options["nodelay"] is True
+
+
+@pytest.mark.asyncio
+async def test_connect_without_profile(mocker):
+    async def set_version(*_):
+        pass
+
+    protocol = mocker.MagicMock()
+    protocol.set_version = set_version
+
+    async def create_connection(*_):
+        return None, protocol
+
+    mocker.patch.object(
+        asyncio.get_running_loop(),
+        "create_connection",
+        mocker.MagicMock(side_effect=create_connection),
+    )
+
+    connection = await connect("192.0.2.0")
+    assert connection.socket_options is None
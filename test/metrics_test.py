@@ -0,0 +1,86 @@
+"""
+    Tests for receive path metrics
+"""
+
+import pytest
+
+from qtm_rt.metrics import Histogram, Metrics
+from qtm_rt.packet import QRTPacketType
+from qtm_rt.receiver import Receiver
+
+from .helpers import rt_packet, data_packet, markers_3d
+
+# pylint: disable=W0621, C0111, W0212
+
+
+@pytest.fixture
+def receiver():
+    received = []
+    receiver = Receiver(
+        {
+            QRTPacketType.PacketCommand: received.append,
+            QRTPacketType.PacketData: received.append,
+        }
+    )
+    receiver.metrics = Metrics()
+    receiver.received = received
+    return receiver
+
+
+def test_histogram():
+    histogram = Histogram([1, 10])
+    for value in (0.5, 1, 5, 100):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.snapshot() == {
+        "buckets": [(1, 2), (10, 1), (float("inf"), 1)],
+        "sum": 106.5,
+        "count": 4,
+    }
+
+
+def test_receiver_metrics(receiver):
+    packet = data_packet(1, [markers_3d([(1, 2, 3)])])
+    command = rt_packet(QRTPacketType.PacketCommand, "Ok")
+
+    receiver.data_received(command + packet[:10])
+    receiver.data_received(packet[10:])
+
+    snapshot = receiver.metrics.snapshot()
+    assert len(receiver.received) == 2
+    assert snapshot["received_bytes"] == len(command) + len(packet)
+    assert snapshot["packets"] == {"PacketCommand": 1, "PacketData": 1}
+    assert snapshot["parse_seconds"]["count"] == 2
+    assert snapshot["callback_seconds"]["count"] == 2
+    assert snapshot["buffered_bytes"]["buckets"][1] == (64, 1)
+    assert snapshot["buffered_bytes"]["buckets"][0] == (0, 1)
+
+
+def test_disabled(receiver):
+    metrics, receiver.metrics = receiver.metrics, None
+    receiver.data_received(rt_packet(QRTPacketType.PacketCommand, "Ok"))
+
+    assert receiver.received == [b"Ok"]
+    assert metrics.received_bytes == 0
+
+
+def test_reset(receiver):
+    receiver.data_received(rt_packet(QRTPacketType.PacketCommand, "Ok"))
+    receiver.metrics.reset()
+    snapshot = receiver.metrics.snapshot()
+    assert snapshot["received_bytes"] == 0
+    assert snapshot["packets"] == {}
+    assert snapshot["parse_seconds"]["count"] == 0
+
+
+def test_prometheus(receiver):
+    receiver.data_received(rt_packet(QRTPacketType.PacketCommand, "Ok"))
+    text = receiver.metrics.prometheus(labels={"host": "qtm"})
+
+    assert "# TYPE qtm_rt_received_bytes_total counter" in text
+    assert 'qtm_rt_received_bytes_total{host="qtm"} 11' in text
+    assert 'qtm_rt_packets_total{host="qtm",type="PacketCommand"} 1' in text
+    assert 'qtm_rt_parse_seconds_bucket{host="qtm",le="+Inf"} 1' in text
+    assert 'qtm_rt_parse_seconds_count{host="qtm"} 1' in text
+    assert text.endswith("\n")
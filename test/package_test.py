@@ -0,0 +1,48 @@
+"""
+    Tests for the qtm_rt package namespace
+"""
+
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+
+import qtm_rt
+
+# pylint: disable=C0111
+
+
+def test_import_has_no_side_effects():
+    script = (
+        "import logging, sys, qtm_rt; "
+        "print('asyncio' in sys.modules, len(logging.getLogger().handlers))"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", script],
+        universal_newlines=True,
+        env={"PYTHONPATH": os.pathsep.join(sys.path)},
+    )
+    assert output.split() == ["False", "0"]
+
+
+@pytest.mark.parametrize("name", qtm_rt._LAZY_ATTRIBUTES)  # pylint: disable=W0212
+def test_lazy_attributes(name):
+    assert getattr(qtm_rt, name).__name__ == name
+    assert name in dir(qtm_rt)
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        qtm_rt.does_not_exist  # pylint: disable=W0104
+
+
+def test_setup_logging(mocker):
+    basic_config = mocker.patch("logging.basicConfig")
+    mocker.patch.dict("os.environ", {"QTM_LOGGING": "debug"})
+    qtm_rt.setup_logging()
+    assert basic_config.call_args[1]["level"] == logging.DEBUG
+
+    qtm_rt.setup_logging(logging.WARNING)
+    assert basic_config.call_args[1]["level"] == logging.WARNING
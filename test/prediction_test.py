@@ -0,0 +1,125 @@
+"""
+    Tests for PosePredictor
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import transforms  # pylint: disable=C0413
+from qtm_rt.prediction import PosePredictor  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, bodies_6d  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+NAN = float("nan")
+FREQUENCY = 100.0
+
+
+def pose(time):
+    """ Moves 100 units / s along x and turns 90 degrees / s about z """
+    return [time * 100, 0, 0], transforms.euler_to_matrix([0, 0, time * 90])
+
+
+def feed(predictor, frames, bodies=1):
+    for frame in range(frames):
+        time = frame / FREQUENCY
+        position, rotation = pose(time)
+        predictor.update([position] * bodies, [rotation] * bodies, time, received=time)
+
+
+def test_extrapolates_linear_and_angular_motion():
+    predictor = PosePredictor()
+    feed(predictor, 100, bodies=2)
+
+    positions, rotations = predictor.predict(0.99 + 0.05)
+    expected_position, expected_rotation = pose(1.04)
+    assert positions == pytest.approx(numpy.array([expected_position] * 2), abs=1e-6)
+    assert rotations[1] == pytest.approx(expected_rotation, abs=1e-6)
+    assert predictor.linear_velocity[0] == pytest.approx([100, 0, 0])
+    assert predictor.angular_velocity[0] == pytest.approx([0, 0, numpy.pi / 2])
+
+
+def test_horizon_limits_extrapolation():
+    predictor = PosePredictor(horizon=0.02)
+    feed(predictor, 100)
+    positions, _ = predictor.predict(1.2)
+    assert positions[0, 0] == pytest.approx(101)
+
+
+def test_untracked_and_stale_bodies():
+    predictor = PosePredictor(max_age=0.125)
+    feed(predictor, 50, bodies=2)
+
+    position, rotation = pose(0.5)
+    predictor.update(
+        [position, [NAN] * 3], [rotation, numpy.full((3, 3), NAN)], 0.5, received=0.5
+    )
+    positions, rotations = predictor.predict(0.52)
+    # The untracked body continues from its latest pose
+    assert positions[1] == pytest.approx(pose(0.52)[0], abs=1e-6)
+    assert not numpy.isnan(rotations).any()
+
+    positions, rotations = predictor.predict(0.62)
+    assert not numpy.isnan(positions[0]).any()
+    assert numpy.isnan(positions[1]).all()
+    assert numpy.isnan(rotations[1]).all()
+
+
+def test_never_tracked_body_is_nan():
+    predictor = PosePredictor()
+    predictor.update([[NAN] * 3], [numpy.full((3, 3), NAN)], 0.0, received=0.0)
+    positions, _ = predictor.predict(0.0)
+    assert numpy.isnan(positions).all()
+
+
+def test_predict_now_uses_fastest_frame():
+    now = [0.0]
+    predictor = PosePredictor(clock=lambda: now[0])
+    assert predictor.predict_now() is None
+
+    for frame in range(10):
+        time = frame / FREQUENCY
+        position, rotation = pose(time)
+        # Local clock is 1000 s ahead of QTM, frames arrive 2 to 7 ms late
+        now[0] = 1000 + time + 0.002 + 0.005 * (frame % 2)
+        predictor.update([position], [rotation], time)
+
+    now[0] = 1000.092
+    positions, _ = predictor.predict_now(ahead=0.002)
+    assert positions[0, 0] == pytest.approx(9.2, abs=1e-3)
+
+
+def test_predict_now_follows_clock_drift():
+    now = [0.0]
+    predictor = PosePredictor(clock=lambda: now[0], clock_window=1.0)
+
+    for frame in range(1000):
+        time = frame / FREQUENCY
+        position, rotation = pose(time)
+        # Local clock runs 0.1 % faster than QTM's, 10 ms ahead after 10 s
+        now[0] = 1000 + time * 1.001 + 0.002
+        predictor.update([position], [rotation], time)
+
+    positions, _ = predictor.predict_now()
+    assert positions[0, 0] == pytest.approx(999, abs=0.15)
+
+
+def test_add_packet_and_restart():
+    rotation = (1, 0, 0, 0, 1, 0, 0, 0, 1)
+    predictor = PosePredictor()
+    for framenumber, x in ((1, 0), (2, 1)):
+        predictor.add_packet(
+            QRTPacket(data_body(framenumber, [bodies_6d([((x, 0, 0), rotation)])])),
+            received=0,
+        )
+    assert predictor.linear_velocity[0, 0] > 0
+
+    # Timestamps restarting is a new measurement
+    predictor.add_packet(
+        QRTPacket(data_body(1, [bodies_6d([((5, 0, 0), rotation)])])), received=0
+    )
+    assert predictor.linear_velocity[0].tolist() == [0, 0, 0]
+    assert predictor.predict(0.02)[0][0].tolist() == [5, 0, 0]
@@ -3,6 +3,7 @@
 """
 
 import asyncio
+import io
 
 import pytest
 
@@ -526,3 +527,78 @@ async def test_set_qtm_event_fail(a_qrt):
 
 
 # TODO XML test
+
+
+@pytest.mark.asyncio
+async def test_get_capture_c3d(a_qrt, tmp_path):
+    async def sending(*_):
+        return b"Sending capture"
+
+    async def transfer():
+        return "done"
+
+    a_qrt._protocol.send_command.side_effect = sending
+    a_qrt._protocol.receive_file.side_effect = lambda *_: transfer()
+
+    path = tmp_path / "capture.c3d"
+    assert await a_qrt.get_capture_c3d(str(path)) == "done"
+    a_qrt._protocol.send_command.assert_called_once_with("getcapturec3d")
+    assert path.exists()
+
+
+@pytest.mark.asyncio
+async def test_get_capture_qtm_fail(a_qrt, mocker):
+    async def fail(*_):
+        return b"No capture to get"
+
+    a_qrt._protocol.send_command.side_effect = fail
+    a_qrt._protocol.receive_file.side_effect = lambda *_: mocker.MagicMock()
+
+    with pytest.raises(QRTCommandException):
+        await a_qrt.get_capture_qtm(io.BytesIO())
+    a_qrt._protocol.send_command.assert_called_once_with("getcaptureqtm")
+    assert a_qrt._protocol.cancel_file.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_pipeline(a_qrt):
+    async def response():
+        return b"Ok"
+
+    a_qrt._protocol.send_commands.side_effect = lambda commands: [
+        response() for _ in commands
+    ]
+
+    result = await a_qrt.pipeline(["qtmversion", "byteorder"])
+    assert result == [b"Ok", b"Ok"]
+    a_qrt._protocol.send_commands.assert_called_once_with(["qtmversion", "byteorder"])
+
+
+def test_enable_metrics(a_qrt):
+    metrics = a_qrt.enable_metrics()
+    assert a_qrt.metrics is metrics
+    a_qrt._protocol.set_metrics.assert_called_once_with(metrics)
+
+    a_qrt.disable_metrics()
+    assert a_qrt.metrics is None
+    a_qrt._protocol.set_metrics.assert_called_with(None)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_wraps_on_packet(a_qrt):
+    packets = []
+    a_qrt._protocol.loop = asyncio.get_running_loop()
+    a_qrt._protocol.on_packet = None
+    watchdog = await a_qrt.start_watchdog(frequency=100)
+    await a_qrt.stream_frames(
+        frames="frequencydivisor:2", components=["3d"], on_packet=packets.append
+    )
+
+    on_packet = a_qrt._protocol.set_on_packet.call_args[0][0]
+    assert on_packet.__wrapped__ == packets.append
+    assert watchdog.period == pytest.approx(0.02)
+
+    a_qrt._protocol.on_packet = on_packet
+    a_qrt.stop_watchdog()
+    assert a_qrt._protocol.on_packet == packets.append
+    assert a_qrt.watchdog is None
@@ -3,11 +3,14 @@
 """
 
 import asyncio
+import io
 
 import pytest
 
 from qtm_rt.protocol import QTMProtocol, QRTCommandException
-from qtm_rt.packet import QRTEvent, RTEvent
+from qtm_rt.packet import QRTEvent, RTEvent, QRTPacketType
+
+from .helpers import rt_packet
 
 # pylint: disable=W0621, C0111, W0212
 
@@ -72,10 +75,107 @@ async def test_await_multiple(qtmprotocol: QTMProtocol):
     loop = asyncio.get_event_loop()
     awaitable1 = loop.create_task(qtmprotocol.await_event(event=QRTEvent.EventConnected))
     awaitable2 = loop.create_task(qtmprotocol.await_event(event=QRTEvent.EventConnectionClosed))
+    awaitable3 = loop.create_task(qtmprotocol.await_event(timeout=1))
+    await asyncio.sleep(0)
+
+    qtmprotocol._on_event(QRTEvent.EventConnectionClosed)
+    qtmprotocol._on_event(QRTEvent.EventConnected)
+
+    assert await awaitable1 == QRTEvent.EventConnected
+    assert await awaitable2 == QRTEvent.EventConnectionClosed
+    assert await awaitable3 == QRTEvent.EventConnectionClosed
+
+
+@pytest.mark.asyncio
+async def test_receive_file_in_chunks(qtmprotocol: QTMProtocol, mocker):
+    qtmprotocol.connection_made(mocker.MagicMock())
+    output = io.BytesIO()
+    progress = []
+    transfer = qtmprotocol.receive_file(output, on_progress=progress.append)
+
+    content = bytes(range(256)) * 40
+    data = rt_packet(QRTPacketType.PacketC3DFile, content) + rt_packet(
+        QRTPacketType.PacketCommand, "Ok"
+    )
+    for start in range(0, len(data), 1000):
+        qtmprotocol.data_received(data[start : start + 1000])
+        assert len(qtmprotocol._receiver._received_data) < 1000
+
+    result = await transfer
+    assert output.getvalue() == content
+    assert result.received == result.size == len(content)
+    assert [entry.received for entry in progress][-1] == len(content)
+    assert len(progress) == 11
+
+
+@pytest.mark.asyncio
+async def test_receive_file_twice(qtmprotocol: QTMProtocol, mocker):
+    qtmprotocol.connection_made(mocker.MagicMock())
+    qtmprotocol.receive_file(io.BytesIO())
+    with pytest.raises(QRTCommandException):
+        qtmprotocol.receive_file(io.BytesIO())
+
+
+@pytest.mark.asyncio
+async def test_responses_fifo(qtmprotocol: QTMProtocol, mocker):
+    qtmprotocol.connection_made(mocker.MagicMock())
+    first = qtmprotocol.send_command("qtmversion")
+    parameters = qtmprotocol.send_command("getparameters 3d")
+    second = qtmprotocol.send_command("byteorder")
+
+    qtmprotocol.data_received(
+        rt_packet(QRTPacketType.PacketCommand, "QTM Version is 2024")
+        + rt_packet(QRTPacketType.PacketCommand, "Byte order is little endian")
+        + rt_packet(QRTPacketType.PacketXML, "<xml/>")
+    )
+
+    assert await first == b"QTM Version is 2024"
+    assert await second == b"Byte order is little endian"
+    assert await parameters == b"<xml/>"
 
-    done, _ = await asyncio.wait(
-        [awaitable1, awaitable2], return_when=asyncio.FIRST_EXCEPTION
+
+@pytest.mark.asyncio
+async def test_error_to_oldest_request(qtmprotocol: QTMProtocol, mocker):
+    qtmprotocol.connection_made(mocker.MagicMock())
+    calibration = qtmprotocol.receive_response()
+    parameters = qtmprotocol.send_command("getparameters fail")
+    command = qtmprotocol.send_command("qtmversion")
+
+    qtmprotocol.data_received(
+        rt_packet(QRTPacketType.PacketError, "Parse error")
+        + rt_packet(QRTPacketType.PacketCommand, "QTM Version is 2024")
     )
 
-    with pytest.raises(Exception):
-        done.pop().result()
+    with pytest.raises(QRTCommandException):
+        await parameters
+    assert await command == b"QTM Version is 2024"
+    assert not calibration.done()
+
+
+@pytest.mark.asyncio
+async def test_send_commands_single_write(qtmprotocol: QTMProtocol, mocker):
+    qtmprotocol.connection_made(mocker.MagicMock())
+    futures = qtmprotocol.send_commands(["qtmversion", "getstate", "byteorder"])
+
+    assert qtmprotocol.transport.write.call_count == 1
+    assert futures[1].result() is None
+
+    qtmprotocol.data_received(
+        rt_packet(QRTPacketType.PacketCommand, "a")
+        + rt_packet(QRTPacketType.PacketCommand, "b")
+    )
+    assert [await futures[0], await futures[2]] == [b"a", b"b"]
+
+
+@pytest.mark.asyncio
+async def test_timed_out_request_keeps_order(qtmprotocol: QTMProtocol, mocker):
+    qtmprotocol.connection_made(mocker.MagicMock())
+    first = qtmprotocol.send_command("qtmversion")
+    second = qtmprotocol.send_command("byteorder")
+    first.cancel()
+
+    qtmprotocol.data_received(
+        rt_packet(QRTPacketType.PacketCommand, "a")
+        + rt_packet(QRTPacketType.PacketCommand, "b")
+    )
+    assert await second == b"b"
@@ -0,0 +1,99 @@
+"""
+    Tests for Receiver framing and dispatch
+"""
+
+import pytest
+
+from qtm_rt.metrics import Metrics
+from qtm_rt.packet import QRTPacketType, QRTEvent
+from qtm_rt.receiver import Receiver
+from qtm_rt.tracing import ChromeTrace, trace_receiver, untrace_receiver
+
+from .helpers import rt_packet, data_packet, markers_3d
+
+# pylint: disable=W0621, C0111, W0212
+
+
+@pytest.fixture
+def received():
+    return []
+
+
+@pytest.fixture
+def receiver(received):
+    return Receiver(
+        {
+            type_: (lambda type_: lambda data: received.append((type_, data)))(type_)
+            for type_ in (
+                QRTPacketType.PacketCommand,
+                QRTPacketType.PacketData,
+                QRTPacketType.PacketEvent,
+            )
+        }
+    )
+
+
+def test_many_packets_in_one_read(receiver, received):
+    packets = [data_packet(i, [markers_3d([(i, 0, 0)])]) for i in range(5)]
+    event = rt_packet(QRTPacketType.PacketEvent, bytes([QRTEvent.EventConnected.value]))
+    command = rt_packet(QRTPacketType.PacketCommand, "Ok")
+    receiver.data_received(packets[0] + command + b"".join(packets[1:]) + event)
+
+    assert [type_ for type_, _ in received] == [
+        QRTPacketType.PacketData,
+        QRTPacketType.PacketCommand,
+    ] + [QRTPacketType.PacketData] * 4 + [QRTPacketType.PacketEvent]
+    framenumbers = [
+        data.framenumber for type_, data in received if type_ == QRTPacketType.PacketData
+    ]
+    assert framenumbers == list(range(5))
+    assert received[1][1] == b"Ok"
+    assert received[-1][1] == QRTEvent.EventConnected
+    assert receiver._received_data == b""
+
+
+@pytest.mark.parametrize("split", [1, 7, 8, 20])
+def test_split_data_packet(receiver, received, split):
+    packet = data_packet(3, [markers_3d([(1, 2, 3)])])
+    receiver.data_received(packet[:split])
+    assert received == []
+    receiver.data_received(packet[split:] + packet[:split])
+    receiver.data_received(packet[split:])
+
+    assert [data.framenumber for _, data in received] == [3, 3]
+
+
+def test_data_packet_without_fast_path(receiver, received):
+    receiver.metrics = Metrics()
+    assert receiver._data_handler is None
+
+    receiver.data_received(data_packet(1, []))
+    assert received[0][1].framenumber == 1
+
+    receiver.metrics = None
+    assert receiver._data_handler is not None
+
+
+def test_traced_receiver_without_fast_path(receiver, received):
+    trace = ChromeTrace()
+    trace_receiver(receiver, trace)
+    receiver.metrics = None
+    assert receiver._data_handler is None
+
+    receiver.data_received(data_packet(1, []))
+    assert received[0][1].framenumber == 1
+    assert "dispatch" in [span[0] for span in trace.spans]
+
+    untrace_receiver(receiver)
+    assert receiver._data_handler is not None
+
+
+def test_unhandled_packet_type(receiver, received, caplog):
+    receiver.data_received(rt_packet(QRTPacketType.PacketXML, "<xml/>"))
+    assert received == []
+    assert "Non handled packet type" in caplog.text
+
+
+def test_unknown_packet_type(receiver):
+    with pytest.raises(ValueError):
+        receiver.data_received(b"\x09\x00\x00\x00\x63\x00\x00\x00\x00")
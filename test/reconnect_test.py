@@ -0,0 +1,150 @@
+"""
+    Tests for ReconnectingConnection
+"""
+
+import asyncio
+
+import pytest
+
+from qtm_rt.reconnect import ReconnectingConnection, QRTStreamGap
+from qtm_rt.packet import QRTPacket
+from qtm_rt.protocol import QRTCommandException
+
+from .helpers import data_body
+
+# pylint: disable=W0621, C0111, W0212
+
+
+def make_connection(mocker, connections):
+    connection = mocker.MagicMock(name="QRTConnection")
+    connection.has_transport.return_value = True
+
+    async def ok(*_, **__):
+        return b"Ok"
+
+    connection.stream_frames.side_effect = ok
+    connection.take_control.side_effect = ok
+    connections.append(connection)
+    return connection
+
+
+@pytest.fixture
+def fake_connect(mocker):
+    connections = []
+    callbacks = []
+
+    async def connect(*_, on_disconnect=None, **__):
+        callbacks.append(on_disconnect)
+        return make_connection(mocker, connections)
+
+    mocker.patch("qtm_rt.reconnect.connect", side_effect=connect)
+    return connections, callbacks
+
+
+@pytest.mark.asyncio
+async def test_reconnect_replays_state(fake_connect):
+    connections, callbacks = fake_connect
+    gaps = []
+    packets = []
+    reconnected = asyncio.Event()
+
+    connection = ReconnectingConnection(
+        "192.0.2.0", on_gap=gaps.append, on_reconnect=reconnected.set, backoff=0
+    )
+    assert await connection.connect()
+    await connection.take_control("password")
+    await connection.stream_frames(components=["3d"], on_packet=packets.append)
+
+    on_packet = connections[0].stream_frames.call_args[1]["on_packet"]
+    on_packet(QRTPacket(data_body(10, [])))
+
+    callbacks[0](None)
+    assert connection.connection is None
+    await asyncio.wait_for(reconnected.wait(), 1)
+
+    assert len(connections) == 2
+    connections[1].take_control.assert_called_once_with("password")
+    assert connections[1].stream_frames.call_args[1]["components"] == ["3d"]
+
+    on_packet = connections[1].stream_frames.call_args[1]["on_packet"]
+    on_packet(QRTPacket(data_body(15, [])))
+    on_packet(QRTPacket(data_body(16, [])))
+
+    assert gaps == [QRTStreamGap(10, 15, 4)]
+    assert [packet.framenumber for packet in packets] == [10, 15, 16]
+    assert connection.reconnect_count == 1
+
+
+@pytest.mark.asyncio
+async def test_no_reconnect_after_disconnect(fake_connect):
+    connections, callbacks = fake_connect
+    connection = ReconnectingConnection("192.0.2.0", backoff=0)
+    await connection.connect()
+
+    connection.disconnect()
+    callbacks[0](None)
+    await asyncio.sleep(0.01)
+
+    assert len(connections) == 1
+    assert connections[0].disconnect.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_while_reconnecting(fake_connect):
+    connections, callbacks = fake_connect
+    packets = []
+    connection = ReconnectingConnection("192.0.2.0", backoff=10)
+    await connection.connect()
+    await connection.stream_frames(components=["3d"], on_packet=packets.append)
+    on_packet = connections[0].stream_frames.call_args[1]["on_packet"]
+
+    callbacks[0](None)
+    with pytest.raises(QRTCommandException):
+        await connection.take_control("password")
+    with pytest.raises(QRTCommandException):
+        await connection.stream_frames_stop()
+
+    # A frame in flight after the stop is dropped
+    on_packet(QRTPacket(data_body(3, [])))
+    assert packets == []
+    connection.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_retries_after_any_error(fake_connect, mocker):
+    connections, callbacks = fake_connect
+    reconnected = asyncio.Event()
+    connection = ReconnectingConnection("192.0.2.0", on_reconnect=reconnected.set, backoff=0)
+    await connection.connect()
+    await connection.take_control("password")
+
+    failures = []
+
+    async def take_control(*_, **__):
+        failures.append(True)
+        raise ConnectionError("Connection reset")
+
+    original = make_connection
+
+    def failing_once(mocker_, connections_):
+        created = original(mocker_, connections_)
+        if not failures:
+            created.take_control.side_effect = take_control
+        return created
+
+    mocker.patch(__name__ + ".make_connection", side_effect=failing_once)
+    callbacks[0](None)
+    await asyncio.wait_for(reconnected.wait(), 1)
+
+    assert failures == [True]
+    assert len(connections) == 3
+    assert connections[1].disconnect.call_count == 1
+    assert connection.connection is connections[2]
+    assert connection._reconnect_task is None
+
+    # The next loss starts a new reconnect
+    reconnected.clear()
+    callbacks[2](None)
+    await asyncio.wait_for(reconnected.wait(), 1)
+    assert connection.reconnect_count == 2
+    connection.disconnect()
@@ -0,0 +1,137 @@
+"""
+    Tests for QRTRelay
+"""
+
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+import qtm_rt
+from qtm_rt.relay import QRTRelay, filter_components
+from qtm_rt.packet import QRTPacket, QRTComponentType, QRTEvent
+
+from .helpers import data_body, markers_3d, bodies_6d
+
+# pylint: disable=W0621, C0111, W0212
+
+
+def make_frame(framenumber):
+    return QRTPacket(
+        data_body(
+            framenumber,
+            [markers_3d([(1, 2, 3)]), bodies_6d([((4, 5, 6), range(9))])],
+        )
+    )
+
+
+def test_filter_components():
+    packet = QRTPacket(filter_components(make_frame(3).data, {QRTComponentType.Component6d}))
+    assert packet.framenumber == 3
+    assert list(packet.components) == [QRTComponentType.Component6d]
+    _, bodies = packet.get_6d()
+    assert bodies[0][0].x == 4
+
+
+@pytest_asyncio.fixture
+async def relay(mocker):
+    upstream = mocker.MagicMock(name="QRTConnection")
+    upstream.has_transport.return_value = False
+
+    async def stream_frames(**kwargs):
+        upstream.on_packet = kwargs["on_packet"]
+        return b"Ok"
+
+    async def pipeline(commands):
+        upstream.pipeline_calls.append(commands)
+        return [b"<QTM_Parameters/>"]
+
+    upstream.pipeline_calls = []
+    upstream.stream_frames.side_effect = stream_frames
+    upstream.pipeline.side_effect = pipeline
+
+    relay = QRTRelay(upstream, components=["3d", "6d"])
+    await relay.start(port=0)
+    yield relay
+    await relay.stop()
+
+
+async def connect_client(relay):
+    port = relay.sockets[0].getsockname()[1]
+    connection = await qtm_rt.connect("127.0.0.1", port=port)
+    assert connection is not None
+    return connection
+
+
+@pytest.mark.asyncio
+async def test_parameters_cached(relay):
+    first = await connect_client(relay)
+    second = await connect_client(relay)
+
+    assert await first.get_parameters(["3d"]) == b"<QTM_Parameters/>"
+    assert await second.get_parameters(["3d"]) == b"<QTM_Parameters/>"
+    assert relay.connection.pipeline_calls == [["getparameters 3d"]]
+
+    first.disconnect()
+    second.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_stream_filtered(relay):
+    client = await connect_client(relay)
+    packets = asyncio.Queue()
+
+    relay.connection.on_packet(make_frame(1))
+    await client.stream_frames(components=["6d"], on_packet=packets.put_nowait)
+    relay.connection.on_packet(make_frame(2))
+
+    assert (await asyncio.wait_for(packets.get(), 1)).framenumber == 1
+    packet = await asyncio.wait_for(packets.get(), 1)
+    assert packet.framenumber == 2
+    assert list(packet.components) == [QRTComponentType.Component6d]
+
+    with pytest.raises(qtm_rt.QRTCommandException):
+        await client.stream_frames(components=["analog"])
+
+    client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_events_and_slow_client(relay):
+    events = asyncio.Queue()
+    port = relay.sockets[0].getsockname()[1]
+    client = await qtm_rt.connect("127.0.0.1", port=port, on_event=events.put_nowait)
+    await client.stream_frames(components=["3d"], on_packet=lambda _: None)
+
+    relay._event(QRTEvent.EventCaptureStarted)
+    assert await asyncio.wait_for(events.get(), 1) == QRTEvent.EventCaptureStarted
+
+    relay_client = relay.clients[0]
+    relay_client.pause_writing()
+    relay.connection.on_packet(make_frame(5))
+    assert relay_client.frames_dropped == 1
+
+    client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_upstream_timeout(relay):
+    calls = []
+
+    async def pipeline(commands):
+        calls.append(commands)
+        if len(calls) == 1:
+            raise asyncio.TimeoutError()
+        return [b"<QTM_Parameters/>"]
+
+    relay.connection.pipeline.side_effect = pipeline
+    client = await connect_client(relay)
+
+    with pytest.raises(qtm_rt.QRTCommandException) as error:
+        await client.get_parameters(["3d"])
+    assert "TimeoutError" in str(error.value)
+
+    # The client is still served and the failure was not cached
+    assert await client.get_parameters(["3d"]) == b"<QTM_Parameters/>"
+    assert len(calls) == 2
+    client.disconnect()
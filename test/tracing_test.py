@@ -0,0 +1,106 @@
+"""
+    Tests for receive pipeline tracing
+"""
+
+import io
+import json
+
+import pytest
+
+from qtm_rt.protocol import QTMProtocol
+from qtm_rt.receiver import Receiver
+from qtm_rt.packet import QRTPacketType
+from qtm_rt.tracing import (
+    ChromeTrace,
+    Tracer,
+    trace_protocol,
+    trace_receiver,
+    untrace_protocol,
+)
+
+from .helpers import rt_packet, data_packet, markers_3d
+
+# pylint: disable=W0621, C0111, W0212
+
+
+@pytest.fixture
+def protocol(event_loop, mocker):
+    protocol = QTMProtocol(loop=event_loop)
+    protocol.connection_made(mocker.MagicMock())
+    return protocol
+
+
+def test_trace_stages(protocol):
+    trace = ChromeTrace()
+    packets = []
+    trace_protocol(protocol, trace)
+    protocol.set_on_packet(packets.append)
+
+    protocol.data_received(data_packet(3, [markers_3d([(1, 2, 3)])]))
+
+    assert len(packets) == 1
+    stages = [span[0] for span in trace.spans]
+    assert stages == ["parse", "callback", "dispatch", "framing"]
+    assert trace.spans[0][4]["type"] == "PacketData"
+    assert trace.spans[1][4]["framenumber"] == 3
+    for _, start, end, _, _ in trace.spans:
+        assert start <= end
+
+
+def test_untrace(protocol):
+    trace = ChromeTrace()
+    packets = []
+    protocol.set_on_packet(packets.append)
+    trace_protocol(protocol, trace)
+    untrace_protocol(protocol)
+
+    assert protocol.on_packet == packets.append
+    assert "data_received" not in protocol._receiver.__dict__
+    assert "set_on_packet" not in protocol.__dict__
+
+    protocol.data_received(data_packet(3, [markers_3d([(1, 2, 3)])]))
+    assert len(packets) == 1
+    assert not trace.spans
+
+
+def test_traced_callback_raises(protocol):
+    trace = ChromeTrace()
+    trace_protocol(protocol, trace)
+
+    def on_packet(_):
+        raise ValueError()
+
+    protocol.set_on_packet(on_packet)
+    with pytest.raises(ValueError):
+        protocol.data_received(data_packet(3, []))
+    assert [span[0] for span in trace.spans] == ["parse", "callback", "dispatch", "framing"]
+
+
+def test_chrome_trace_write():
+    trace = ChromeTrace(max_events=2)
+    receiver = Receiver({QRTPacketType.PacketCommand: lambda _: None})
+    trace_receiver(receiver, trace)
+    receiver.data_received(rt_packet(QRTPacketType.PacketCommand, "Ok"))
+
+    output = io.StringIO()
+    trace.write(output)
+    events = json.loads(output.getvalue())["traceEvents"]
+
+    assert [event["name"] for event in events] == ["dispatch", "framing"]
+    assert events[1]["ph"] == "X"
+    assert events[1]["args"] == {"bytes": 11}
+    assert events[1]["dur"] >= events[0]["dur"]
+
+
+def test_tracer_requires_span():
+    class Incomplete(Tracer):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+    class Counting(Tracer):
+        def span(self, stage, start, end, args):
+            pass
+
+    Counting()
@@ -0,0 +1,104 @@
+"""
+    Tests for MarkerTracker
+"""
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import tracking  # pylint: disable=C0413
+from qtm_rt.packet import QRTPacket  # pylint: disable=C0413
+
+from .helpers import data_body, markers_3d_no_label  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+NAN = float("nan")
+
+
+def brute_force_pairs(previous, current, radius):
+    distances = numpy.linalg.norm(previous[:, None] - current[None], axis=-1)
+    return set(zip(*numpy.nonzero(distances <= radius)))
+
+
+def test_neighbours_match_brute_force():
+    rng = numpy.random.default_rng(4)
+    previous = rng.uniform(-500, 500, (400, 3))
+    current = previous + rng.normal(0, 15, previous.shape)
+
+    tracks, points, distances = tracking.neighbours(previous, current, 30)
+    assert set(zip(tracks, points)) == brute_force_pairs(previous, current, 30)
+    assert distances == pytest.approx(
+        numpy.linalg.norm(previous[tracks] - current[points], axis=-1)
+    )
+
+    empty = tracking.neighbours(previous[:0], current, 30)
+    assert [len(values) for values in empty] == [0, 0, 0]
+
+
+def test_greedy_takes_nearest_first():
+    # Previous 0 is nearest to current 0, which leaves current 1 for previous 1
+    previous = numpy.array([0, 0, 1, 1])
+    current = numpy.array([0, 1, 0, 1])
+    distances = numpy.array([1.0, 2.0, 1.5, 5.0])
+    matched = tracking.assign_greedy(previous, current, distances)
+    assert sorted(zip(*matched)) == [(0, 0), (1, 1)]
+
+
+def test_hungarian_minimizes_total():
+    pytest.importorskip("scipy")
+    previous = numpy.array([0, 0, 1, 2])
+    current = numpy.array([0, 1, 0, 2])
+    distances = numpy.array([1.0, 2.0, 1.5, 1.0])
+    # Greedy gives 0-0 and leaves previous 1 unmatched, 0-1 and 1-0 is shorter in total
+    matched = tracking.assign_hungarian(previous, current, distances)
+    assert sorted(zip(*matched)) == [(0, 1), (1, 0), (2, 2)]
+    assert sorted(zip(*tracking.assign_greedy(previous, current, distances))) == [
+        (0, 0),
+        (2, 2),
+    ]
+
+
+@pytest.mark.parametrize("method", ["greedy", "hungarian"])
+def test_keeps_ids_of_moving_markers(method):
+    if method == "hungarian":
+        pytest.importorskip("scipy")
+    rng = numpy.random.default_rng(5)
+    start = rng.uniform(-1000, 1000, (2000, 3))
+    velocity = rng.normal(0, 2, start.shape)
+    tracker = tracking.MarkerTracker(max_distance=15, method=method)
+
+    first = tracker.update(start)
+    assert first.tolist() == list(range(2000))
+    for frame in range(1, 20):
+        order = rng.permutation(len(start))
+        ids = tracker.update((start + velocity * frame)[order])
+        assert (ids == first[order]).mean() > 0.99
+    assert tracker.next_id < 2100
+
+
+def test_new_lost_and_missing_markers():
+    tracker = tracking.MarkerTracker(max_distance=10, max_missing=1)
+    assert tracker.update([[0, 0, 0], [100, 0, 0]]).tolist() == [0, 1]
+    assert tracker.update([[100, 1, 0], [NAN] * 3, [500, 0, 0]]).tolist() == [1, -1, 2]
+    # Marker 0 returns within max_missing
+    assert tracker.update([[0, 0, 1], [100, 2, 0]]).tolist() == [0, 1]
+    tracker.update([[0, 0, 1]])
+    tracker.update([[0, 0, 1]])
+    # Marker 1 was missing for more than max_missing frames
+    assert tracker.update([[0, 0, 1], [100, 3, 0]]).tolist() == [0, 3]
+
+
+def test_wrap():
+    tracker = tracking.MarkerTracker(max_distance=10)
+    frames = []
+    on_packet = tracker.wrap(frames.append)
+    for framenumber, x in ((1, 0), (2, 3)):
+        on_packet(QRTPacket(data_body(framenumber, [markers_3d_no_label([(x, 0, 0, 7)])])))
+    assert [frame.ids.tolist() for frame in frames] == [[0], [0]]
+    assert frames[1].positions.tolist() == [[3, 0, 0]]
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        tracking.MarkerTracker(10, method="auction")
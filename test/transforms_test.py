@@ -0,0 +1,151 @@
+"""
+    Tests for the batch rotation conversions
+"""
+
+import itertools
+import warnings
+
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from qtm_rt import transforms  # pylint: disable=C0413
+
+# pylint: disable=W0621, C0111
+
+SEQUENCES = [
+    "".join(axes)
+    for axes in itertools.product("xyz", repeat=3)
+    if axes[0] != axes[1] and axes[1] != axes[2]
+]
+
+
+@pytest.fixture
+def angles():
+    return numpy.random.default_rng(1).uniform(-180, 180, (200, 3))
+
+
+def _valid(angles, sequence):
+    angles = angles.copy()
+    if sequence[0] == sequence[2]:
+        angles[:, 1] = numpy.abs(angles[:, 1])
+    else:
+        angles[:, 1] /= 2
+    return angles
+
+
+@pytest.mark.parametrize("local", [True, False])
+@pytest.mark.parametrize("sequence", SEQUENCES)
+def test_euler_round_trip(angles, sequence, local):
+    angles = _valid(angles, sequence)
+    matrices = transforms.euler_to_matrix(angles, sequence, local)
+    assert transforms.matrix_to_euler(matrices, sequence, local) == pytest.approx(
+        angles, abs=1e-6
+    )
+
+
+@pytest.mark.parametrize("local", [True, False])
+@pytest.mark.parametrize("sequence", ["xyz", "zyx", "zxz", "yxy"])
+def test_gimbal_lock(sequence, local):
+    second = [0, 180] if sequence[0] == sequence[2] else [90, -90]
+    angles = numpy.array([[30, second[0], 20], [-40, second[1], 10]])
+    matrices = transforms.euler_to_matrix(angles, sequence, local)
+    result = transforms.matrix_to_euler(matrices, sequence, local)
+    assert result[:, 2].tolist() == [0, 0]
+    assert result[:, 1] == pytest.approx(second)
+    assert transforms.euler_to_matrix(result, sequence, local) == pytest.approx(
+        matrices, abs=1e-6
+    )
+
+
+def test_qualisys_standard():
+    # Roll about x, then pitch about the rotated y axis
+    matrices = transforms.euler_to_matrix([90, 90, 0])
+    assert matrices.dot([0, 0, 1]) == pytest.approx([1, 0, 0])
+    assert transforms.matrix_to_euler(transforms.euler_to_matrix([10, 20, 30])) == (
+        pytest.approx([10, 20, 30])
+    )
+
+
+def test_quaternion_round_trip(angles):
+    angles = _valid(angles, "xyz")
+    matrices = transforms.euler_to_matrix(angles)
+    quaternions = transforms.matrix_to_quaternion(matrices)
+    assert (quaternions[:, 3] >= 0).all()
+    assert numpy.linalg.norm(quaternions, axis=-1) == pytest.approx(1)
+    assert transforms.quaternion_to_matrix(quaternions) == pytest.approx(matrices)
+    assert transforms.quaternion_to_euler(quaternions) == pytest.approx(angles)
+
+
+def test_quaternion_layout():
+    # 90 degrees about z, x y z w order
+    quaternion = transforms.matrix_to_quaternion(transforms.euler_to_matrix([0, 0, 90]))
+    assert quaternion == pytest.approx([0, 0, numpy.sqrt(0.5), numpy.sqrt(0.5)])
+
+
+def test_axis_angle():
+    matrices = transforms.euler_to_matrix([[0, 0, 90], [0, -45, 0], [0, 0, 0]])
+    axes, angles = transforms.matrix_to_axis_angle(matrices)
+    assert angles == pytest.approx([90, 45, 0])
+    assert axes == pytest.approx(numpy.array([[0, 0, 1], [0, -1, 0], [1, 0, 0]]))
+
+    _, radians = transforms.matrix_to_axis_angle(matrices, degrees=False)
+    assert radians[0] == pytest.approx(numpy.pi / 2)
+
+
+def test_slerp():
+    start = transforms.matrix_to_quaternion(numpy.eye(3))
+    end = transforms.matrix_to_quaternion(transforms.euler_to_matrix([0, 0, 90]))
+
+    result = transforms.slerp(start, end, [0, 0.5, 1])
+    assert transforms.quaternion_to_euler(result)[:, 2] == pytest.approx([0, 45, 90])
+    # Shortest path, whatever the sign of the quaternion
+    assert transforms.slerp(start, -end, 0.5) == pytest.approx(result[1])
+    assert transforms.slerp(start, start, 0.3) == pytest.approx(start)
+
+
+def test_nan_rows():
+    matrices = transforms.euler_to_matrix([[10, 20, 30], [0, 0, 0]])
+    matrices[1] = numpy.nan
+    quaternion = transforms.matrix_to_quaternion(matrices)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results = [
+            quaternion,
+            transforms.quaternion_to_matrix(quaternion),
+            transforms.matrix_to_euler(matrices),
+            transforms.matrix_to_axis_angle(matrices)[0],
+            transforms.matrix_to_axis_angle(matrices)[1],
+            transforms.slerp(quaternion, quaternion, 0.5),
+        ]
+    for result in results:
+        assert numpy.isnan(result[1]).all()
+        assert not numpy.isnan(result[0]).any()
+
+
+def test_invalid_sequence():
+    with pytest.raises(ValueError):
+        transforms.matrix_to_euler(numpy.eye(3), "xxy")
+    with pytest.raises(ValueError):
+        transforms.euler_to_matrix([0, 0, 0], "xy")
+
+
+def test_quaternion_algebra(angles):
+    first = transforms.matrix_to_quaternion(transforms.euler_to_matrix(angles))
+    second = first[::-1]
+    product = transforms.quaternion_multiply(first, second)
+    assert transforms.quaternion_to_matrix(product) == pytest.approx(
+        transforms.quaternion_to_matrix(first) @ transforms.quaternion_to_matrix(second)
+    )
+
+    identity = transforms.quaternion_multiply(first, transforms.quaternion_conjugate(first))
+    assert identity == pytest.approx(numpy.tile([0, 0, 0, 1.0], (len(first), 1)))
+
+
+def test_rotation_vectors():
+    vectors = numpy.array([[0, 0, numpy.pi / 2], [0, 0, 0], [1, -2, 0.5]])
+    quaternions = transforms.rotation_vector_to_quaternion(vectors)
+    assert quaternions[0] == pytest.approx([0, 0, numpy.sqrt(0.5), numpy.sqrt(0.5)])
+    assert quaternions[1] == pytest.approx([0, 0, 0, 1])
+    assert transforms.quaternion_to_rotation_vector(quaternions) == pytest.approx(vectors)
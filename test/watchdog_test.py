@@ -0,0 +1,142 @@
+"""
+    Tests for the callback and event loop watchdog
+"""
+
+import asyncio
+from collections import namedtuple
+import time
+
+import pytest
+
+from qtm_rt.protocol import QTMProtocol
+from qtm_rt.qrt import QRTConnection
+from qtm_rt.tracing import ChromeTrace
+from qtm_rt.watchdog import Watchdog, frame_period
+
+from .helpers import data_packet, markers_3d
+
+# pylint: disable=W0621, C0111, W0212
+
+Packet = namedtuple("Packet", "framenumber timestamp")
+
+
+@pytest.mark.parametrize(
+    "frequency, frames, period",
+    [
+        (100, "allframes", 0.01),
+        (100, "frequencydivisor:4", 0.04),
+        (None, "frequency:50", 0.02),
+        (None, "allframes", None),
+        (100, "frequency:fast", None),
+    ],
+)
+def test_frame_period(frequency, frames, period):
+    assert frame_period(frequency, frames) == pytest.approx(period)
+
+
+def test_overrun():
+    overruns = []
+    watchdog = Watchdog(frequency=1000, on_overrun=overruns.append)
+    packets = []
+    on_packet = watchdog.wrap(packets.append)
+
+    on_packet(Packet(1, 0))
+    watched = watchdog.wrap(lambda packet: time.sleep(0.005))
+    watched(Packet(2, 1000))
+
+    assert len(packets) == 1
+    assert watchdog.overruns == 1
+    assert overruns[0].framenumber == 2
+    assert overruns[0].period == pytest.approx(0.001)
+    assert watchdog.max_callback >= 0.005
+
+
+def test_late_frames(mocker):
+    clock = mocker.patch("qtm_rt.watchdog.time.perf_counter")
+    watchdog = Watchdog(frequency=100)
+    on_packet = watchdog.wrap(lambda packet: None)
+
+    # Delivery relative to QTM timestamps, frame period is 10 ms
+    for framenumber, delivered in [(0, 0.005), (1, 0.012), (2, 0.040), (3, 0.031)]:
+        clock.return_value = delivered
+        on_packet(Packet(framenumber, framenumber * 10000))
+
+    assert watchdog.frames == 4
+    assert watchdog.late_frames == 1
+
+
+def test_late_frames_with_clock_drift(mocker):
+    clock = mocker.patch("qtm_rt.watchdog.time.perf_counter")
+    watchdog = Watchdog(frequency=100, clock_window=1.0)
+    on_packet = watchdog.wrap(lambda packet: None)
+
+    # The local clock runs 0.5 % faster than QTM's, 25 ms ahead after 5 s
+    for framenumber in range(500):
+        clock.return_value = framenumber * 0.01005 + 0.002
+        on_packet(Packet(framenumber, framenumber * 10000))
+    assert watchdog.late_frames == 0
+
+    clock.return_value = 500 * 0.01005 + 0.015
+    on_packet(Packet(500, 500 * 10000))
+    assert watchdog.late_frames == 1
+
+
+def test_no_period():
+    watchdog = Watchdog()
+    on_packet = watchdog.wrap(lambda packet: time.sleep(0.002))
+    on_packet(Packet(1, 0))
+    assert watchdog.frames == 1
+    assert watchdog.overruns == 0
+
+
+@pytest.mark.asyncio
+async def test_lag():
+    lags = []
+    watchdog = Watchdog(on_lag=lags.append, lag_threshold=0.02, interval=0.01)
+    watchdog.start()
+    await asyncio.sleep(0.015)
+    time.sleep(0.05)
+    await asyncio.sleep(0.02)
+    watchdog.stop()
+
+    assert lags
+    assert watchdog.max_lag >= 0.02
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stop_watchdog_first", [True, False])
+async def test_watchdog_and_tracing_combine(mocker, stop_watchdog_first):
+    protocol = QTMProtocol(loop=asyncio.get_running_loop())
+    protocol.connection_made(mocker.MagicMock())
+    connection = QRTConnection(protocol, 1)
+    trace = ChromeTrace()
+    packets = []
+
+    watchdog = await connection.start_watchdog(frequency=100)
+    connection.enable_tracing(trace)
+    streaming = asyncio.ensure_future(
+        connection.stream_frames(components=["3d"], on_packet=packets.append)
+    )
+    await asyncio.sleep(0)
+    protocol.data_received(data_packet(1, [markers_3d([(1, 2, 3)])]))
+    await streaming
+    assert protocol.on_packet.tracer is trace
+    assert protocol.on_packet.__wrapped__.watchdog is watchdog
+    assert watchdog.frames == 1
+
+    if stop_watchdog_first:
+        connection.stop_watchdog()
+        assert protocol.on_packet.__wrapped__ == packets.append
+        protocol.data_received(data_packet(2, [markers_3d([(1, 2, 3)])]))
+        connection.disable_tracing()
+    else:
+        connection.disable_tracing()
+        assert protocol.on_packet.watchdog is watchdog
+        protocol.data_received(data_packet(2, [markers_3d([(1, 2, 3)])]))
+        connection.stop_watchdog()
+
+    assert protocol.on_packet == packets.append
+    assert [packet.framenumber for packet in packets] == [1, 2]
+    callbacks = [span for span in trace.spans if span[0] == "callback"]
+    assert len(callbacks) == (2 if stop_watchdog_first else 1)
+    assert watchdog.frames == (1 if stop_watchdog_first else 2)